@@ -18,6 +18,8 @@ class User(AbstractUser):
         verbose_name="บทบาท"
     )
     profile_image = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    # รูปย่อของ profile_image (สร้างโดย inventory/thumbnails.py)
+    profile_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     phone = models.CharField(max_length=20, null=True, blank=True, verbose_name="เบอร์โทรศัพท์")
     is_online = models.BooleanField(default=False)
     last_activity = models.DateTimeField(null=True, blank=True)
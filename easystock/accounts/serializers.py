@@ -3,6 +3,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 
+from inventory.thumbnails import thumbnail_urls
+
 User = get_user_model()
 
 
@@ -56,6 +58,7 @@ class RegisterSerializer(serializers.Serializer):
 class UserSerializer(serializers.ModelSerializer):
     """แปลง User object เป็น JSON"""
     profile_image = serializers.SerializerMethodField()
+    profile_image_thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -63,7 +66,7 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'username', 'email', 'first_name', 'last_name',
             'phone', 'is_staff', 'is_superuser', 'is_active',
             'is_online', 'last_activity', 'date_joined', 'last_login',
-            'profile_image',
+            'profile_image', 'profile_image_thumbnails',
         ]
 
     def get_profile_image(self, obj):
@@ -75,4 +78,9 @@ class UserSerializer(serializers.ModelSerializer):
                 return obj.profile_image.url
             except:
                 return None
-        return None
\ No newline at end of file
+        return None
+
+    def get_profile_image_thumbnails(self, obj):
+        return thumbnail_urls(
+            getattr(obj, 'profile_image_renditions', None), self.context.get('request')
+        )
\ No newline at end of file
@@ -58,6 +58,7 @@ class FestivalAdmin(admin.ModelAdmin):
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ['title', 'assigned_to', 'status', 'priority', 'due_date']
+    list_select_related = ['assigned_to']
     list_filter = ['status', 'priority', 'task_type', 'due_date']
     search_fields = ['title', 'description']
     filter_horizontal = []  # ← ลบ products ออกแล้ว
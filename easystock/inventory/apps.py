@@ -4,3 +4,7 @@ class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'   # ต้องตรงชื่อโฟลเดอร์แอป
     label = 'inventory'  # ระบุชัด ๆ กันพลาด
+
+    def ready(self):
+        """Import signals when app is ready"""
+        import inventory.signals  # noqa
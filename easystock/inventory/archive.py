@@ -0,0 +1,201 @@
+# inventory/archive.py
+# ย้ายประวัติการเบิก (Issue / IssueLine) ของเดือนที่ปิดแล้วไปเก็บในตาราง archive
+#
+# - IssueLine ของเดือนนั้น → ArchivedIssueLine (id เดิม, แถวเล็กกว่า ไม่มี FK ไป Issue)
+# - ยอดรวมต่อสินค้าต่อเดือน → IssueRollup (report แบบ "ทั้งหมด" อ่านจากตรงนี้)
+# - Issue ที่ไม่เหลือรายการแล้วถูกลบ
+#
+# report ใช้ฟังก์ชันด้านล่าง (issued_totals / iter_issue_lines) เพื่ออ่านรวมทั้งข้อมูลปัจจุบันและ archive
+
+from datetime import date, datetime, time
+from itertools import chain
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import (
+    Issue, IssueLine, ArchivedIssueLine, IssueRollup, IssueArchivePeriod
+)
+from . import caching
+
+DEFAULT_KEEP_MONTHS = 12
+DEFAULT_BATCH_SIZE = 5000
+
+
+# ================ MONTH HELPERS ================
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(d, months):
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """ช่วงเวลา [เริ่ม, สิ้นสุด) ของเดือน ตามเวลาท้องถิ่น (Asia/Bangkok)"""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(month, time.min), tz)
+    end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min), tz)
+    return start, end
+
+
+def archive_cutoff(keep_months=DEFAULT_KEEP_MONTHS, today=None):
+    """เดือนแรกที่ยังเก็บไว้ในตารางปกติ (เดือนก่อนหน้านี้ archive ได้)"""
+    today = today or timezone.localdate()
+    return add_months(month_start(today), -keep_months)
+
+
+def months_to_archive(before):
+    """เดือนที่ยังมี IssueLine อยู่และเก่ากว่า before"""
+    oldest = IssueLine.objects.order_by('created_at').values_list('created_at', flat=True).first()
+    if oldest is None:
+        return []
+    month = month_start(timezone.localtime(oldest).date())
+    months = []
+    while month < before:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+# ================ ARCHIVE ================
+
+def archive_month(month, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    ย้าย IssueLine ของเดือนนี้ไป archive แล้วคำนวณ rollup ใหม่
+    คืนจำนวนรายการที่ย้าย (รันซ้ำได้ — ไม่มีอะไรให้ย้ายก็คืน 0)
+    """
+    start, end = month_bounds(month)
+    moved = 0
+
+    with transaction.atomic():
+        lines = IssueLine.objects.filter(
+            created_at__gte=start, created_at__lt=end
+        ).select_related('issue').order_by('id')
+
+        while True:
+            batch = list(lines[:batch_size])
+            if not batch:
+                break
+            ArchivedIssueLine.objects.bulk_create([
+                ArchivedIssueLine(
+                    id=l.id,
+                    issue_id=l.issue_id,
+                    issue_status=l.issue.status,
+                    product_id=l.product_id,
+                    qty=l.qty,
+                    created_at=l.created_at,
+                    created_by_id=l.created_by_id,
+                )
+                for l in batch
+            ], ignore_conflicts=True)
+            # ลบตรงด้วย SQL (ไม่มี model อื่นอ้างอิง IssueLine) → ไม่ยิง post_delete ทีละแถว
+            ids = [l.id for l in batch]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {connection.ops.quote_name(IssueLine._meta.db_table)} "
+                    f"WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                    ids,
+                )
+            moved += len(batch)
+
+        # ใบเบิกที่ไม่เหลือรายการในตารางปกติแล้ว
+        Issue.objects.filter(
+            created_at__gte=start, created_at__lt=end, lines__isnull=True
+        ).delete()
+
+        # rollup คำนวณจาก archive ทั้งเดือนใหม่ทุกครั้ง → ถูกต้องแม้รันซ้ำ
+        totals = ArchivedIssueLine.objects.filter(
+            created_at__gte=start, created_at__lt=end
+        ).values('product').annotate(total_qty=Sum('qty'), line_count=Count('id'))
+        IssueRollup.objects.filter(month=month).delete()
+        IssueRollup.objects.bulk_create([
+            IssueRollup(
+                month=month,
+                product_id=t['product'],
+                total_qty=t['total_qty'],
+                line_count=t['line_count'],
+            )
+            for t in totals
+        ], batch_size=batch_size)
+
+        archived_lines = ArchivedIssueLine.objects.filter(
+            created_at__gte=start, created_at__lt=end
+        ).count()
+        IssueArchivePeriod.objects.update_or_create(
+            month=month, defaults={'line_count': archived_lines}
+        )
+        if moved:
+            transaction.on_commit(lambda: caching.invalidate(caching.TAG_ISSUES))
+
+    return moved
+
+
+def archive_before(before, batch_size=DEFAULT_BATCH_SIZE):
+    """archive ทุกเดือนที่เก่ากว่า before คืน [(เดือน, จำนวนที่ย้าย)]"""
+    return [
+        (month, archive_month(month, batch_size=batch_size))
+        for month in months_to_archive(before)
+    ]
+
+
+# ================ READ (ปัจจุบัน + archive) ================
+
+def issued_totals(**filters):
+    """
+    ยอดเบิกรวมต่อสินค้า {product_id: {'total_issued', 'transactions'}}
+    filters ใช้ชื่อ field เดียวกันทั้งสองตาราง เช่น created_at__gte=...
+    ไม่มี filter (ทั้งหมด) → ส่วนที่ archive แล้วอ่านจาก IssueRollup
+    """
+    totals = {}
+
+    def add(rows, qty_key, count_key):
+        for row in rows:
+            entry = totals.setdefault(row['product'], {'total_issued': 0, 'transactions': 0})
+            entry['total_issued'] += row[qty_key] or 0
+            entry['transactions'] += row[count_key] or 0
+
+    add(
+        IssueLine.objects.filter(**filters).values('product').annotate(
+            qty=Sum('qty'), n=Count('id')
+        ),
+        'qty', 'n'
+    )
+    if filters:
+        archived = ArchivedIssueLine.objects.filter(**filters).values('product').annotate(
+            qty=Sum('qty'), n=Count('id')
+        )
+    else:
+        archived = IssueRollup.objects.values('product').annotate(
+            qty=Sum('total_qty'), n=Sum('line_count')
+        )
+    add(archived, 'qty', 'n')
+    return totals
+
+
+def top_issued(limit, min_qty=0, **filters):
+    """สินค้าที่เบิกมากที่สุด [{'product', 'total_issued', 'transactions'}]"""
+    rows = [
+        {'product': pid, **entry}
+        for pid, entry in issued_totals(**filters).items()
+        if entry['total_issued'] >= min_qty
+    ]
+    rows.sort(key=lambda r: (-r['total_issued'], r['product']))
+    return rows[:limit]
+
+
+def iter_issue_lines(**filters):
+    """
+    รายการเบิก (ปัจจุบันก่อน แล้วตามด้วย archive) ล่าสุดก่อน
+    ทั้งสองแบบมี .id .issue_id .product .qty .created_at .created_by
+    """
+    hot = IssueLine.objects.filter(**filters).select_related(
+        'product', 'created_by'
+    ).order_by('-created_at', 'id')
+    archived = ArchivedIssueLine.objects.filter(**filters).select_related(
+        'product', 'created_by'
+    ).order_by('-created_at', 'id')
+    return chain(hot.iterator(chunk_size=2000), archived.iterator(chunk_size=2000))
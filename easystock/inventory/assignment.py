@@ -0,0 +1,226 @@
+# inventory/assignment.py
+# แจกงานตามภาระงาน + สร้างงานทีละหลายร้อยรายการในครั้งเดียว (POST /tasks/bulk/)
+#
+# - ภาระงาน = จำนวนงานที่ยังไม่เสร็จต่อคน (aggregate query เดียว)
+# - WorkloadBalancer: heap (งานค้าง, user_id) → งานถัดไปได้คนที่ว่างที่สุดเสมอ
+#   ล็อกแถว user ผู้รับงานก่อนอ่านภาระงาน → ต้องอ่าน + สร้างงานใน transaction เดียวกัน
+#   (คำขอแจกงานพร้อมกันต่อคิวกัน ไม่แจกจากภาระงานชุดเดิมซ้ำ)
+# - สร้างงานด้วย bulk_create ใน transaction เดียว (ใช้ร่วมกับ replenishment.py)
+
+import heapq
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, Task
+from . import audit, caching
+
+OPEN_STATUSES = ('pending', 'in_progress')
+MAX_BULK_TASKS = 2000
+MODES = ('each', 'balance')
+
+
+class AssignmentError(Exception):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+# ================ WORKLOAD ================
+
+def assignees():
+    """พนักงานที่รับงานได้ (ไม่มีพนักงาน → admin)"""
+    User = get_user_model()
+    users = list(User.objects.filter(is_active=True, role='employee').order_by('id'))
+    return users or list(User.objects.filter(is_active=True, role='admin').order_by('id'))
+
+
+def open_workload(user_ids):
+    """จำนวนงานที่ค้างอยู่ต่อคน {user_id: n} (query เดียว)"""
+    load = dict.fromkeys(user_ids, 0)
+    rows = Task.objects.filter(
+        assigned_to__in=load, status__in=OPEN_STATUSES
+    ).values('assigned_to').annotate(n=Count('id')).order_by()
+    for row in rows:
+        load[row['assigned_to']] = row['n']
+    return load
+
+
+def lock_assignees(user_ids):
+    """ล็อกแถว user ตามลำดับ id จนจบ transaction (ลำดับเดียวกันทุกคำขอ → ไม่ deadlock)"""
+    list(get_user_model().objects.select_for_update().filter(
+        id__in=user_ids
+    ).order_by('id').values_list('id', flat=True))
+
+
+class WorkloadBalancer:
+    """
+    เลือกคนที่มีงานค้างน้อยที่สุด (เท่ากัน → id น้อยก่อน) แล้วนับงานใหม่เพิ่มให้
+    ต้องสร้างใน transaction เดียวกับที่บันทึกงาน (ล็อกผู้รับงานไว้จน commit)
+    """
+
+    def __init__(self, user_ids):
+        lock_assignees(user_ids)
+        self.heap = [(n, user_id) for user_id, n in open_workload(user_ids).items()]
+        heapq.heapify(self.heap)
+
+    def next(self):
+        load, user_id = heapq.heappop(self.heap)
+        heapq.heappush(self.heap, (load + 1, user_id))
+        return user_id
+
+    def loads(self):
+        return {user_id: n for n, user_id in self.heap}
+
+
+def save_tasks(tasks, batch_size=1000):
+    """bulk_create ใน transaction เดียว (ไม่ยิง signal → ล้าง cache งาน / บันทึก AuditLog เอง)"""
+    with transaction.atomic():
+        Task.objects.bulk_create(tasks, batch_size=batch_size)
+        _fill_ids(tasks)
+        audit.record_many([(t, 'create', audit.created_changes(t)) for t in tasks])
+        transaction.on_commit(lambda: caching.invalidate(caching.TAG_TASKS))
+    return tasks
+
+
+def _fill_ids(tasks):
+    """MySQL ไม่คืน id จาก bulk_create → จับคู่กลับด้วย (ผู้รับงาน, created_at ที่ตั้งตอน insert)"""
+    missing = defaultdict(list)
+    for task in tasks:
+        if task.pk is None:
+            missing[(task.assigned_to_id, task.created_at)].append(task)
+    if not missing:
+        return
+    rows = Task.objects.filter(
+        assigned_to__in={user_id for user_id, _ in missing},
+        created_at__in={created_at for _, created_at in missing},
+    ).order_by('id').values_list('id', 'assigned_to_id', 'created_at')
+    for pk, user_id, created_at in rows:
+        group = missing.get((user_id, created_at))
+        if group:
+            group.pop(0).pk = pk
+
+
+# ================ BULK CREATE ================
+
+class _Blank(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def render(text, **values):
+    """แทน {product} / {code} / {n} ในชื่องาน (placeholder อื่นคงไว้ตามเดิม)"""
+    try:
+        return (text or '').format_map(_Blank(values))
+    except (ValueError, IndexError):
+        return text
+
+
+def _ids(values, name):
+    if values in (None, ''):
+        return []
+    if not isinstance(values, list):
+        raise AssignmentError(f'{name} ต้องเป็นรายการ id')
+    try:
+        ids = [int(v) for v in values]
+    except (TypeError, ValueError):
+        raise AssignmentError(f'{name} ต้องเป็นรายการ id')
+    if len(set(ids)) != len(ids):
+        raise AssignmentError(f'{name} มี id ซ้ำ')
+    return ids
+
+
+def plan_bulk(template, mode='each', assignee_ids=None, product_ids=None, count=None):
+    """
+    template: field ของ Task ที่ผ่าน serializer แล้ว (title, description, due_date, ...)
+    mode 'each'    → ทุกคนใน assignees ได้งานครบ (× สินค้าถ้ามี)
+    mode 'balance' → สินค้าแต่ละรายการ (หรือ count งาน) แจกให้คนที่ว่างที่สุด
+    คืน [Task] ที่ยังไม่บันทึก
+    """
+    if mode not in MODES:
+        raise AssignmentError(f"mode ต้องเป็น {' / '.join(MODES)}")
+    assignee_ids = _ids(assignee_ids, 'assignees')
+    product_ids = _ids(product_ids, 'products')
+
+    # ── ผู้รับงาน (query เดียว) ──
+    if assignee_ids:
+        found = set(get_user_model().objects.filter(
+            id__in=assignee_ids, is_active=True
+        ).values_list('id', flat=True))
+        missing = [i for i in assignee_ids if i not in found]
+        if missing:
+            raise AssignmentError(f'ไม่พบผู้ใช้ (หรือถูกปิดใช้งาน): {missing}')
+    elif mode == 'balance':
+        assignee_ids = [u.id for u in assignees()]
+    if not assignee_ids:
+        raise AssignmentError('ไม่มีผู้ใช้ที่มอบหมายงานได้')
+
+    # ── สินค้า (query เดียว) ──
+    products = []
+    if product_ids:
+        by_id = {
+            pid: (code, name) for pid, code, name in Product.objects.filter(
+                id__in=product_ids, is_deleted=False
+            ).values_list('id', 'code', 'name')
+        }
+        missing = [i for i in product_ids if i not in by_id]
+        if missing:
+            raise AssignmentError(f'ไม่พบสินค้า: {missing}')
+        products = [(pid, *by_id[pid]) for pid in product_ids]
+
+    if mode == 'balance':
+        if products:
+            items = products
+        else:
+            try:
+                count = int(count or 0)
+            except (TypeError, ValueError):
+                raise AssignmentError('count ต้องเป็นตัวเลข')
+            if count < 1:
+                raise AssignmentError('โหมด balance ต้องระบุ products หรือ count')
+            items = [None] * count
+        total = len(items)
+    else:
+        items = products or [None]
+        total = len(assignee_ids) * len(items)
+
+    if total > MAX_BULK_TASKS:
+        raise AssignmentError(f'สร้างได้ครั้งละไม่เกิน {MAX_BULK_TASKS} งาน (ขอ {total})')
+
+    def build(user_id, product, n):
+        values = {'n': n}
+        if product:
+            values.update(product=product[2], code=product[1])
+        return Task(
+            **dict(template, title=render(template['title'], **values)[:255]),
+            assigned_to_id=user_id,
+            product_id=product[0] if product else None,
+        )
+
+    tasks = []
+    if mode == 'balance':
+        balancer = WorkloadBalancer(assignee_ids)
+        for n, product in enumerate(items, 1):
+            tasks.append(build(balancer.next(), product, n))
+    else:
+        n = 0
+        for user_id in assignee_ids:
+            for product in items:
+                n += 1
+                tasks.append(build(user_id, product, n))
+    return tasks
+
+
+def create_bulk(template, mode='each', assignee_ids=None, product_ids=None, count=None):
+    """plan_bulk + save_tasks ใน transaction เดียว (balance: ภาระงานที่อ่านถูกล็อกไว้จนบันทึกเสร็จ)"""
+    with transaction.atomic():
+        return save_tasks(plan_bulk(
+            template, mode=mode, assignee_ids=assignee_ids, product_ids=product_ids, count=count,
+        ))
+
+
+def summarize(tasks):
+    return dict(Counter(t.assigned_to_id for t in tasks))
@@ -0,0 +1,267 @@
+# inventory/audit.py
+# บันทึกประวัติการแก้ไข Product / Listing / Task (AuditLog) ผ่าน model signal
+#
+# - diff จากค่าที่โหลดจาก DB (LoadedValuesMixin.from_db) → ไม่ query ค่าเดิมซ้ำ
+# - เก็บเฉพาะ field ที่เปลี่ยน {field: [เดิม, ใหม่]} เป็น JSON แบบย่อ
+# - ใน transaction: สะสมไว้แล้ว bulk_create ครั้งเดียวหลัง commit (rollback → ไม่บันทึก)
+#   นอก transaction (autocommit): บันทึกทันที
+# - ผู้แก้ไขมาจาก request ปัจจุบัน (AuditContextMiddleware) หรือ acting_as(user) ใน command
+# - queryset.update() / bulk_create / bulk_update ไม่ยิง signal → service ที่ทำงานแบบ bulk
+#   (assignment.save_tasks, ProductImporter, stocktake.commit) เรียก record_many เอง
+#   (การปรับสต็อกทีละรายการมี StockMovement เป็นประวัติอยู่แล้ว จึงไม่ติดตาม stock
+#    ยกเว้น stocktake.commit ที่เปลี่ยนสต็อกทั้งร้านในครั้งเดียว)
+
+import contextvars
+import threading
+import weakref
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.fields.files import FieldFile, FileField
+from django.utils import timezone
+
+from .models import AuditLog, Listing, Product, Task
+
+# model → field ที่ติดตาม
+TRACKED = {
+    Product: (
+        'code', 'name', 'selling_price', 'unit', 'category', 'on_sale', 'is_deleted', 'image',
+    ),
+    Listing: ('title', 'sale_price', 'unit', 'is_active', 'quantity', 'image'),
+    Task: (
+        'title', 'description', 'task_type', 'assigned_to', 'status', 'priority',
+        'product', 'target_quantity', 'due_date', 'notes', 'image',
+    ),
+}
+MODEL_NAMES = {model: model._meta.model_name for model in TRACKED}
+BATCH_SIZE = 500
+
+# request ปัจจุบัน หรือ user ที่กำหนดเอง (DRF ตั้ง request.user หลัง authenticate)
+_actor = contextvars.ContextVar('audit_actor', default=None)
+
+
+@contextmanager
+def acting_as(actor):
+    """ระบุผู้แก้ไข (request หรือ user) ภายใน block นี้"""
+    token = _actor.set(actor)
+    try:
+        yield
+    finally:
+        _actor.reset(token)
+
+
+def current_user_id():
+    actor = _actor.get()
+    user = getattr(actor, 'user', actor)
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return None
+    return user.pk
+
+
+# ================ DIFF ================
+
+_attnames = {}
+
+
+def _fields(model, update_fields=None):
+    """[(ชื่อ field, attname)] ที่ติดตาม (จำกัดตาม update_fields ถ้ามี)"""
+    if model not in _attnames:
+        _attnames[model] = [(name, model._meta.get_field(name).attname) for name in TRACKED[model]]
+    pairs = _attnames[model]
+    if update_fields:
+        pairs = [(name, att) for name, att in pairs if name in update_fields or att in update_fields]
+    return pairs
+
+
+def _value(value):
+    if isinstance(value, FieldFile):
+        return value.name or None
+    return value
+
+
+def _is_expression(value):
+    # F("quantity") + qty ฯลฯ → ค่าจริงอยู่ใน DB เท่านั้น (ไม่ query ซ้ำ)
+    return hasattr(value, 'resolve_expression')
+
+
+_files = {}
+
+
+def _file_attnames(model):
+    if model not in _files:
+        _files[model] = {f.attname for f in model._meta.concrete_fields if isinstance(f, FileField)}
+    return _files[model]
+
+
+def diff(instance, update_fields=None):
+    """{field: [เดิม, ใหม่]} ของ field ที่เปลี่ยนตั้งแต่โหลดจาก DB / save ครั้งก่อน"""
+    loaded = getattr(instance, '_loaded_values', None)
+    deferred = instance.get_deferred_fields()
+    files = _file_attnames(type(instance))
+    changes = {}
+    for name, att in _fields(type(instance), update_fields):
+        if att in deferred or (loaded is not None and att not in loaded):
+            continue
+        # ไม่ได้โหลดจาก DB (สร้าง instance เองแล้ว save ทับ) → ไม่รู้ค่าเดิม
+        old = loaded[att] if loaded is not None else None
+        if att in files:
+            old = old or None  # ไฟล์ว่างใน DB เป็น '' หรือ NULL
+        new = _value(getattr(instance, att))
+        if _is_expression(new):
+            continue
+        if old != new:
+            changes[name] = [old, new]
+    return changes
+
+
+def _remember(instance):
+    loaded = instance.__dict__.setdefault('_loaded_values', {})
+    for _, att in _fields(type(instance)):
+        if att not in instance.__dict__:
+            continue
+        value = _value(instance.__dict__[att])
+        if _is_expression(value):
+            # ไม่รู้ค่าหลัง save → ครั้งถัดไปไม่ diff field นี้ (จนกว่าจะโหลดใหม่)
+            loaded.pop(att, None)
+        else:
+            loaded[att] = value
+
+
+# ================ BATCHED WRITE ================
+# แต่ละครั้งที่บันทึกลงทะเบียน callback ของตัวเองด้วย transaction.on_commit
+# → savepoint ที่ rollback: Django ทิ้ง callback ของรายการในนั้นไปเอง (ตัว callback ถูกเก็บกวาด weakref ตาย)
+# callback ที่รันแล้วรวมรายการไว้ใน buffer ของ thread / DB นั้น และตัวสุดท้ายที่ยังค้างอยู่
+# เขียนทั้งชุดด้วย bulk_create ครั้งเดียว — นอก transaction on_commit รันทันที = บันทึกทันที
+
+class _Buffer:
+    __slots__ = ('using', 'ready', 'pending')
+
+    def __init__(self, using):
+        self.using = using
+        self.ready = []
+        self.pending = []  # weakref ของ _Pending ตามลำดับที่ลงทะเบียน
+
+    def flush(self):
+        entries, self.ready, self.pending = self.ready, [], []
+        AuditLog.objects.using(self.using).bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+class _Pending:
+    __slots__ = ('buffer', 'entries', 'index', 'done', '__weakref__')
+
+    def __init__(self, buffer, entries):
+        self.buffer = buffer
+        self.entries = entries
+        self.index = len(buffer.pending)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        buffer = self.buffer
+        buffer.ready.extend(self.entries)
+        # callback ที่ลงทะเบียนทีหลังยังรอรันอยู่ (commit แล้ว) → ให้ตัวนั้นเขียนรวมทีเดียว
+        for ref in buffer.pending[self.index + 1:]:
+            other = ref()
+            if other is not None and not other.done:
+                return
+        buffer.flush()
+
+
+_local = threading.local()
+
+
+def _enqueue(entries, using):
+    buffers = _local.__dict__.setdefault('buffers', {})
+    buffer = buffers.get(using)
+    if buffer is None:
+        buffer = buffers[using] = _Buffer(using)
+    elif len(buffer.pending) >= BATCH_SIZE and all(
+        ref() is None or ref().done for ref in buffer.pending
+    ):
+        # เหลือแต่ callback ของ transaction ที่ rollback ทั้งก้อน (ไม่เคยรัน) → เริ่มรายการใหม่
+        buffer.pending = []
+    pending = _Pending(buffer, entries)
+    buffer.pending.append(weakref.ref(pending))
+    transaction.on_commit(pending, using=using)
+
+
+def _entry(instance, action, changes, user_id):
+    return AuditLog(
+        model=MODEL_NAMES[type(instance)],
+        object_id=instance.pk,
+        action=action,
+        changes=changes,
+        user_id=user_id,
+        created_at=timezone.now(),
+    )
+
+
+def record(instance, action, changes, using=None):
+    record_many([(instance, action, changes)], using=using)
+
+
+def record_many(rows, user=None, using=None):
+    """
+    บันทึก [(instance, action, changes)] ใน on_commit เดียว (bulk_create / bulk_update ที่ไม่ยิง signal)
+    user: ผู้แก้ไข (ไม่ระบุ → จาก request / acting_as)
+    """
+    user_id = user.pk if user is not None else current_user_id()
+    entries = [
+        _entry(instance, action, changes, user_id)
+        for instance, action, changes in rows
+        if changes or action != 'update'
+    ]
+    if entries:
+        _enqueue(entries, using or 'default')
+
+
+def created_changes(instance):
+    """{field: [None, ค่า]} ของ field ที่ติดตามและมีค่า (object ใหม่)"""
+    return {
+        name: [None, value] for name, value in (
+            (name, _value(getattr(instance, att))) for name, att in _fields(type(instance))
+        ) if value not in (None, '')
+    }
+
+
+# ================ SIGNALS ================
+
+def record_save(sender, instance, created, update_fields=None, raw=False, using=None, **kwargs):
+    if raw:  # loaddata
+        return
+    if created:
+        record(instance, 'create', created_changes(instance), using)
+    else:
+        record(instance, 'update', diff(instance, update_fields), using)
+    _remember(instance)
+
+
+def record_delete(sender, instance, using=None, **kwargs):
+    changes = {
+        name: [value, None] for name, value in (
+            (name, _value(getattr(instance, att, None))) for name, att in _fields(sender)
+        ) if value not in (None, '')
+    }
+    record(instance, 'delete', changes, using)
+
+
+# ================ QUERIES ================
+
+def history(model, object_id, limit=50, before=None):
+    """ประวัติของ object เดียว ใหม่สุดก่อน (index auditlog_object)"""
+    rows = AuditLog.objects.filter(model=model, object_id=object_id)
+    return _page(rows, limit, before)
+
+
+def by_user(user_id, limit=50, before=None):
+    """ประวัติที่ user คนนี้แก้ไข ใหม่สุดก่อน (index auditlog_user)"""
+    return _page(AuditLog.objects.filter(user_id=user_id), limit, before)
+
+
+def _page(rows, limit, before):
+    # before = id ของแถวสุดท้ายในหน้าก่อน (keyset → ไม่ต้อง OFFSET)
+    if before:
+        rows = rows.filter(id__lt=before)
+    return list(rows.order_by('-id').values(
+        'id', 'model', 'object_id', 'action', 'changes', 'user_id', 'user__username', 'created_at',
+    )[:limit])
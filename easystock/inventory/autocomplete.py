@@ -0,0 +1,133 @@
+# inventory/autocomplete.py
+# ดัชนี prefix ในหน่วยความจำสำหรับช่องค้นหาแบบพิมพ์แล้วแสดงทันที (typeahead)
+#
+# - เก็บ key (รหัส / ชื่อ / คำในชื่อ) เป็น sorted array แล้วค้นด้วย bisect
+# - เมื่อ code / name / is_deleted เปลี่ยน signal จะเพิ่ม change counter ในฐานข้อมูล
+#   (caching.bump_shared) → ทุก worker เห็นว่า counter ไม่ตรงกับที่ build ไว้ → build ใหม่ 1 ครั้ง
+# - stock เปลี่ยนบ่อย (ทุกใบเบิก) จึงไม่อยู่ในดัชนี: อ่าน stock ของสินค้าที่ match
+#   (ไม่เกินหลักสิบรายการ) ด้วย pk__in query เดียวตอนค้น
+
+import threading
+from bisect import bisect_left
+
+from .models import Product
+from .search import normalize, WORD_SEPARATORS
+from . import caching
+
+VERSION_NAME = 'autocomplete'
+
+# ลำดับความสำคัญของ key (เลขน้อยมาก่อน)
+RANK_CODE = 0
+RANK_NAME = 1
+RANK_WORD = 2
+
+
+def get_version():
+    return caching.shared_versions([VERSION_NAME])[0]
+
+
+def bump_version():
+    """เรียกเมื่อรหัส / ชื่อสินค้าเปลี่ยน หรือมีสินค้าเพิ่ม/ลบ ให้ทุก process build ดัชนีใหม่"""
+    caching.bump_shared(VERSION_NAME)
+
+
+class PrefixIndex:
+    """sorted array ของ (key, rank, product_id) + รหัส / ชื่อสินค้าที่ต้องแสดง"""
+
+    def __init__(self, rows=()):
+        entries = []
+        self.products = {}
+        for pid, code, name in rows:
+            self.products[pid] = {'id': pid, 'code': code, 'name': name}
+            code_key = normalize(code)
+            name_key = normalize(name)
+            if code_key:
+                entries.append((code_key, RANK_CODE, pid))
+            if name_key:
+                entries.append((name_key, RANK_NAME, pid))
+            for word in WORD_SEPARATORS.split(name_key)[1:]:
+                if word:
+                    entries.append((word, RANK_WORD, pid))
+        entries.sort()
+        self.keys = [e[0] for e in entries]
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.products)
+
+    def lookup(self, prefix, limit=10, stock_of=None, min_stock=None):
+        """
+        stock_of: callable([product_id]) → {product_id: stock} (query เดียวต่อการค้น)
+        min_stock: ตัดสินค้าที่ stock น้อยกว่านี้ออก
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        # เก็บ match ตาม rank แล้วค่อยรวม (รหัสตรงมาก่อนชื่อ)
+        # กรอง stock → เผื่อ candidate ไว้มากขึ้น เพราะบางส่วนจะถูกตัดทิ้ง
+        wanted = limit * (8 if min_stock is not None else 4)
+        buckets = ([], [], [])
+        seen = set()
+        i = bisect_left(self.keys, prefix)
+        n = len(self.keys)
+        while i < n and self.keys[i].startswith(prefix):
+            _, rank, pid = self.entries[i]
+            i += 1
+            if pid in seen:
+                continue
+            seen.add(pid)
+            buckets[rank].append(pid)
+            # prefix สั้นๆ อาจตรงหลายหมื่น key → หยุดเมื่อได้ผลพอแล้ว
+            if (min_stock is None and len(buckets[RANK_CODE]) >= limit) or len(seen) >= wanted:
+                break
+
+        candidates = buckets[RANK_CODE] + buckets[RANK_NAME] + buckets[RANK_WORD]
+        stocks = stock_of(candidates) if stock_of and candidates else {}
+        results = []
+        for pid in candidates:
+            stock = stocks.get(pid)
+            if stock_of is not None and stock is None:
+                continue  # ถูกลบไปหลัง build ดัชนี
+            if min_stock is not None and (stock or 0) < min_stock:
+                continue
+            results.append({**self.products[pid], 'stock': stock})
+            if len(results) >= limit:
+                break
+        return results
+
+
+def current_stock(product_ids):
+    return dict(
+        Product.objects.filter(pk__in=product_ids, is_deleted=False).values_list('id', 'stock')
+    )
+
+
+def search(prefix, limit=10, min_stock=None):
+    """ค้นจากดัชนี + stock ปัจจุบันของสินค้าที่ match"""
+    return get_index().lookup(prefix, limit=limit, stock_of=current_stock, min_stock=min_stock)
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def build_index():
+    rows = Product.objects.filter(is_deleted=False).values_list(
+        'id', 'code', 'name'
+    ).iterator(chunk_size=5000)
+    return PrefixIndex(rows)
+
+
+def get_index():
+    """คืนดัชนีปัจจุบัน — build ใหม่เฉพาะเมื่อ change counter เปลี่ยน"""
+    global _index, _index_version
+    version = get_version()
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version:
+            _index = build_index()
+            _index_version = version
+    return _index
@@ -0,0 +1,165 @@
+# inventory/benchmarks.py
+# ชุด benchmark ของ endpoint ที่ถูกเรียกบ่อย (ใช้กับ manage.py run_benchmarks)
+#
+# เรียก endpoint ผ่าน APIClient ใน process เดียวกัน แล้ววัด
+# - เวลา (p50 / p95 / p99), จำนวน query และหน่วยความจำสูงสุด (tracemalloc)
+# ผลลัพธ์เป็น dict ที่บันทึกเป็น JSON baseline และเทียบกับรอบก่อนได้
+
+import statistics
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import caching
+from .models import Product
+
+BENCH_ADMIN = 'bench_admin'
+BENCH_EMPLOYEE = 'bench_employee'
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Scenario:
+    """request 1 แบบ: method + url + params ของ user บทบาทหนึ่ง"""
+
+    def __init__(self, name, url, method='get', data=None, role='admin', rollback=False):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.data = data
+        self.role = role
+        # endpoint ที่เขียนข้อมูล → ทำใน transaction แล้ว rollback ให้ข้อมูลคงเดิมทุกรอบ
+        self.rollback = rollback
+
+    def call(self, client):
+        data = self.data() if callable(self.data) else self.data
+        request = getattr(client, self.method)
+        if self.method == 'get':
+            return request(self.url, data)
+        if not self.rollback:
+            return request(self.url, data, format='json')
+        response = None
+        try:
+            with transaction.atomic():
+                response = request(self.url, data, format='json')
+                raise _Rollback
+        except _Rollback:
+            pass
+        return response
+
+
+def _issue_payload():
+    product = Product.objects.filter(is_deleted=False, stock__gte=10).order_by('-stock').first()
+    if product is None:
+        return {'items': []}
+    return {'items': [{'product': product.id, 'qty': 1}]}
+
+
+def default_scenarios():
+    today = timezone.localdate()
+    return [
+        Scenario('issue_products', '/api/issue-products/', method='post',
+                 data=_issue_payload, role='employee', rollback=True),
+        Scenario('product_list', '/api/products/', data={'page_size': 50}),
+        Scenario('product_search', '/api/products/', data={'search': 'กาแฟ'}),
+        Scenario('product_autocomplete', '/api/products/autocomplete/', data={'q': 'SYN00'}),
+        Scenario('employee_dashboard', '/api/employee-dashboard/overview/', role='employee'),
+        Scenario('admin_dashboard', '/api/admin-dashboard/overview/'),
+        Scenario('movement_history', '/api/movement-history/', data={'limit': 50}),
+        Scenario('top_products_month', '/api/best-sellers/top_products/', data={'period': 'month'}),
+        Scenario('top_products_all', '/api/best-sellers/top_products/', data={'period': 'all'}),
+        Scenario('festival_calendar', '/api/festivals/calendar/',
+                 data={'year': today.year, 'month': today.month}),
+    ]
+
+
+def bench_users():
+    User = get_user_model()
+    admin, _ = User.objects.get_or_create(username=BENCH_ADMIN, defaults={'role': 'admin'})
+    employee, _ = User.objects.get_or_create(username=BENCH_EMPLOYEE, defaults={'role': 'employee'})
+    return {'admin': admin, 'employee': employee}
+
+
+def run_scenario(scenario, client, iterations=20, warmup=2, warm_cache=False):
+    for _ in range(warmup):
+        scenario.call(client)
+
+    timings = []
+    queries = []
+    peak_memory = 0
+    status_code = None
+    for _ in range(iterations):
+        # cold: ข้าม response cache แทน cache.clear() (ไม่ล้าง session / ข้อมูลของ process อื่นที่ใช้ cache ร่วม)
+        cold = nullcontext() if warm_cache else caching.bypass()
+        tracemalloc.start()
+        with cold, CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = scenario.call(client)
+            elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.append(elapsed * 1000)
+        queries.append(len(ctx.captured_queries))
+        peak_memory = max(peak_memory, peak)
+        status_code = response.status_code if response is not None else None
+
+    timings.sort()
+    return {
+        'status': status_code,
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+        'peak_kb': round(peak_memory / 1024, 1),
+    }
+
+
+def run_suite(scenarios=None, iterations=20, warmup=2, warm_cache=False, only=None):
+    users = bench_users()
+    clients = {}
+    for role, user in users.items():
+        client = APIClient()
+        client.force_authenticate(user)
+        clients[role] = client
+
+    results = {}
+    for scenario in scenarios or default_scenarios():
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = run_scenario(
+            scenario, clients[scenario.role],
+            iterations=iterations, warmup=warmup, warm_cache=warm_cache,
+        )
+    return results
+
+
+def compare(results, baseline, tolerance=0.2, metric='p95_ms'):
+    """
+    เทียบกับ baseline คืน [(ชื่อ, ค่าเดิม, ค่าใหม่, สัดส่วนที่เปลี่ยน, ช้าลงเกิน tolerance ไหม)]
+    """
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or not previous.get(metric):
+            continue
+        change = (current[metric] - previous[metric]) / previous[metric]
+        rows.append((name, previous[metric], current[metric], change, change > tolerance))
+    return rows
@@ -0,0 +1,159 @@
+# inventory/caching.py
+# cache ผลลัพธ์ของ endpoint ที่อ่านบ่อย พร้อมล้าง cache ตาม tag เมื่อข้อมูลเปลี่ยน
+#
+# แต่ละ tag (เช่น 'products', 'issues') มีเลข version เก็บในตาราง ChangeCounter (ดู SHARED VERSIONS)
+# key ของข้อมูลจะรวม version ของทุก tag ที่เกี่ยวข้องไว้ด้วย
+# → invalidate(tag) แค่เพิ่ม version ข้อมูลเก่าจะไม่ถูกอ่านอีก (หมดอายุเองตาม TIMEOUT)
+#   version อยู่ใน DB ไม่ใช่ cache → ถึง cache เป็น locmem แยกต่อ process ทุก worker ก็เลิกใช้ข้อมูลเก่าเหมือนกัน
+
+import contextvars
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.conf import settings
+from django.db.models import F
+
+from .models import ChangeCounter
+
+KEY_PREFIX = 'inventory'
+
+# tag ที่ใช้ในระบบ
+TAG_PRODUCTS = 'products'
+TAG_CATEGORIES = 'categories'
+TAG_ISSUES = 'issues'
+TAG_FESTIVALS = 'festivals'
+TAG_EVENTS = 'events'
+TAG_TASKS = 'tasks'
+
+_MISS = object()
+
+
+def tag_versions(tags):
+    return shared_versions(tags)
+
+
+def invalidate(*tags):
+    """ล้าง cache ทุก key ที่ผูกกับ tag เหล่านี้ (ทุก process)"""
+    bump_shared(*tags)
+
+
+# ================ METRICS (ต่อ process) ================
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(name, hit):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        entry['hits' if hit else 'misses'] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        endpoints = {}
+        total_hits = total_misses = 0
+        for name, entry in sorted(_stats.items()):
+            lookups = entry['hits'] + entry['misses']
+            endpoints[name] = {
+                'hits': entry['hits'],
+                'misses': entry['misses'],
+                'hit_ratio': round(entry['hits'] / lookups, 4) if lookups else 0,
+            }
+            total_hits += entry['hits']
+            total_misses += entry['misses']
+    lookups = total_hits + total_misses
+    return {
+        'backend': settings.CACHES['default']['BACKEND'],
+        'hits': total_hits,
+        'misses': total_misses,
+        'hit_ratio': round(total_hits / lookups, 4) if lookups else 0,
+        'endpoints': endpoints,
+    }
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+# ================ GET OR SET ================
+
+def make_key(name, parts, versions):
+    raw = ':'.join(str(p) for p in parts)
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f"{KEY_PREFIX}:{name}:{digest}:{'.'.join(str(v) for v in versions)}"
+
+
+_bypass = contextvars.ContextVar('inventory_cache_bypass', default=False)
+
+
+@contextmanager
+def bypass():
+    """ภายใน block นี้ get_or_set คำนวณใหม่ทุกครั้ง ไม่อ่าน/ไม่เขียน cache (วัดเวลาแบบ cold)"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def get_or_set(name, parts, tags, compute, timeout=None):
+    """
+    คืนค่าจาก cache ถ้ามี ไม่งั้นเรียก compute() แล้วเก็บไว้
+    - name: ชื่อ endpoint (ใช้แยก metrics)
+    - parts: ค่าที่ทำให้ผลลัพธ์ต่างกัน เช่น (year, month)
+    - tags: tag ของข้อมูลที่ใช้คำนวณ
+    """
+    if _bypass.get():
+        return compute()
+    key = make_key(name, parts, tag_versions(tags))
+    value = cache.get(key, _MISS)
+    if value is not _MISS:
+        _record(name, hit=True)
+        return value
+    _record(name, hit=False)
+    value = compute()
+    cache.set(key, value, timeout)
+    return value
+
+
+# ================ SHARED VERSIONS (ฐานข้อมูล) ================
+# cache ค่าเริ่มต้นเป็น locmem (แยกต่อ process) → version ใน cache ใช้บอก worker อื่นไม่ได้
+# tag ของ cache และข้อมูลที่ memo ไว้ใน process (ดัชนี autocomplete / ปฏิทินเทศกาล / ETag) จึงใช้ version จาก
+# ตาราง ChangeCounter แทน: อ่านด้วย primary key query เดียว และจำผลไว้ไม่เกิน
+# SHARED_VERSION_CHECK_SECONDS → worker อื่นเห็นการเปลี่ยนแปลงช้าสุดเท่านั้น
+
+_shared_lock = threading.Lock()
+_shared_seen = {}
+
+
+def _check_seconds():
+    return getattr(settings, 'SHARED_VERSION_CHECK_SECONDS', 1.0)
+
+
+def shared_versions(names):
+    names = tuple(names)
+    now = time.monotonic()
+    seen = _shared_seen.get(names)
+    if seen is not None and now - seen[0] < _check_seconds():
+        return seen[1]
+    found = dict(ChangeCounter.objects.filter(name__in=names).values_list('name', 'version'))
+    versions = [found.get(n, 0) for n in names]
+    with _shared_lock:
+        _shared_seen[names] = (now, versions)
+    return versions
+
+
+def bump_shared(*names):
+    """เพิ่ม version ที่ใช้ร่วมกันทุก process (UPDATE เดียว สร้างแถวที่ยังไม่มี)"""
+    updated = ChangeCounter.objects.filter(name__in=names).update(version=F('version') + 1)
+    if updated < len(names):
+        for name in names:
+            ChangeCounter.objects.get_or_create(name=name, defaults={'version': 1})
+    with _shared_lock:
+        # process นี้เห็นค่าใหม่ทันที
+        _shared_seen.clear()
@@ -0,0 +1,197 @@
+# inventory/calendar_feed.py
+# ปฏิทินรวม: เทศกาล + บันทึกของฉัน (CustomEvent) + กำหนดส่งงาน (Task) ในช่วงวันที่เดียว
+#
+# - แต่ละแหล่งใช้ query เดียวที่ใช้ index ได้:
+#   เทศกาลจาก recurrence.get_calendar() (ไม่ query ถ้า memo อยู่แล้ว)
+#   CustomEvent = UNION (ของตัวเอง, ที่แชร์) แทน OR + DISTINCT ที่ MySQL สแกนทั้งตาราง
+#   Task = assigned_to + due_date (Admin เห็นทั้งหมด → due_date อย่างเดียว)
+# - รายการเป็น dict สั้นๆ (ไม่ผ่าน serializer เต็ม)
+# - ETag มาจาก version ของ cache tag → ตอบ 304 ได้โดยไม่แตะฐานข้อมูล
+# - iCalendar (.ics) สร้างทีละบรรทัดแบบ stream สำหรับช่วงยาว
+
+import hashlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from .models import CustomEvent, Task
+from . import caching, recurrence
+
+MAX_FEED_DAYS = 366
+MAX_ICS_DAYS = 366 * 5
+
+TAGS = (caching.TAG_FESTIVALS, caching.TAG_EVENTS, caching.TAG_TASKS)
+
+EVENT_FIELDS = ('id', 'title', 'date', 'event_type', 'priority', 'is_shared')
+TASK_FIELDS = ('id', 'title', 'due_date', 'status', 'priority', 'task_type')
+
+
+class FeedError(Exception):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def parse_range(params, max_days=MAX_FEED_DAYS):
+    """?start=YYYY-MM-DD&end=YYYY-MM-DD (รวม end) ไม่ส่ง → เดือนปัจจุบัน"""
+    try:
+        if params.get('start') or params.get('end'):
+            first = datetime.strptime(params['start'], '%Y-%m-%d').date()
+            last = datetime.strptime(params['end'], '%Y-%m-%d').date()
+        else:
+            today = timezone.localdate()
+            first, last = recurrence.month_range(today.year, today.month)
+    except (KeyError, ValueError):
+        raise FeedError('start / end ต้องเป็น YYYY-MM-DD ทั้งคู่')
+    if last < first:
+        raise FeedError('end ต้องไม่ก่อน start')
+    if (last - first).days + 1 > max_days:
+        raise FeedError(f'ช่วงวันที่ยาวได้ไม่เกิน {max_days} วัน')
+    return first, last
+
+
+def _scope(user):
+    # Admin เห็นงานทุกคน (เหมือน TaskViewSet)
+    return user.is_staff or user.is_superuser
+
+
+def etag(user, first, last):
+    raw = f'{user.pk}:{_scope(user)}:{first}:{last}:' + '.'.join(
+        str(v) for v in caching.shared_versions(TAGS)
+    )
+    return '"cal-' + hashlib.md5(raw.encode('utf-8')).hexdigest() + '"'
+
+
+# ================ QUERIES ================
+
+def festival_rows(first, last):
+    return recurrence.get_calendar().between(first, last)
+
+
+def event_rows(user, first, last):
+    """CustomEvent ของตัวเอง + ที่แชร์ (UNION → ไม่ซ้ำ, แต่ละฝั่งใช้ index ของตัวเอง)"""
+    own = CustomEvent.objects.filter(created_by=user, date__gte=first, date__lte=last)
+    shared = CustomEvent.objects.filter(is_shared=True, date__gte=first, date__lte=last)
+    # Meta.ordering ใส่ใน subquery ของ UNION ไม่ได้ → order_by() ว่างก่อน
+    return own.order_by().values_list(*EVENT_FIELDS).union(
+        shared.order_by().values_list(*EVENT_FIELDS)
+    ).order_by('date', 'id')
+
+
+def _day_bounds(first, last):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first, time.min), tz)
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def task_rows(user, first, last):
+    start, end = _day_bounds(first, last)
+    tasks = Task.objects.filter(due_date__gte=start, due_date__lt=end)
+    if not _scope(user):
+        tasks = tasks.filter(assigned_to=user)
+    return tasks.order_by('due_date', 'id').values_list(*TASK_FIELDS)
+
+
+# ================ JSON ================
+
+def build_feed(user, first, last):
+    entries = []
+    for f in festival_rows(first, last):
+        entries.append({
+            'type': 'festival', 'id': f.id, 'title': f.name,
+            'start': f.start_date.isoformat(), 'end': f.end_date.isoformat(), 'all_day': True,
+            'icon': f.icon, 'color': f.color, 'projected': getattr(f, 'is_projected', False),
+        })
+    for pk, title, day, event_type, priority, shared in event_rows(user, first, last):
+        entries.append({
+            'type': 'event', 'id': pk, 'title': title,
+            'start': day.isoformat(), 'end': day.isoformat(), 'all_day': True,
+            'event_type': event_type, 'priority': priority, 'shared': shared,
+        })
+    for pk, title, due, task_status, priority, task_type in task_rows(user, first, last):
+        due = timezone.localtime(due)
+        entries.append({
+            'type': 'task', 'id': pk, 'title': title,
+            'start': due.isoformat(), 'end': due.isoformat(), 'all_day': False,
+            'status': task_status, 'priority': priority, 'task_type': task_type,
+        })
+    # เรียงตามวัน (ส่วนวันที่ของ start) แล้วตามชนิด
+    order = {'festival': 0, 'event': 1, 'task': 2}
+    entries.sort(key=lambda e: (e['start'][:10], order[e['type']], e['start']))
+    return {
+        'start': first.isoformat(),
+        'end': last.isoformat(),
+        'count': len(entries),
+        'entries': entries,
+    }
+
+
+def get_feed(user, first, last):
+    # key รวม version ชุดเดียวกับ ETag (ChangeCounter) → ETag ใหม่ไม่มีทางได้ข้อมูลเก่าจาก cache ของ worker นี้
+    return caching.get_or_set(
+        'calendar_feed', (user.pk, _scope(user), first, last), TAGS,
+        lambda: build_feed(user, first, last),
+    )
+
+
+# ================ iCalendar ================
+
+def _escape(text):
+    return (
+        (text or '').replace('\\', '\\\\').replace(';', '\\;')
+        .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """ตัดบรรทัดยาวเกิน 75 byte (RFC 5545) โดยไม่ตัดกลางตัวอักษร UTF-8"""
+    if len(line.encode('utf-8')) <= 75:
+        return line + '\r\n'
+    parts, current, size = [], [], 0
+    for ch in line:
+        width = len(ch.encode('utf-8'))
+        if size + width > 75:
+            parts.append(''.join(current))
+            current, size = [' '], 1
+        current.append(ch)
+        size += width
+    parts.append(''.join(current))
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def _event(uid, stamp, summary, start, end=None, all_day=True, description=''):
+    lines = ['BEGIN:VEVENT', f'UID:{uid}', f'DTSTAMP:{stamp}']
+    if all_day:
+        # DTEND ของวันทั้งวันเป็นวันถัดไป (ไม่รวม)
+        lines.append(f'DTSTART;VALUE=DATE:{start:%Y%m%d}')
+        lines.append(f'DTEND;VALUE=DATE:{(end or start) + timedelta(days=1):%Y%m%d}')
+    else:
+        lines.append(f'DTSTART:{start.astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}')
+    lines.append(f'SUMMARY:{_escape(summary)}')
+    if description:
+        lines.append(f'DESCRIPTION:{_escape(description)}')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def iter_ics(user, first, last, host='easystock'):
+    """สร้าง .ics ทีละ VEVENT (ใช้กับ StreamingHttpResponse)"""
+    stamp = f'{timezone.now().astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}'
+    yield (
+        'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//EasyStock//Calendar//TH\r\n'
+        'CALSCALE:GREGORIAN\r\nX-WR-TIMEZONE:Asia/Bangkok\r\n'
+    )
+    for f in festival_rows(first, last):
+        yield _event(
+            f'festival-{f.id}-{f.start_date:%Y%m%d}@{host}', stamp,
+            f'{f.icon} {f.name}', f.start_date, f.end_date, description=f.description or '',
+        )
+    for pk, title, day, _, _, _ in event_rows(user, first, last).iterator():
+        yield _event(f'event-{pk}@{host}', stamp, title, day)
+    for pk, title, due, task_status, _, _ in task_rows(user, first, last).iterator(chunk_size=2000):
+        yield _event(
+            f'task-{pk}@{host}', stamp, title, due, all_day=False, description=f'status: {task_status}',
+        )
+    yield 'END:VCALENDAR\r\n'
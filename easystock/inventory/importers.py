@@ -0,0 +1,340 @@
+# inventory/importers.py
+# นำเข้าสินค้าจำนวนมากจากไฟล์ CSV / XLSX (upsert ตาม code ของสินค้าที่ยังไม่ถูกลบ)
+
+import codecs
+import csv
+import logging
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from .models import Category, Product
+from . import audit, search, autocomplete, caching
+from . import stock as stock_ledger
+
+logger = logging.getLogger(__name__)
+
+# openpyxl เป็น optional — ใช้เฉพาะตอนนำเข้าไฟล์ .xlsx
+try:
+    import openpyxl
+    XLSX_AVAILABLE = True
+except ImportError:
+    openpyxl = None
+    XLSX_AVAILABLE = False
+
+
+# คอลัมน์ที่รองรับ (ชื่อหัวตาราง → field ของ Product)
+COLUMN_ALIASES = {
+    'code': 'code',
+    'รหัส': 'code',
+    'name': 'name',
+    'ชื่อ': 'name',
+    'selling_price': 'selling_price',
+    'price': 'selling_price',
+    'ราคา': 'selling_price',
+    'unit': 'unit',
+    'หน่วย': 'unit',
+    'stock': 'stock',
+    'จำนวน': 'stock',
+    'category': 'category',
+    'หมวดหมู่': 'category',
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class ImportFormatError(Exception):
+    """ไฟล์ที่อัปโหลดอ่านไม่ได้ หรือไม่มีคอลัมน์ที่จำเป็น"""
+
+
+# ================ ROW READERS ================
+
+def _normalize_header(header):
+    columns = []
+    for h in header:
+        key = str(h or '').strip().lower()
+        columns.append(COLUMN_ALIASES.get(key))
+    if 'code' not in columns or 'name' not in columns:
+        raise ImportFormatError("ไฟล์ต้องมีคอลัมน์ code และ name")
+    return columns
+
+
+def _rows_from_table(table_rows):
+    """แปลง iterator ของแถว (list) → (เลขแถว, dict) โดยแถวแรกเป็นหัวตาราง"""
+    table_rows = iter(table_rows)
+    try:
+        header = next(table_rows)
+    except StopIteration:
+        raise ImportFormatError("ไฟล์ว่างเปล่า")
+
+    columns = _normalize_header(header)
+    # แถวที่ 1 คือหัวตาราง ข้อมูลจริงเริ่มที่แถวที่ 2 (ตรงกับที่เห็นใน Excel)
+    for row_no, values in enumerate(table_rows, start=2):
+        if not values or all(v in (None, '') for v in values):
+            continue
+        row = {}
+        for col, value in zip(columns, values):
+            if col:
+                row[col] = value
+        yield row_no, row
+
+
+def read_csv(fileobj, encoding='utf-8-sig'):
+    """อ่าน CSV แบบ stream ทีละบรรทัด ไม่โหลดทั้งไฟล์เข้า memory"""
+    try:
+        yield from _rows_from_table(csv.reader(codecs.iterdecode(fileobj, encoding)))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"อ่านไฟล์ CSV ไม่ได้: {e}")
+
+
+def read_xlsx(fileobj):
+    """อ่าน XLSX ด้วย openpyxl แบบ read_only (stream ทีละแถว)"""
+    if not XLSX_AVAILABLE:
+        raise ImportFormatError("ต้องติดตั้ง openpyxl ก่อนนำเข้าไฟล์ .xlsx")
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f"อ่านไฟล์ XLSX ไม่ได้: {e}")
+    sheet = workbook.active
+    return _rows_from_table(sheet.iter_rows(values_only=True))
+
+
+def read_rows(fileobj, filename='', file_format=None):
+    """เลือก reader ตามนามสกุลไฟล์ หรือ format ที่ระบุมา"""
+    file_format = (file_format or filename.rsplit('.', 1)[-1]).lower()
+    if file_format == 'csv':
+        return read_csv(fileobj)
+    if file_format in ('xlsx', 'xlsm'):
+        return read_xlsx(fileobj)
+    raise ImportFormatError("รองรับเฉพาะไฟล์ .csv และ .xlsx")
+
+
+# ================ IMPORTER ================
+
+class ProductImporter:
+    """
+    นำเข้าสินค้าเป็นชุด (batch)
+    - validate ทีละแถว เก็บ error แยกตามเลขแถว
+    - upsert ตาม code ของสินค้าที่ is_deleted=False (ตรงกับ uniq_product_code_active)
+    - สร้างด้วย bulk_create / แก้ไขด้วย bulk_update ทีละ batch
+    """
+
+    def __init__(self, user=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        self.user = user if user and user.is_authenticated else None
+        self.batch_size = max(1, int(batch_size))
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self._seen_codes = {}
+        self._categories = {}
+
+    # ── validate ──────────────────────────────────────────────
+    def _clean_row(self, row):
+        errors = []
+        cleaned = {}
+
+        code = str(row.get('code') or '').strip()
+        if not code:
+            errors.append("code is required")
+        elif len(code) > 50:
+            errors.append("code is too long (max 50)")
+        cleaned['code'] = code
+
+        name = str(row.get('name') or '').strip()
+        if not name:
+            errors.append("name is required")
+        elif len(name) > 200:
+            errors.append("name is too long (max 200)")
+        cleaned['name'] = name
+
+        if 'selling_price' in row:
+            raw = row['selling_price']
+            try:
+                price = Decimal(str(raw).strip() or '0').quantize(Decimal('0.01'))
+                if price < 0:
+                    errors.append("selling_price must be >= 0")
+                cleaned['selling_price'] = price
+            except (InvalidOperation, ValueError):
+                errors.append(f"invalid selling_price: {raw}")
+
+        if 'stock' in row:
+            raw = row['stock']
+            try:
+                stock = int(Decimal(str(raw).strip() or '0'))
+                if stock < 0:
+                    errors.append("stock must be >= 0")
+                cleaned['stock'] = stock
+            except (InvalidOperation, ValueError):
+                errors.append(f"invalid stock: {raw}")
+
+        if 'unit' in row:
+            unit = str(row['unit'] or '').strip()
+            if len(unit) > 50:
+                errors.append("unit is too long (max 50)")
+            cleaned['unit'] = unit or "ชิ้น"
+
+        if 'category' in row:
+            category = str(row['category'] or '').strip()
+            if len(category) > 100:
+                errors.append("category is too long (max 100)")
+            cleaned['category'] = category or None
+
+        return cleaned, errors
+
+    # ── category lookup (1 query ต่อ batch) ─────────────────────
+    def _resolve_categories(self, names):
+        missing = {n for n in names if n and n not in self._categories}
+        if not missing:
+            return
+        for cat in Category.objects.filter(name__in=missing):
+            self._categories[cat.name] = cat
+        to_create = [Category(name=n) for n in missing if n not in self._categories]
+        if to_create and not self.dry_run:
+            Category.objects.bulk_create(to_create, ignore_conflicts=True)
+            for cat in Category.objects.filter(name__in=[c.name for c in to_create]):
+                self._categories[cat.name] = cat
+
+    # ── process batch ─────────────────────────────────────────
+    def _process_batch(self, batch):
+        valid = []
+        for row_no, row in batch:
+            cleaned, errors = self._clean_row(row)
+            code = cleaned['code']
+            if code and code in self._seen_codes:
+                errors.append(
+                    f"duplicate code in file (first seen at row {self._seen_codes[code]})"
+                )
+            if errors:
+                self.errors.append({'row': row_no, 'code': code, 'errors': errors})
+                continue
+            self._seen_codes[code] = row_no
+            valid.append((row_no, cleaned))
+
+        if not valid:
+            return
+
+        self._resolve_categories(
+            c.get('category') for _, c in valid if c.get('category')
+        )
+
+        # ดึงสินค้าที่ active อยู่แล้วด้วย code ในครั้งเดียว
+        codes = [c['code'] for _, c in valid]
+        existing = {
+            p.code: p
+            for p in Product.objects.filter(is_deleted=False, code__in=codes)
+        }
+
+        to_create = []
+        to_update = []
+        update_fields = set()
+        counts = []
+        for _, cleaned in valid:
+            category = None
+            if cleaned.get('category'):
+                category = self._categories.get(cleaned['category'])
+
+            product = existing.get(cleaned['code'])
+            if product is None:
+                stock = cleaned.get('stock', 0)
+                to_create.append(Product(
+                    code=cleaned['code'],
+                    name=cleaned['name'],
+                    selling_price=cleaned.get('selling_price', Decimal('0')),
+                    unit=cleaned.get('unit', "ชิ้น"),
+                    stock=stock,
+                    initial_stock=stock,
+                    category=category,
+                    created_by=self.user,
+                ))
+                continue
+
+            for field, value in cleaned.items():
+                if field == 'code':
+                    continue
+                if field == 'stock':
+                    # stock ของสินค้าเดิม → ผ่าน stock.adjust_many (StockMovement + stock_version)
+                    counts.append({'product': product.pk, 'count': value})
+                    continue
+                if field == 'category':
+                    product.category = category
+                else:
+                    setattr(product, field, value)
+                update_fields.add(field)
+            to_update.append(product)
+
+        if self.dry_run:
+            self.created += len(to_create)
+            self.updated += len(to_update)
+            return
+
+        try:
+            with transaction.atomic():
+                if to_create:
+                    Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+                    # MySQL ไม่คืน id จาก bulk_create → ดึง id ใหม่จาก code (ใช้กับ AuditLog)
+                    new_ids = dict(
+                        Product.objects.filter(
+                            is_deleted=False, code__in=[p.code for p in to_create]
+                        ).values_list('code', 'id')
+                    )
+                    for p in to_create:
+                        p.pk = p.pk or new_ids.get(p.code)
+                if to_update and update_fields:
+                    Product.objects.bulk_update(
+                        to_update, sorted(update_fields), batch_size=self.batch_size
+                    )
+                audit.record_many(
+                    [(p, 'create', audit.created_changes(p)) for p in to_create]
+                    + [(p, 'update', audit.diff(p, update_fields)) for p in to_update],
+                    user=self.user,
+                )
+                if counts:
+                    stock_ledger.adjust_many(
+                        counts, user=self.user, reason='count', note='นำเข้าจากไฟล์',
+                        record_unchanged=False,
+                    )
+        except (IntegrityError, stock_ledger.StockError) as e:
+            # มีคนสร้าง code ซ้ำ / ลบสินค้าพร้อมกัน → ทั้ง batch ไม่ถูกบันทึก
+            logger.warning(f"Product import batch failed: {e}")
+            for row_no, cleaned in valid:
+                self.errors.append({
+                    'row': row_no,
+                    'code': cleaned['code'],
+                    'errors': [f"database error: {e}"],
+                })
+            return
+
+        # bulk_create/bulk_update ไม่ส่ง signal → อัปเดตดัชนีค้นหาเองทั้ง batch
+        # (MySQL ไม่คืน id จาก bulk_create จึงดึง id ใหม่จาก code)
+        search.reindex_products(
+            Product.objects.filter(is_deleted=False, code__in=codes)
+            .values_list('id', flat=True)
+        )
+        transaction.on_commit(autocomplete.bump_version)
+        transaction.on_commit(
+            lambda: caching.invalidate(caching.TAG_PRODUCTS, caching.TAG_CATEGORIES)
+        )
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+    def run(self, rows):
+        batch = []
+        for row_no, row in rows:
+            batch.append((row_no, row))
+            if len(batch) >= self.batch_size:
+                self._process_batch(batch)
+                batch = []
+        if batch:
+            self._process_batch(batch)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'dry_run': self.dry_run,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': len(self.errors),
+            'errors': sorted(self.errors, key=lambda e: e['row']),
+        }
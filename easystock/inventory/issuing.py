@@ -0,0 +1,180 @@
+# inventory/issuing.py
+# เบิกสินค้าออกจากคลัง (ใช้โดย issue_products และ harness ทดสอบการแย่งล็อก)
+#
+# - ล็อกสินค้าทุกตัวในใบเบิกด้วย query เดียว เรียงตาม id เสมอ
+#   → ทุก request ล็อกตามลำดับเดียวกัน ไม่เกิด deadlock ระหว่างใบเบิกด้วยกันเอง
+# - ถ้ายังเจอ deadlock / lock wait timeout (เช่นชนกับงานอื่นที่ล็อกคนละลำดับ)
+#   จะ rollback แล้วลองใหม่อัตโนมัติ (สูงสุด MAX_ATTEMPTS ครั้ง)
+# - error ทางธุรกิจ (ไม่พบสินค้า / สต็อกไม่พอ) → IssueError และ rollback ทั้งใบ
+
+import random
+import threading
+import time
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from .models import Product, Issue, IssueLine, Listing
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 0.05  # วินาที (คูณตามจำนวนครั้งที่ลอง + jitter)
+
+# MySQL: 1213 = deadlock, 1205 = lock wait timeout
+RETRYABLE_MYSQL_CODES = {1205, 1213}
+
+
+class IssueError(Exception):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+# ================ METRICS (ต่อ process) ================
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+        _stats.update({
+            'issues': 0,
+            'failed': 0,
+            'deadlocks': 0,
+            'retries': 0,
+            'lock_wait_total': 0.0,
+            'lock_wait_max': 0.0,
+        })
+
+
+reset_stats()
+
+
+def _record(**values):
+    with _stats_lock:
+        for key, value in values.items():
+            if key == 'lock_wait':
+                _stats['lock_wait_total'] += value
+                _stats['lock_wait_max'] = max(_stats['lock_wait_max'], value)
+            else:
+                _stats[key] += value
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+# ================ ISSUE ================
+
+def parse_items(items):
+    """[(product_id, qty)] ตามลำดับใน payload ข้ามรายการที่ไม่ถูกต้อง"""
+    parsed = []
+    for it in items:
+        pid = int(it.get("product", 0) or 0)
+        qty = int(it.get("qty", 0) or 0)
+        if pid <= 0 or qty <= 0:
+            continue
+        parsed.append((pid, qty))
+    return parsed
+
+
+def _issue_once(user, parsed):
+    with transaction.atomic():
+        issue = Issue.objects.create(created_by=user)
+
+        # ล็อกทุกแถวในครั้งเดียว เรียงตาม id → ลำดับการล็อกเหมือนกันทุก request
+        pids = sorted({pid for pid, _ in parsed})
+        started = time.perf_counter()
+        products = {
+            p.id: p for p in Product.objects.select_for_update().filter(
+                id__in=pids, is_deleted=False
+            ).order_by('id')
+        }
+        _record(lock_wait=time.perf_counter() - started)
+
+        for pid in pids:
+            if pid not in products:
+                raise IssueError(f"product {pid} not found", status_code=404)
+
+        # ทำงานตามลำดับ id เดียวกัน (Listing ก็ถูกล็อกตามลำดับนี้ด้วย)
+        stock_left = {pid: p.stock for pid, p in products.items()}
+        version = {pid: p.stock_version for pid, p in products.items()}
+        for pid, qty in sorted(parsed, key=lambda item: item[0]):
+            p = products[pid]
+            if stock_left[pid] < qty:
+                raise IssueError(f"stock not enough for product {p.code}")
+            stock_left[pid] -= qty
+            version[pid] += 1
+
+            # หักสต็อก (save → signal reindex / ล้าง cache ทำงานเหมือนเดิม)
+            p.stock = F("stock") - qty
+            p.stock_version = F("stock_version") + 1
+            p.on_sale = True
+            p.save(update_fields=["stock", "stock_version", "on_sale"])
+            IssueLine.objects.create(issue=issue, product=p, qty=qty)
+
+            # อัปเดต Listing — ถ้ายังไม่มี → สร้างใหม่, ถ้ามีแล้ว → เพิ่ม quantity
+            listing, created = Listing.objects.get_or_create(
+                product=p,
+                defaults={
+                    "is_active": True,
+                    "title": p.name,
+                    "sale_price": p.selling_price,
+                    "unit": p.unit,
+                    "quantity": qty
+                }
+            )
+            if not created:
+                listing.quantity = F("quantity") + qty
+                listing.is_active = True
+                listing.save(update_fields=["quantity", "is_active"])
+
+        # ค่าใน DB = ค่าที่ล็อกไว้ - ที่หัก (ไม่ต้อง refresh_from_db ทีละตัว)
+        for pid, p in products.items():
+            p.stock = stock_left[pid]
+            p.stock_version = version[pid]
+
+    # คืนคู่ (สินค้า, จำนวน) ตามลำดับใน payload
+    return issue, [(products[pid], qty) for pid, qty in parsed]
+
+
+def is_retryable(exc):
+    code = exc.args[0] if exc.args else None
+    if code in RETRYABLE_MYSQL_CODES:
+        return True
+    message = str(exc).lower()
+    return 'deadlock' in message or 'database is locked' in message
+
+
+def issue_products(user, items, max_attempts=MAX_ATTEMPTS):
+    """
+    เบิกสินค้า คืน (issue, [(product, qty)])
+    ลองใหม่เมื่อเจอ deadlock — เฉพาะเมื่อไม่ได้อยู่ใน transaction ภายนอก
+    (ถ้าอยู่ใน transaction อื่น ต้องให้ผู้เรียก rollback ทั้งก้อนเอง)
+    """
+    parsed = parse_items(items)
+    can_retry = not connection.in_atomic_block
+    attempt = 1
+    while True:
+        try:
+            result = _issue_once(user, parsed)
+        except IssueError:
+            _record(failed=1)
+            raise
+        except OperationalError as exc:
+            if not is_retryable(exc):
+                _record(failed=1)
+                raise
+            _record(deadlocks=1)
+            if not can_retry or attempt >= max_attempts:
+                _record(failed=1)
+                raise
+            _record(retries=1)
+            time.sleep(RETRY_BACKOFF * attempt * (1 + random.random()))
+            attempt += 1
+            continue
+        _record(issues=1)
+        return result
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import archive
+from inventory.models import IssueLine
+
+
+class Command(BaseCommand):
+    help = 'Move issue history of closed months into archive tables and build monthly rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=archive.DEFAULT_KEEP_MONTHS,
+            help=f'Months kept in the live tables (default {archive.DEFAULT_KEEP_MONTHS})'
+        )
+        parser.add_argument(
+            '--before', help='Archive months before YYYY-MM (overrides --keep-months)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE,
+            help=f'Lines moved per batch (default {archive.DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Only show what would be archived'
+        )
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = datetime.strptime(options['before'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--before must be YYYY-MM')
+        else:
+            before = archive.archive_cutoff(options['keep_months'])
+
+        months = archive.months_to_archive(before)
+        self.stdout.write(f'\n📦 Archiving issue history before {before:%Y-%m}...\n')
+        if not months:
+            self.stdout.write(self.style.SUCCESS('✅ Nothing to archive\n'))
+            return
+
+        total = 0
+        for month in months:
+            if options['dry_run']:
+                start, end = archive.month_bounds(month)
+                moved = IssueLine.objects.filter(
+                    created_at__gte=start, created_at__lt=end
+                ).count()
+            else:
+                moved = archive.archive_month(month, batch_size=options['batch_size'])
+            total += moved
+            if moved:
+                self.stdout.write(f'   📅 {month:%Y-%m}: {moved} lines')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'\n⚠️  Dry run — {total} lines would be archived\n'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\n✅ Archived {total} lines from {len(months)} months\n'))
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import load_backend
+
+from inventory.benchmarks import percentile
+from myapp import db_pool
+
+BENCH_ALIAS = 'bench'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-request connection latency with and without the connection pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Simulated requests per run')
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker threads')
+        parser.add_argument('--pool-size', type=int, default=8, help='MAX_SIZE of the benchmark pool')
+        parser.add_argument(
+            '--query', default='SELECT 1',
+            help='SQL run once per simulated request (default: SELECT 1)'
+        )
+
+    def handle(self, *args, **options):
+        base_settings = {**connections['default'].settings_dict, 'CONN_MAX_AGE': 0}
+        engine = base_settings['ENGINE']
+        # หา engine ตัวจริง (ไม่ผ่าน pool) สำหรับรอบเปรียบเทียบ
+        plain_engine = next(
+            (vendor for vendor, pooled in settings.DB_POOL_ENGINES.items() if pooled == engine),
+            engine
+        )
+        pooled_engine = settings.DB_POOL_ENGINES.get(plain_engine)
+        if pooled_engine is None:
+            self.stdout.write(self.style.ERROR(f'❌ No pooled backend for {plain_engine}'))
+            return
+
+        self.stdout.write(
+            f"\n🔌 {options['requests']} requests × {options['concurrency']} threads "
+            f"({plain_engine})\n"
+        )
+
+        plain = self._run(plain_engine, base_settings, options)
+        self._report('Without pool', plain)
+
+        pool_settings = {**base_settings, 'POOL': {
+            **db_pool.DEFAULT_POOL_OPTIONS, 'MAX_SIZE': options['pool_size'],
+        }}
+        pooled = self._run(pooled_engine, pool_settings, options)
+        self._report('With pool', pooled)
+
+        pool = db_pool.get_pool(BENCH_ALIAS, pool_settings)
+        stats = pool.stats()
+        pool.close_all()
+        self.stdout.write(
+            f"   pool: created={stats['created']} checkouts={stats['checkouts']} "
+            f"waits={stats['waits']} avg_wait={stats['avg_wait_ms']}ms "
+            f"exhausted={stats['exhausted']} reuse={stats['reuse_ratio']:.1%}"
+        )
+
+        if pooled['p50']:
+            self.stdout.write(self.style.SUCCESS(
+                f"\n✅ p50 {plain['p50']:.2f}ms → {pooled['p50']:.2f}ms "
+                f"({plain['p50'] / pooled['p50']:.1f}x)\n"
+            ))
+
+    def _run(self, engine, settings_dict, options):
+        backend = load_backend(engine)
+        query = options['query']
+
+        def one_request(_):
+            # จำลอง 1 request: เปิด connection → query → ปิดตอนจบ request (CONN_MAX_AGE=0)
+            start = time.perf_counter()
+            conn = backend.DatabaseWrapper(settings_dict, BENCH_ALIAS)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(query)
+                    cursor.fetchall()
+            finally:
+                conn.close()
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            latencies = sorted(executor.map(one_request, range(options['requests'])))
+        elapsed = time.perf_counter() - start
+
+        return {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'rps': len(latencies) / elapsed if elapsed else 0,
+        }
+
+    def _report(self, label, result):
+        self.stdout.write(
+            f"   {label:<13} p50={result['p50']:.2f}ms p95={result['p95']:.2f}ms "
+            f"p99={result['p99']:.2f}ms  {result['rps']:.0f} req/s"
+        )
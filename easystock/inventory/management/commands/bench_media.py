@@ -0,0 +1,76 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views.static import serve as static_serve
+
+from myapp.media import serve_media
+
+
+class Command(BaseCommand):
+    help = 'Compare media serving throughput: django.views.static.serve vs myapp.media.serve_media'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--size-kb', type=int, default=256, help='Image file size (default 256 KB)')
+
+    def handle(self, *args, **options):
+        root = tempfile.mkdtemp(prefix='bench-media-')
+        try:
+            self._run(root, options)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def _run(self, root, options):
+        n = options['requests']
+        image = 'thumbs/ab/abcdef0123456789abcd-md.jpg'
+        script = 'exports/report.json'
+        os.makedirs(os.path.join(root, 'thumbs/ab'))
+        os.makedirs(os.path.join(root, 'exports'))
+        with open(os.path.join(root, image), 'wb') as f:
+            f.write(os.urandom(options['size_kb'] * 1024))
+        text = ('{"product": "สินค้า", "stock": 12345},\n' * 4000).encode()
+        with open(os.path.join(root, script), 'wb') as f:
+            f.write(text)
+        with open(os.path.join(root, script + '.gz'), 'wb') as f:
+            f.write(gzip.compress(text))
+
+        factory = RequestFactory()
+        first = serve_media(factory.get('/'), image, document_root=root)
+        etag, modified = first['ETag'], first['Last-Modified']
+        first.close()
+
+        scenarios = [
+            ('image full', image, {}),
+            ('image 304', image, {'HTTP_IF_NONE_MATCH': etag, 'HTTP_IF_MODIFIED_SINCE': modified}),
+            ('image range 64KB', image, {'HTTP_RANGE': 'bytes=0-65535'}),
+            ('json gzip', script, {'HTTP_ACCEPT_ENCODING': 'gzip, br'}),
+        ]
+        views = [('static.serve', static_serve), ('serve_media', serve_media)]
+
+        self.stdout.write(f'\n🖼️  Media serving benchmark ({n} requests per case)\n')
+        self.stdout.write(f'   {"case":<18} {"view":<14} {"status":>6} {"req/s":>10} {"MB/s":>9} {"bytes/req":>10}')
+        for name, path, headers in scenarios:
+            for view_name, view in views:
+                status, rps, mbps, per_request = self._bench(factory, view, path, headers, root, n)
+                self.stdout.write(
+                    f'   {name:<18} {view_name:<14} {status:>6} {rps:>10.0f} {mbps:>9.1f} {per_request:>10}'
+                )
+        self.stdout.write(self.style.SUCCESS('\n✅ Done\n'))
+
+    def _bench(self, factory, view, path, headers, root, n):
+        total_bytes = 0
+        status = None
+        started = time.perf_counter()
+        for _ in range(n):
+            response = view(factory.get(f'/media/{path}', **headers), path, document_root=root)
+            status = response.status_code
+            body = b''.join(response) if response.streaming else response.content
+            total_bytes += len(body)
+            response.close()
+        elapsed = time.perf_counter() - started
+        return status, n / elapsed, total_bytes / elapsed / 1024 / 1024, total_bytes // n
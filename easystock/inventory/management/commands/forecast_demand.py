@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import forecasting
+from inventory.models import Festival
+
+
+class Command(BaseCommand):
+    help = 'Forecast product demand for upcoming festivals from past issue history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--horizon', type=int, default=forecasting.DEFAULT_HORIZON_DAYS,
+            help='Forecast festivals starting within N days (default 90)'
+        )
+        parser.add_argument(
+            '--history-days', type=int, default=forecasting.DEFAULT_HISTORY_DAYS,
+            help='Days of issue history to learn from (default 730)'
+        )
+        parser.add_argument(
+            '--lead-days', type=int, default=forecasting.DEFAULT_LEAD_DAYS,
+            help='Days before a festival that count as festival demand (default 7)'
+        )
+        parser.add_argument(
+            '--min-qty', type=int, default=1,
+            help='Skip products forecast below this quantity (default 1)'
+        )
+        parser.add_argument(
+            '--festival', type=int, action='append',
+            help='Only forecast this festival id (repeatable)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Print the forecast without saving'
+        )
+
+    def handle(self, *args, **options):
+        if not forecasting.NUMPY_AVAILABLE:
+            raise CommandError('numpy is not installed (pip install numpy)')
+
+        festivals = None
+        if options['festival']:
+            festivals = list(Festival.objects.filter(id__in=options['festival']).order_by('start_date'))
+            if not festivals:
+                raise CommandError('Festival not found')
+
+        today = timezone.localdate()
+        started = time.perf_counter()
+        history, forecasts = forecasting.forecast_upcoming(
+            today=today,
+            horizon_days=options['horizon'],
+            history_days=options['history_days'],
+            lead_days=options['lead_days'],
+            festivals=festivals,
+        )
+        self.stdout.write(
+            f'\n📈 History {history.start} → {today}: {len(history)} products, '
+            f'{len(history.qty)} product-days ({time.perf_counter() - started:.2f}s)\n'
+        )
+        if not forecasts:
+            self.stdout.write(self.style.WARNING('⚠️  No upcoming festivals to forecast\n'))
+            return
+
+        saved = 0
+        for forecast in forecasts:
+            info = forecasting.summary(forecast)
+            self.stdout.write(
+                f'🎉 {forecast.festival.name} ({forecast.window_start} → {forecast.window_end})\n'
+                f'   basis: {forecast.basis} ({forecast.occurrences} past windows), '
+                f'{info["products"]} products, {info["total_qty"]} units, '
+                f'median uplift ×{info["median_uplift"]}'
+            )
+            if not options['dry_run']:
+                saved += forecasting.store(history, forecast, min_qty=options['min_qty'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('\n⚠️  Dry run: nothing saved\n'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'\n✅ Saved {saved} forecasts for {len(forecasts)} festivals '
+                f'({time.perf_counter() - started:.2f}s)\n'
+            ))
@@ -0,0 +1,305 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from inventory import search, autocomplete, caching
+from inventory.models import (
+    Category, Product, Issue, IssueLine, Task, Festival
+)
+
+PREFIX = 'SYN'
+
+NAME_WORDS = [
+    'ข้าวสาร', 'น้ำปลา', 'น้ำตาล', 'ไข่ไก่', 'นมสด', 'กาแฟ', 'ชาเขียว', 'ผงซักฟอก',
+    'สบู่', 'ยาสีฟัน', 'แชมพู', 'กระดาษทิชชู่', 'น้ำดื่ม', 'บะหมี่', 'ปลากระป๋อง',
+    'Rice', 'Coffee', 'Soap', 'Snack', 'Juice', 'Candle', 'Lantern', 'Gift Box',
+]
+SIZES = ['S', 'M', 'L', 'XL', '250g', '500g', '1kg', '5kg', '330ml', '1.5L']
+UNITS = ['ชิ้น', 'กล่อง', 'แพ็ค', 'ขวด', 'ถุง']
+FESTIVAL_NAMES = [
+    ('ปีใหม่', 'new_year', '🎆'), ('สงกรานต์', 'songkran', '💦'),
+    ('ลอยกระทง', 'festival', '🏮'), ('ตรุษจีน', 'festival', '🧧'),
+    ('วันแม่', 'special', '💐'), ('วันพ่อ', 'special', '💛'),
+    ('วันหยุดยาว', 'holiday', '🏖️'),
+]
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """ปิด auto_now_add ชั่วคราว เพื่อให้ bulk_create ใช้เวลาที่กำหนดเอง (ข้อมูลย้อนหลัง)"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [f.auto_now_add for f in fields]
+    for f in fields:
+        f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, value in zip(fields, saved):
+            f.auto_now_add = value
+
+
+def _raw_delete(model, ids, field=None):
+    """DELETE ... WHERE <field> IN (ids) ตรงด้วย SQL (ค่าเริ่มต้น field = primary key)"""
+    column = (field or model._meta.pk).column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)} "
+            f"WHERE {connection.ops.quote_name(column)} IN ({', '.join(['%s'] * len(ids))})",
+            ids,
+        )
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset (users, products, issue history, tasks, festivals) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--issue-lines', type=int, default=5_000_000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--tasks', type=int, default=5_000)
+        parser.add_argument('--festivals', type=int, default=200)
+        parser.add_argument('--categories', type=int, default=40)
+        parser.add_argument('--days', type=int, default=730, help='Days of issue history (default 730)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--skip-index', action='store_true', help='Do not rebuild the product search index'
+        )
+        parser.add_argument(
+            '--clear', action='store_true', help=f'Delete previously generated {PREFIX} data first'
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.perf_counter()
+
+        self.stdout.write('\n🧪 Generating synthetic dataset...\n')
+        if options['clear']:
+            self._clear()
+
+        users = self._users(options['users'])
+        categories = self._categories(options['categories'])
+        product_ids = self._products(options['products'], categories, users, options['days'])
+        self._issue_history(options['issue_lines'], product_ids, users, options['days'])
+        self._tasks(options['tasks'], users)
+        self._festivals(options['festivals'])
+
+        if not options['skip_index']:
+            self._step('🔍 Rebuilding search index')
+            search.rebuild_index()
+        autocomplete.bump_version()
+        caching.invalidate(
+            caching.TAG_PRODUCTS, caching.TAG_CATEGORIES, caching.TAG_ISSUES, caching.TAG_FESTIVALS
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Done in {time.perf_counter() - started:.1f}s\n'
+        ))
+
+    # ── helpers ───────────────────────────────────────────────
+    def _step(self, message):
+        self.stdout.write(f'   {message}...')
+
+    def _random_time(self, days):
+        # ช่วงเวลาทำการ 08:00-20:00 ย้อนหลัง days วัน
+        day = self.now - timedelta(days=self.rng.randrange(days))
+        local = timezone.localtime(day).replace(
+            hour=self.rng.randint(8, 19), minute=self.rng.randrange(60),
+            second=self.rng.randrange(60), microsecond=0
+        )
+        # วันนี้: ห้ามเลยเวลาปัจจุบัน
+        return min(local, self.now)
+
+    def _clear(self):
+        # ลบทีละช่วง id ด้วย SQL ตรง (ไม่ยิง signal ทีละแถว / ไม่ถือ transaction เดียวนับล้านแถว)
+        # ดัชนีค้นหา / autocomplete / cache สร้างใหม่ครั้งเดียวตอนจบ handle()
+        self._step('🧹 Removing previous synthetic data')
+        User = get_user_model()
+        self._delete_in_chunks(IssueLine.objects.filter(product__code__startswith=PREFIX))
+        self._delete_in_chunks(
+            Issue.objects.filter(created_by__username__startswith=PREFIX.lower(), lines__isnull=True)
+        )
+        self._delete_in_chunks(Task.objects.filter(title__startswith=PREFIX))
+        self._delete_in_chunks(Festival.objects.filter(notes=PREFIX))
+        self._delete_in_chunks(Product.objects.filter(code__startswith=PREFIX))
+        self._delete_in_chunks(Category.objects.filter(name__startswith=PREFIX))
+        # user มีตารางอ้างอิงหลายชั้น (token ฯลฯ) และมีไม่กี่ร้อยแถว → ให้ ORM จัดการ cascade
+        User.objects.filter(username__startswith=PREFIX.lower()).delete()
+
+    def _delete_in_chunks(self, queryset):
+        """
+        ลบแถวใน queryset ทีละ batch_size (เรียงตาม id) แต่ละ batch เป็น transaction ของตัวเอง
+        แถวที่อ้างอิงอยู่ (1 ชั้น): SET_NULL → ตั้งเป็น NULL, แบบอื่น → ลบไปด้วย
+        """
+        model = queryset.model
+        relations = [r for r in model._meta.related_objects if not r.many_to_many]
+        ids_query = queryset.order_by('pk').values_list('pk', flat=True)
+        last = None
+        while True:
+            ids = list((ids_query if last is None else ids_query.filter(pk__gt=last))[:self.batch_size])
+            if not ids:
+                break
+            last = ids[-1]
+            with transaction.atomic():
+                for rel in relations:
+                    if rel.on_delete is models.SET_NULL:
+                        rel.related_model._base_manager.filter(
+                            **{f'{rel.field.name}__in': ids}
+                        ).update(**{rel.field.name: None})
+                    else:
+                        _raw_delete(rel.related_model, ids, field=rel.field)
+                _raw_delete(model, ids)
+
+    def _users(self, count):
+        self._step(f'👤 {count} users')
+        User = get_user_model()
+        users = []
+        for i in range(count):
+            user = User(
+                username=f'{PREFIX.lower()}_user_{i:04d}',
+                first_name=f'พนักงาน{i}',
+                role='admin' if i % 20 == 0 else 'employee',
+            )
+            # ไม่ hash รหัสผ่าน 500 ครั้ง — user สังเคราะห์ไม่ต้อง login
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, batch_size=self.batch_size, ignore_conflicts=True)
+        return list(User.objects.filter(username__startswith=f'{PREFIX.lower()}_user_'))
+
+    def _categories(self, count):
+        self._step(f'🗂️  {count} categories')
+        Category.objects.bulk_create(
+            [Category(name=f'{PREFIX} หมวด {i:02d}') for i in range(count)],
+            ignore_conflicts=True
+        )
+        return list(Category.objects.filter(name__startswith=f'{PREFIX} หมวด'))
+
+    def _products(self, count, categories, users, days):
+        self._step(f'📦 {count} products')
+        start = Product.objects.filter(code__startswith=PREFIX).count()
+        with explicit_timestamps(Product, 'created_at'):
+            for offset in range(start, start + count, self.batch_size):
+                batch = []
+                for i in range(offset, min(offset + self.batch_size, start + count)):
+                    stock = self.rng.choice([0, 2, 4] + [self.rng.randint(5, 500)] * 7)
+                    batch.append(Product(
+                        code=f'{PREFIX}{i:06d}',
+                        name=f'{self.rng.choice(NAME_WORDS)} {self.rng.choice(SIZES)} รุ่น {i}',
+                        selling_price=Decimal(self.rng.randint(500, 50000)) / 100,
+                        unit=self.rng.choice(UNITS),
+                        stock=stock,
+                        initial_stock=stock + self.rng.randint(0, 200),
+                        category=self.rng.choice(categories) if categories else None,
+                        created_at=self._random_time(days),
+                        created_by=self.rng.choice(users) if users else None,
+                    ))
+                Product.objects.bulk_create(batch)
+        return list(
+            Product.objects.filter(code__startswith=PREFIX).values_list('id', flat=True)
+        )
+
+    def _issue_history(self, line_count, product_ids, users, days):
+        self._step(f'📤 {line_count} issue lines')
+        if not product_ids or not users:
+            return
+        # สินค้าขายดีมีไม่กี่ตัว (กระจายแบบ Zipf) → report top_products มีความหมาย
+        weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+        cum_weights = []
+        total = 0
+        for w in weights:
+            total += w
+            cum_weights.append(total)
+        shuffled = list(product_ids)
+        self.rng.shuffle(shuffled)
+
+        created = 0
+        # MySQL ไม่คืน id จาก bulk_create → กำหนด id เองต่อจากค่าสูงสุด
+        next_id = (Issue.objects.aggregate(m=Max('id'))['m'] or 0) + 1
+        with explicit_timestamps(Issue, 'created_at'):
+            while created < line_count:
+                issues = []
+                for _ in range(max(1, self.batch_size // 3)):
+                    issues.append(Issue(
+                        id=next_id + len(issues),
+                        created_by=self.rng.choice(users),
+                        created_at=self._random_time(days),
+                        status='completed',
+                    ))
+                Issue.objects.bulk_create(issues)
+                next_id += len(issues)
+
+                lines = []
+                for issue in issues:
+                    n = min(self.rng.randint(1, 5), line_count - created - len(lines))
+                    if n <= 0:
+                        break
+                    for pid in set(self.rng.choices(shuffled, cum_weights=cum_weights, k=n)):
+                        lines.append(IssueLine(
+                            issue_id=issue.id, product_id=pid,
+                            qty=self.rng.randint(1, 20),
+                            created_at=issue.created_at, created_by_id=issue.created_by_id,
+                        ))
+                IssueLine.objects.bulk_create(lines, batch_size=self.batch_size)
+                created += len(lines)
+                if created and created % (self.batch_size * 100) < len(lines):
+                    self.stdout.write(f'      {created:,} / {line_count:,}')
+
+        # ใบเบิกที่ไม่ได้ใช้ในรอบสุดท้าย
+        Issue.objects.filter(
+            created_by__username__startswith=PREFIX.lower(), lines__isnull=True
+        ).delete()
+
+    def _tasks(self, count, users):
+        self._step(f'📋 {count} tasks')
+        if not users:
+            return
+        admins = [u for u in users if u.role == 'admin'] or users
+        employees = [u for u in users if u.role == 'employee'] or users
+        statuses = [s for s, _ in Task.STATUS_CHOICES]
+        priorities = [p for p, _ in Task.PRIORITY_CHOICES]
+        types = [t for t, _ in Task.TASK_TYPE_CHOICES]
+        for offset in range(0, count, self.batch_size):
+            batch = []
+            for i in range(offset, min(offset + self.batch_size, count)):
+                status = self.rng.choice(statuses)
+                due = self.now + timedelta(days=self.rng.randint(-60, 30), hours=self.rng.randint(0, 23))
+                batch.append(Task(
+                    title=f'{PREFIX} งาน {i}',
+                    description='งานสังเคราะห์สำหรับ benchmark',
+                    task_type=self.rng.choice(types),
+                    assigned_to=self.rng.choice(employees),
+                    created_by=self.rng.choice(admins),
+                    status=status,
+                    priority=self.rng.choice(priorities),
+                    due_date=due,
+                    completed_at=due if status == 'completed' else None,
+                ))
+            Task.objects.bulk_create(batch)
+
+    def _festivals(self, count):
+        self._step(f'🎉 {count} festivals')
+        today = timezone.localdate()
+        batch = []
+        for i in range(count):
+            name, category, icon = self.rng.choice(FESTIVAL_NAMES)
+            start = today + timedelta(days=self.rng.randint(-365, 365))
+            batch.append(Festival(
+                name=f'{name} {i}',
+                start_date=start,
+                end_date=start + timedelta(days=self.rng.randint(0, 4)),
+                is_recurring=self.rng.random() < 0.5,
+                category=category,
+                icon=icon,
+                notes=PREFIX,
+            ))
+        Festival.objects.bulk_create(batch, batch_size=self.batch_size)
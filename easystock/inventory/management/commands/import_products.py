@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from inventory.importers import (
+    ProductImporter, ImportFormatError, read_rows, DEFAULT_BATCH_SIZE
+)
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Bulk import products from a CSV/XLSX file (upsert by active code)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path to .csv or .xlsx file')
+        parser.add_argument(
+            '--format', choices=['csv', 'xlsx'], default=None,
+            help='File format (default: detect from extension)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per batch (default {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--user', type=str, default=None,
+            help='Username recorded as created_by for new products'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate only, do not write to the database'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' not found")
+
+        importer = ProductImporter(
+            user=user,
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+
+        path = options['path']
+        self.stdout.write(f'\n📦 Importing products from {path}...\n')
+        try:
+            with open(path, 'rb') as f:
+                result = importer.run(read_rows(f, path, options['format']))
+        except FileNotFoundError:
+            raise CommandError(f'File not found: {path}')
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        for err in result['errors']:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"❌ Row {err['row']} ({err['code'] or '-'}): {'; '.join(err['errors'])}"
+                )
+            )
+
+        # Summary
+        self.stdout.write('\n' + '='*60)
+        if result['dry_run']:
+            self.stdout.write(self.style.WARNING('🔍 Dry run — nothing was saved\n'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✅ Import Complete!\n'))
+        self.stdout.write(f"   📊 Created: {result['created']}")
+        self.stdout.write(f"   ✏️  Updated: {result['updated']}")
+        self.stdout.write(f"   ❌ Failed: {result['failed']}")
+        self.stdout.write('='*60 + '\n')
@@ -0,0 +1,196 @@
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from inventory import issuing
+from inventory.benchmarks import bench_users, percentile
+from inventory.models import Product, Issue, IssueLine, Listing
+
+PREFIX = 'CONT'
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent issue requests with overlapping SKUs and check that stock is conserved'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per worker')
+        parser.add_argument('--skus', type=int, default=10, help='SKUs in the shared (hot) pool')
+        parser.add_argument('--items-per-request', type=int, default=3)
+        parser.add_argument(
+            '--overlap', type=float, default=0.5,
+            help='Chance (0-1) that an item comes from the shared pool instead of the worker’s own SKUs'
+        )
+        parser.add_argument('--qty', type=int, default=3, help='Max qty per item')
+        parser.add_argument('--stock', type=int, default=1000, help='Starting stock per SKU')
+        parser.add_argument('--seed', type=int, default=37)
+        parser.add_argument(
+            '--keep', action='store_true', help=f'Keep the {PREFIX} products and issues afterwards'
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['overlap'] <= 1:
+            raise CommandError('--overlap must be between 0 and 1')
+        workers = options['workers']
+
+        self.stdout.write(
+            f'\n🔥 Issue contention: {workers} workers × {options["requests"]} requests, '
+            f'overlap {options["overlap"]:.0%} on {options["skus"]} hot SKUs\n'
+        )
+        user = bench_users()['employee']
+        shared, private = self._products(options['skus'], workers, options['stock'])
+        all_products = shared + [p for pool in private for p in pool]
+        ids = [p.id for p in all_products]
+        initial_stock = dict(Product.objects.filter(id__in=ids).values_list('id', 'stock'))
+        initial_listing = dict(Listing.objects.filter(product_id__in=ids).values_list('product_id', 'quantity'))
+        # id สูงสุดก่อนเริ่ม → ตรวจ/ลบเฉพาะรายการของรอบนี้ (รอบก่อนที่ --keep ไว้ไม่ถูกนับ)
+        last_line_id = IssueLine.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        last_issue_id = Issue.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        issuing.reset_stats()
+        results = [None] * workers
+        threads = [
+            threading.Thread(target=self._worker, args=(
+                index, user, shared, private[index], options, results
+            ))
+            for index in range(workers)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            ok = self._report(results, elapsed, ids, initial_stock, initial_listing, last_line_id)
+        finally:
+            if not options['keep']:
+                self._cleanup(ids, user, last_issue_id)
+
+        if not ok:
+            raise CommandError('Stock was not conserved')
+
+    # ── setup ─────────────────────────────────────────────────
+    def _products(self, skus, workers, stock):
+        def make(code):
+            product, _ = Product.objects.update_or_create(
+                code=code,
+                defaults={
+                    'name': f'สินค้าทดสอบล็อก {code}', 'stock': stock,
+                    'initial_stock': stock, 'is_deleted': False,
+                },
+            )
+            return product
+
+        shared = [make(f'{PREFIX}-H{i:03d}') for i in range(skus)]
+        private = [
+            [make(f'{PREFIX}-W{w:02d}-{i:03d}') for i in range(skus)]
+            for w in range(workers)
+        ]
+        return shared, private
+
+    # ── worker ────────────────────────────────────────────────
+    def _worker(self, index, user, shared, own, options, results):
+        rng = random.Random(options['seed'] * 1000 + index)
+        client = APIClient()
+        client.force_authenticate(user)
+        stats = {'ok': 0, 'rejected': 0, 'errors': 0, 'qty': 0, 'timings': []}
+        try:
+            for _ in range(options['requests']):
+                items = []
+                for _ in range(options['items_per_request']):
+                    pool = shared if rng.random() < options['overlap'] else own
+                    items.append({
+                        'product': rng.choice(pool).id, 'qty': rng.randint(1, options['qty'])
+                    })
+
+                started = time.perf_counter()
+                try:
+                    response = client.post('/api/issue-products/', {'items': items}, format='json')
+                except Exception as e:
+                    # deadlock ที่ลองใหม่ครบแล้วยังไม่ผ่าน
+                    stats['errors'] += 1
+                    self.stderr.write(f'   ❌ worker {index}: {e}')
+                    continue
+                finally:
+                    stats['timings'].append((time.perf_counter() - started) * 1000)
+
+                if response.status_code == 201:
+                    stats['ok'] += 1
+                    stats['qty'] += sum(it['qty'] for it in items)
+                elif response.status_code in (400, 404):
+                    stats['rejected'] += 1
+                else:
+                    stats['errors'] += 1
+        finally:
+            results[index] = stats
+            # แต่ละ thread มี connection ของตัวเอง
+            connection.close()
+
+    # ── report ────────────────────────────────────────────────
+    def _report(self, results, elapsed, ids, initial_stock, initial_listing, last_line_id):
+        timings = sorted(t for r in results for t in r['timings'])
+        total = len(timings)
+        ok = sum(r['ok'] for r in results)
+        rejected = sum(r['rejected'] for r in results)
+        errors = sum(r['errors'] for r in results)
+        requested_qty = sum(r['qty'] for r in results)
+        lock = issuing.get_stats()
+
+        self.stdout.write(f'   Requests      : {total} ({ok} ok, {rejected} rejected, {errors} errors)')
+        self.stdout.write(f'   Throughput    : {total / elapsed:.1f} req/s ({elapsed:.2f}s)')
+        if timings:
+            self.stdout.write(
+                f'   Latency       : p50 {percentile(timings, 50):.1f} ms · '
+                f'p95 {percentile(timings, 95):.1f} ms · mean {statistics.fmean(timings):.1f} ms'
+            )
+        attempts = lock['issues'] + lock['failed'] + lock['retries']
+        self.stdout.write(
+            f'   Lock wait     : total {lock["lock_wait_total"] * 1000:.0f} ms · '
+            f'avg {lock["lock_wait_total"] * 1000 / max(attempts, 1):.2f} ms · '
+            f'max {lock["lock_wait_max"] * 1000:.1f} ms'
+        )
+        self.stdout.write(f'   Deadlocks     : {lock["deadlocks"]} (retried {lock["retries"]})')
+
+        # ── ตรวจสต็อกคงอยู่ครบ ──
+        final_stock = dict(Product.objects.filter(id__in=ids).values_list('id', 'stock'))
+        final_listing = dict(Listing.objects.filter(product_id__in=ids).values_list('product_id', 'quantity'))
+        issued_qty = IssueLine.objects.filter(
+            product_id__in=ids, id__gt=last_line_id
+        ).aggregate(s=Sum('qty'))['s'] or 0
+        stock_delta = sum(initial_stock.values()) - sum(final_stock.values())
+        listing_delta = sum(final_listing.values()) - sum(initial_listing.values())
+        negative = [pid for pid, stock in final_stock.items() if stock < 0]
+
+        checks = [
+            ('stock removed == issued lines', stock_delta == issued_qty, f'{stock_delta} vs {issued_qty}'),
+            ('issued lines == accepted requests', issued_qty == requested_qty, f'{issued_qty} vs {requested_qty}'),
+            ('listing added == issued lines', listing_delta == issued_qty, f'{listing_delta} vs {issued_qty}'),
+            ('no negative stock', not negative, f'{len(negative)} products'),
+        ]
+        self.stdout.write('')
+        for label, passed, detail in checks:
+            mark = '✅' if passed else '❌'
+            self.stdout.write(f'   {mark} {label} ({detail})')
+
+        passed = all(p for _, p, _ in checks)
+        if passed:
+            self.stdout.write(self.style.SUCCESS('\n✅ Stock conserved\n'))
+        else:
+            self.stdout.write(self.style.ERROR('\n❌ Stock NOT conserved\n'))
+        return passed
+
+    def _cleanup(self, ids, user, last_issue_id):
+        with transaction.atomic():
+            IssueLine.objects.filter(product_id__in=ids).delete()
+            Issue.objects.filter(created_by=user, id__gt=last_issue_id, lines__isnull=True).delete()
+            Listing.objects.filter(product_id__in=ids).delete()
+            Product.objects.filter(id__in=ids).delete()
+        self.stdout.write(f'   🧹 Removed {PREFIX} products and issues')
@@ -0,0 +1,89 @@
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import replenishment
+
+
+class Command(BaseCommand):
+    help = 'Compute reorder quantities for every product and create stock_replenishment tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--velocity-days', type=int, default=replenishment.DEFAULT_VELOCITY_DAYS,
+            help='Days of issue history used for the daily rate (default 28)'
+        )
+        parser.add_argument(
+            '--lead-days', type=int, default=replenishment.DEFAULT_LEAD_DAYS,
+            help='Days until restocked goods arrive (default 3)'
+        )
+        parser.add_argument(
+            '--cover-days', type=int, default=replenishment.DEFAULT_COVER_DAYS,
+            help='Days of demand each refill should cover after arrival (default 14)'
+        )
+        parser.add_argument(
+            '--safety-days', type=int, default=replenishment.DEFAULT_SAFETY_DAYS,
+            help='Extra days of demand kept as safety stock (default 2)'
+        )
+        parser.add_argument(
+            '--min-qty', type=int, default=1, help='Skip refills smaller than this (default 1)'
+        )
+        parser.add_argument(
+            '--created-by', help='Username recorded as the task creator'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Print the plan without creating tasks'
+        )
+
+    def handle(self, *args, **options):
+        if options['velocity_days'] < 1:
+            raise CommandError('--velocity-days must be at least 1')
+        created_by = None
+        if options['created_by']:
+            created_by = get_user_model().objects.filter(username=options['created_by']).first()
+            if created_by is None:
+                raise CommandError(f"User {options['created_by']} not found")
+
+        started = time.perf_counter()
+        suggestions = replenishment.plan(
+            velocity_days=options['velocity_days'],
+            lead_days=options['lead_days'],
+            cover_days=options['cover_days'],
+            safety_days=options['safety_days'],
+            min_qty=options['min_qty'],
+        )
+        by_priority = Counter(s.priority for s in suggestions)
+        festival = sum(1 for s in suggestions if s.festival)
+        self.stdout.write(
+            f'\n📦 {len(suggestions)} products need a refill '
+            f'({time.perf_counter() - started:.2f}s)\n'
+            f'   urgent {by_priority["urgent"]} · high {by_priority["high"]} · '
+            f'medium {by_priority["medium"]} · festival-driven {festival}'
+        )
+        for s in suggestions[:10]:
+            self.stdout.write(
+                f'   [{s.priority}] {s.code} {s.name}: stock {s.stock}, '
+                f'{s.daily:.1f}/day → +{s.quantity}'
+            )
+
+        if options['dry_run'] or not suggestions:
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING('\n⚠️  Dry run: no tasks created\n'))
+            return
+
+        try:
+            assigned = replenishment.create_tasks(suggestions, created_by=created_by)
+        except replenishment.ReplenishmentError as e:
+            raise CommandError(e.detail)
+
+        names = dict(
+            get_user_model().objects.filter(id__in=assigned).values_list('id', 'username')
+        )
+        self.stdout.write('\n👥 Assigned')
+        for user_id, n in assigned.most_common():
+            self.stdout.write(f'   {names.get(user_id, user_id)}: {n}')
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Created {len(suggestions)} tasks ({time.perf_counter() - started:.2f}s)\n'
+        ))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Background worker that generates WebP/JPEG thumbnails for uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true', help='Process what is queued and exit'
+        )
+        parser.add_argument(
+            '--batch', type=int, default=20, help='Jobs claimed per round (default 20)'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Seconds to sleep when the queue is empty (default 2)'
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Queue existing images that have no thumbnails yet'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            queued = thumbnails.backfill()
+            self.stdout.write(f'\n🗂️  Queued {queued} existing images')
+
+        sizes = ', '.join(f'{name} {edge}px' for name, edge in thumbnails.SIZES.items())
+        self.stdout.write(f'\n🖼️  Thumbnail worker started ({sizes})\n')
+        total_done = total_failed = 0
+        try:
+            while True:
+                requeued = thumbnails.requeue_stale()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'   ⚠️  Requeued {requeued} stale jobs'))
+
+                started = time.perf_counter()
+                done, failed = thumbnails.process_pending(limit=options['batch'])
+                total_done += done
+                total_failed += failed
+                if done or failed:
+                    self.stdout.write(
+                        f'   ✅ {done} done, ❌ {failed} failed '
+                        f'({time.perf_counter() - started:.2f}s)'
+                    )
+
+                if options['once'] and not (done or failed):
+                    break
+                if not (done or failed):
+                    # worker รันยาว → คืน connection ที่หมดอายุ แล้วรอ
+                    close_old_connections()
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Processed {total_done} images ({total_failed} failed)\n'
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from inventory import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index (code, name, listing title)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Products per batch (default 1000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('\n🔍 Rebuilding product search index...\n')
+        if not search.THAI_TOKENIZER_AVAILABLE:
+            self.stdout.write(
+                self.style.WARNING('⚠️  pythainlp not installed — Thai text indexed by n-gram only')
+            )
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Indexed {count} products\n'))
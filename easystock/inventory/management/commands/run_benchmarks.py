@@ -0,0 +1,95 @@
+import json
+import platform
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from inventory import benchmarks
+from inventory.models import Product, IssueLine, ArchivedIssueLine
+
+
+class Command(BaseCommand):
+    help = 'Run the hot-path benchmark suite and compare against a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Serve responses from the cache (default: bypass it to measure cold)'
+        )
+        parser.add_argument('--only', nargs='*', help='Scenario names to run')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against this JSON file')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p95 slowdown vs baseline (default 0.2 = 20%%)'
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Exit with an error if any scenario is slower than the tolerance'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"\n⏱️  Benchmarking ({Product.objects.count():,} products, "
+            f"{IssueLine.objects.count() + ArchivedIssueLine.objects.count():,} issue lines, "
+            f"{connection.vendor})\n"
+        )
+
+        results = benchmarks.run_suite(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            warm_cache=options['warm_cache'],
+            only=options['only'],
+        )
+
+        self.stdout.write(
+            f"   {'scenario':<22}{'status':>7}{'p50':>10}{'p95':>10}{'p99':>10}"
+            f"{'queries':>9}{'peak KB':>10}"
+        )
+        for name, r in results.items():
+            self.stdout.write(
+                f"   {name:<22}{r['status']!s:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+                f"{r['p99_ms']:>10.2f}{r['queries']:>9}{r['peak_kb']:>10.1f}"
+            )
+
+        if options['output']:
+            report = {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'warm_cache': options['warm_cache'],
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"\n💾 Saved results to {options['output']}"))
+
+        if options['baseline']:
+            self._compare(results, options)
+
+    def _compare(self, results, options):
+        try:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read baseline: {e}')
+
+        self.stdout.write(f"\n📊 p95 vs baseline ({options['baseline']})")
+        regressions = []
+        for name, before, after, change, regressed in benchmarks.compare(
+            results, baseline, tolerance=options['tolerance']
+        ):
+            line = f"   {name:<22}{before:>10.2f} → {after:>10.2f} ms  ({change:+.0%})"
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line + '  ❌'))
+            else:
+                self.stdout.write(line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"Regressed: {', '.join(regressions)}")
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('\n✅ No regressions\n'))
@@ -1,6 +1,14 @@
 from django.core.management.base import BaseCommand
-from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime
 from inventory.models import Festival
+from inventory import caching
+
+
+# วันสำคัญตามจันทรคติ: วันที่เปลี่ยนทุกปี → ไม่ใช่เทศกาลประจำปี (ไม่ขยายวัน/เดือนเดิมไปปีถัดไป)
+# ต้อง seed ปีใหม่เพิ่มเองเมื่อประกาศวันที่แล้ว
+LUNAR_FESTIVALS = {'วันมาฆบูชา', 'วันวิสาขบูชา', 'วันอาสาฬหบูชา', 'วันเข้าพรรษา', 'วันลอยกระทง'}
 
 
 # Thai Festivals Database (ข้อมูลเทศกาลไทยที่ถูกต้อง 100%)
@@ -191,6 +199,9 @@ THAI_FESTIVALS = {
 class Command(BaseCommand):
     help = 'Seed Thai Festival data (Thailand holidays only)'
 
+    # field ที่อัปเดตเมื่อมีเทศกาลนี้อยู่แล้ว (จับคู่ด้วย name + start_date)
+    UPDATE_FIELDS = ['end_date', 'icon', 'color', 'description', 'is_recurring']
+
     def add_arguments(self, parser):
         parser.add_argument('year', type=int, help='Year to fetch (2025, 2026, etc.)')
 
@@ -205,52 +216,58 @@ class Command(BaseCommand):
                 self.style.ERROR(f'❌ Year {year} not available yet\n')
             )
             self.stdout.write(f'Available years: {", ".join(map(str, THAI_FESTIVALS.keys()))}\n')
+            self.stdout.write(
+                'ℹ️  Recurring festivals from the latest seeded year still appear on the calendar\n'
+            )
             return
 
-        festivals_data = THAI_FESTIVALS[year]
-        created_count = 0
-        updated_count = 0
-
-        for festival_data in festivals_data:
-            try:
-                start_date = datetime.strptime(festival_data['start_date'], '%Y-%m-%d').date()
-                end_date = datetime.strptime(festival_data['end_date'], '%Y-%m-%d').date()
-                
-                festival, created = Festival.objects.get_or_create(
-                    name=festival_data['name'],
-                    start_date=start_date,
-                    defaults={
-                        'end_date': end_date,
-                        'icon': festival_data['icon'],
-                        'color': festival_data['color'],
-                        'description': festival_data['description'],
-                        'is_recurring': True
-                    }
-                )
-
-                if created:
-                    created_count += 1
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'✅ {festival_data["icon"]} {festival_data["name"]} ({start_date})'
-                        )
-                    )
-                else:
-                    updated_count += 1
-                    self.stdout.write(
-                        f'⏸️  {festival_data["icon"]} {festival_data["name"]}'
-                    )
+        festivals = [
+            Festival(
+                name=data['name'],
+                start_date=datetime.strptime(data['start_date'], '%Y-%m-%d').date(),
+                end_date=datetime.strptime(data['end_date'], '%Y-%m-%d').date(),
+                icon=data['icon'],
+                color=data['color'],
+                description=data['description'],
+                is_recurring=data['name'] not in LUNAR_FESTIVALS,
+            )
+            for data in THAI_FESTIVALS[year]
+        ]
 
-            except Exception as e:
+        # upsert: query เดียวหาแถวเดิม → bulk_create ที่ยังไม่มี + bulk_update ที่มีแล้ว
+        existing = {
+            (f.name, f.start_date): f
+            for f in Festival.objects.filter(
+                name__in=[f.name for f in festivals],
+                start_date__in=[f.start_date for f in festivals],
+            )
+        }
+        to_create, to_update = [], []
+        for festival in festivals:
+            current = existing.get((festival.name, festival.start_date))
+            if current is None:
+                to_create.append(festival)
                 self.stdout.write(
-                    self.style.ERROR(f'❌ Error: {festival_data["name"]} - {str(e)}')
+                    self.style.SUCCESS(f'✅ {festival.icon} {festival.name} ({festival.start_date})')
                 )
+            else:
+                for field in self.UPDATE_FIELDS:
+                    setattr(current, field, getattr(festival, field))
+                current.updated_at = timezone.now()  # bulk_update ไม่ตั้ง auto_now ให้
+                to_update.append(current)
+                self.stdout.write(f'⏸️  {festival.icon} {festival.name}')
+
+        with transaction.atomic():
+            Festival.objects.bulk_create(to_create)
+            Festival.objects.bulk_update(to_update, self.UPDATE_FIELDS + ['updated_at'])
+            # bulk ไม่ยิง signal → ล้าง cache ปฏิทินเอง
+            transaction.on_commit(lambda: caching.invalidate(caching.TAG_FESTIVALS))
 
         # Summary
         self.stdout.write('\n' + '='*60)
         self.stdout.write(self.style.SUCCESS('✅ Seed Complete!\n'))
-        self.stdout.write(f'   📊 Created: {created_count}')
-        self.stdout.write(f'   ⏸️  Existing: {updated_count}')
-        self.stdout.write(f'   📈 Total: {created_count + updated_count}')
+        self.stdout.write(f'   📊 Created: {len(to_create)}')
+        self.stdout.write(f'   🔄 Updated: {len(to_update)}')
+        self.stdout.write(f'   📈 Total: {len(festivals)}')
         self.stdout.write('='*60 + '\n')
-        self.stdout.write('🇹🇭 Thai Festivals ready!\n')
\ No newline at end of file
+        self.stdout.write('🇹🇭 Thai Festivals ready!\n')
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventory import reminders
+
+
+class Command(BaseCommand):
+    help = 'Send one batched LINE reminder per assignee for tasks that are due soon or overdue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true', help='Keep running and check every --interval seconds'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=300,
+            help='Seconds between checks with --loop (default 300)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Show what would be sent without sending'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('\n⏰ Task reminder scheduler\n')
+        try:
+            while True:
+                self._run_once(options['dry_run'])
+                if not options['loop']:
+                    break
+                # รันยาว → คืน connection ที่หมดอายุ แล้วรอ
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('\n✅ Done\n'))
+
+    def _run_once(self, dry_run):
+        started = time.perf_counter()
+        stats = reminders.send_due_reminders(dry_run=dry_run)
+        elapsed = time.perf_counter() - started
+
+        if stats['line_unavailable']:
+            self.stdout.write(self.style.WARNING(
+                f'   ⚠️  LINE SDK not available: {stats["tasks"]} reminders left pending'
+            ))
+            return
+        if dry_run:
+            self.stdout.write(
+                f'   🔎 {stats["tasks"]} tasks for {stats["recipients"]} assignees would be reminded'
+            )
+            return
+        if stats['tasks']:
+            self.stdout.write(
+                f'   📨 {stats["sent"]} sent, 🚫 {stats["no_line"]} without LINE, '
+                f'❌ {stats["failed"]} failed — {stats["tasks"]} tasks ({elapsed:.2f}s)'
+            )
+            if stats['skipped']:
+                self.stdout.write(f'   ⏭️  {stats["skipped"]} tasks claimed by another running process')
+            purged = reminders.purge()
+            if purged:
+                self.stdout.write(f'   🧹 Purged {purged} old reminder records')
+        else:
+            self.stdout.write(f'   ✅ Nothing due ({elapsed:.2f}s)')
@@ -1,19 +1,107 @@
 # inventory/middleware.py
+# middleware ทุกตัวรองรับทั้ง sync (WSGI) และ async (ASGI) ในตัว
+# → ใต้ ASGI ทั้ง stack ทำงานแบบ async ต่อกันได้ ไม่ต้องสลับ sync/async ทีละชั้น
+
+import logging
+import random
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import audit
+
+logger = logging.getLogger('inventory.requests')
+
+# LINE webhook ส่ง POST มาโดยไม่มี CSRF token (ตรวจ X-Line-Signature แทน)
+DEFAULT_CSRF_EXEMPT_PATHS = (r'^/api/line/webhook/?$',)
+
+
+def compile_paths(patterns):
+    """รวมหลาย pattern เป็น regex เดียว (compile ครั้งเดียวตอนเริ่ม) ไม่มี pattern → None"""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{p})' for p in patterns))
+
+
+class AsyncCapableMiddleware:
+    """ฐานของ middleware: before() / after() เรียกได้ทั้งจาก sync และ async"""
+    sync_capable = True
+    async_capable = True
 
-class DisableCSRFForLineWebhook:
-    """Middleware to disable CSRF for LINE webhook endpoint"""
-    
     def __init__(self, get_response):
         self.get_response = get_response
-    
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def before(self, request):
+        return None
+
+    def after(self, request, response, state):
+        return response
+
     def __call__(self, request):
-        # Debug: พิมพ์ path ออกมาดู
-        print(f"🔍 Request path: {request.path}")
-        
-        # ถ้าเป็น LINE webhook ให้ข้าม CSRF
-        if '/line/webhook' in request.path:
-            setattr(request, '_dont_enforce_csrf_checks', True)
-            print("✅ CSRF disabled for webhook")
-        
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.before(request)
+        return self.after(request, self.get_response(request), state)
+
+    async def __acall__(self, request):
+        state = self.before(request)
+        return self.after(request, await self.get_response(request), state)
+
+
+class RequestRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    จับคู่ path กับ regex ที่ compile ไว้แล้ว (แทน substring + print ทุก request)
+    - CSRF_EXEMPT_PATHS → ข้าม CSRF
+    - REQUEST_LOG_SAMPLE_RATE (0-1) → log method / path / status / เวลา เฉพาะบาง request
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.csrf_exempt = compile_paths(
+            getattr(settings, 'CSRF_EXEMPT_PATHS', DEFAULT_CSRF_EXEMPT_PATHS)
+        )
+        self.sample_rate = float(getattr(settings, 'REQUEST_LOG_SAMPLE_RATE', 0))
+
+    def before(self, request):
+        if self.csrf_exempt is not None and self.csrf_exempt.match(request.path_info):
+            request._dont_enforce_csrf_checks = True
+        if (
+            self.sample_rate
+            and random.random() < self.sample_rate
+            and logger.isEnabledFor(logging.INFO)
+        ):
+            return time.perf_counter()
+        return None
+
+    def after(self, request, response, started):
+        if started is not None:
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(
+                '%s %s %s %.1fms', request.method, request.path, response.status_code, duration_ms,
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': duration_ms,
+                },
+            )
+        return response
+
+
+class AuditContextMiddleware(AsyncCapableMiddleware):
+    """ให้ AuditLog รู้ว่าใครแก้ไข (อ่าน request.user ตอนบันทึก → ใช้ได้กับ JWT ของ DRF)"""
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with audit.acting_as(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        # contextvar ถูกคัดลอกไปกับ sync_to_async → view แบบ sync ก็เห็นค่าเดียวกัน
+        with audit.acting_as(request):
+            return await self.get_response(request)
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+BATCH_SIZE = 10000
+
+
+def backfill_created(apps, schema_editor):
+    """คัดลอก created_at / created_by จาก Issue ลง IssueLine ทีละช่วง id"""
+    Issue = apps.get_model('inventory', 'Issue')
+    IssueLine = apps.get_model('inventory', 'IssueLine')
+
+    issue = Issue.objects.filter(pk=OuterRef('issue_id'))
+    last_id = IssueLine.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for low in range(0, last_id, BATCH_SIZE):
+        IssueLine.objects.filter(
+            id__gt=low, id__lte=low + BATCH_SIZE, created_at__isnull=True
+        ).update(
+            created_at=Subquery(issue.values('created_at')[:1]),
+            created_by=Subquery(issue.values('created_by')[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0029_product_search_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='issueline',
+            name='created_at',
+            field=models.DateTimeField(null=True, verbose_name='เบิกเมื่อ'),
+        ),
+        migrations.AddField(
+            model_name='issueline',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='issueline',
+            name='created_at',
+            field=models.DateTimeField(verbose_name='เบิกเมื่อ'),
+        ),
+        migrations.AddIndex(
+            model_name='issueline',
+            index=models.Index(fields=['created_at', 'product', 'qty'], name='issueline_created_prod_qty'),
+        ),
+    ]
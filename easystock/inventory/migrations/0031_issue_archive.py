@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-19 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0030_issueline_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IssueArchivePeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IssueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total_qty', models.PositiveIntegerField(default=0)),
+                ('line_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='issue_rollups', to='inventory.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedIssueLine',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('issue_id', models.BigIntegerField()),
+                ('issue_status', models.CharField(max_length=20)),
+                ('qty', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_issue_lines', to='inventory.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='issuerollup',
+            constraint=models.UniqueConstraint(fields=('month', 'product'), name='uniq_issue_rollup_month_product'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedissueline',
+            index=models.Index(fields=['created_at', 'product', 'qty'], name='archline_created_prod_qty'),
+        ),
+    ]
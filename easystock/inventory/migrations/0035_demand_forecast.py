@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-19 17:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0034_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateField()),
+                ('window_end', models.DateField()),
+                ('baseline_daily', models.FloatField(verbose_name='ยอดเบิกปกติต่อวัน')),
+                ('uplift', models.FloatField(verbose_name='ตัวคูณช่วงเทศกาล')),
+                ('forecast_qty', models.PositiveIntegerField(verbose_name='ยอดที่คาดว่าจะเบิก')),
+                ('confidence', models.PositiveSmallIntegerField(default=0)),
+                ('basis', models.CharField(choices=[('festival', 'ประวัติเทศกาลเดียวกัน'), ('category', 'ประวัติเทศกาลหมวดเดียวกัน'), ('baseline', 'ยอดปกติ')], default='festival', max_length=20)),
+                ('generated_at', models.DateTimeField()),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demand_forecasts', to='inventory.festival')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='demandforecast',
+            index=models.Index(fields=['festival', '-forecast_qty'], name='forecast_festival_qty'),
+        ),
+        migrations.AddConstraint(
+            model_name='demandforecast',
+            constraint=models.UniqueConstraint(fields=('festival', 'product'), name='uniq_demand_forecast_festival_product'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-19 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0035_demand_forecast'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='inventory.product', verbose_name='สินค้า'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0036_task_product'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customevent',
+            index=models.Index(fields=['created_by', 'date'], name='customevent_owner_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customevent',
+            index=models.Index(fields=['is_shared', 'date'], name='customevent_shared_date'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'due_date'], name='task_assignee_due'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0037_calendar_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('due_soon', 'ใกล้ถึงกำหนด'), ('due_1h', 'ภายใน 1 ชั่วโมง'), ('overdue', 'เลยกำหนด')], max_length=20)),
+                ('due_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('sent', 'ส่งแล้ว'), ('no_line', 'ผู้รับไม่ได้เชื่อม LINE')], default='sent', max_length=20)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='inventory.task')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskreminder',
+            index=models.Index(fields=['sent_at'], name='taskreminder_sent_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='taskreminder',
+            constraint=models.UniqueConstraint(fields=('task', 'stage', 'due_date'), name='uniq_task_reminder_stage'),
+        ),
+    ]
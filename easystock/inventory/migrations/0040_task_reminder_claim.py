@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-19 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0039_audit_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskreminder',
+            name='claim',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='taskreminder',
+            name='status',
+            field=models.CharField(choices=[('pending', 'กำลังส่ง'), ('sent', 'ส่งแล้ว'), ('no_line', 'ผู้รับไม่ได้เชื่อม LINE')], default='sent', max_length=20),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# ตรงกับ LUNAR_FESTIVALS ใน seed_festivals_from_api (คัดลอกไว้ migration ไม่ควร import command)
+LUNAR_FESTIVALS = ['วันมาฆบูชา', 'วันวิสาขบูชา', 'วันอาสาฬหบูชา', 'วันเข้าพรรษา', 'วันลอยกระทง']
+
+
+def unmark_lunar(apps, schema_editor):
+    """แถวที่ seed ไว้แล้วเป็น is_recurring=True → ปิด (วันที่ปีถัดไปไม่ตรงวัน/เดือนเดิม)"""
+    Festival = apps.get_model('inventory', 'Festival')
+    Festival.objects.filter(name__in=LUNAR_FESTIVALS, is_recurring=True).update(is_recurring=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0041_change_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(unmark_lunar, migrations.RunPython.noop),
+    ]
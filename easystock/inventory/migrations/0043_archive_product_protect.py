@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-19 18:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0042_lunar_festivals_not_recurring'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedissueline',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_issue_lines', to='inventory.product'),
+        ),
+        migrations.AlterField(
+            model_name='issuerollup',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='issue_rollups', to='inventory.product'),
+        ),
+    ]
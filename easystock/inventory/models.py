@@ -1,10 +1,21 @@
 # backend/inventory/models.py (CLEANED VERSION - ลบ BestSeller ออกแล้ว)
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Q
 from django.utils import timezone
 
 
+class LoadedValuesMixin:
+    """จำค่าที่โหลดจาก DB ไว้ → audit.py เทียบหา field ที่เปลี่ยนตอน save โดยไม่ต้อง query ซ้ำ"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
 # ================ CLASS 1: Category ================
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -14,15 +25,19 @@ class Category(models.Model):
 
 
 # ================ CLASS 2: Product ================
-class Product(models.Model):
+class Product(LoadedValuesMixin, models.Model):
 
     code = models.CharField(max_length=50, db_index=True)
     name = models.CharField(max_length=200)
     selling_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     unit = models.CharField(max_length=50, default="ชิ้น")
     stock = models.IntegerField(default=0)
+    # เพิ่มทุกครั้งที่ stock เปลี่ยน → client ส่งกลับมาตรวจว่าไม่มีใครปรับสต็อกแทรก (optimistic lock)
+    stock_version = models.PositiveIntegerField(default=0)
     initial_stock = models.IntegerField(default=0)
     image = models.ImageField(upload_to="products/", blank=True, null=True)
+    # รูปย่อที่สร้างจาก image (ดู inventory/thumbnails.py)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     on_sale = models.BooleanField(default=False)
     is_deleted = models.BooleanField(default=False)
@@ -33,8 +48,21 @@ class Product(models.Model):
         return self.name
     
     def update_stock(self, amount):
-        self.stock += amount
-        self.save()
+        return self.adjust_stock(amount)
+
+    def adjust_stock(self, delta, user=None, reason='adjust', note='', expected_version=None):
+        """
+        ปรับสต็อกแบบ atomic (UPDATE ... SET stock = stock + delta) พร้อมบันทึก StockMovement
+        ดู inventory/stock.py
+        """
+        from .stock import adjust
+        movement = adjust(
+            self.pk, delta, user=user, reason=reason, note=note,
+            expected_version=expected_version
+        )
+        self.stock = movement.stock_after
+        self.stock_version = movement.stock_version
+        return movement
 
     class Meta:
         constraints = [
@@ -84,9 +112,34 @@ class IssueLine(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     qty = models.PositiveIntegerField()
 
+    # คัดลอกมาจาก Issue ตอนสร้าง → report ที่กรองตามช่วงเวลาไม่ต้อง join ตาราง Issue
+    created_at = models.DateTimeField(verbose_name="เบิกเมื่อ")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+"
+    )
+
+    class Meta:
+        indexes = [
+            # covering index: SUM(qty) ตามช่วงเวลา / ต่อสินค้า อ่านจาก index อย่างเดียว
+            models.Index(
+                fields=['created_at', 'product', 'qty'],
+                name='issueline_created_prod_qty',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.created_at is None:
+            self.created_at = self.issue.created_at
+            self.created_by_id = self.issue.created_by_id
+        super().save(*args, **kwargs)
+
 
 # ================ CLASS 5: Listing ================สินค้าที่แสดงหน้าร้าน
-class Listing(models.Model):
+class Listing(LoadedValuesMixin, models.Model):
     product = models.OneToOneField(
         Product, 
         related_name="listing", 
@@ -101,6 +154,7 @@ class Listing(models.Model):
     )
     unit = models.CharField(max_length=50, blank=True)
     image = models.ImageField(upload_to="listings/", blank=True, null=True)
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     quantity = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -189,7 +243,7 @@ class Festival(models.Model):
 
 
 # ================ CLASS 7: Task ================
-class Task(models.Model):
+class Task(LoadedValuesMixin, models.Model):
     """
     Model สำหรับการมอบหมายงานให้พนักงาน
     """
@@ -255,6 +309,14 @@ class Task(models.Model):
     )
     
     # Task Details
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='tasks',
+        verbose_name="สินค้า"
+    )  # งานเติมสินค้าที่สร้างอัตโนมัติ (ดู inventory/replenishment.py)
     target_quantity = models.IntegerField(
         null=True,
         blank=True,
@@ -273,6 +335,7 @@ class Task(models.Model):
         blank=True,
         verbose_name="รูปภาพ"
     )
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     
     # Timeline
     due_date = models.DateTimeField(verbose_name="วันกำหนด")
@@ -297,15 +360,20 @@ class Task(models.Model):
         verbose_name_plural = "งาน"
         indexes = [
             models.Index(fields=['assigned_to', 'status']),
+            models.Index(fields=['assigned_to', 'due_date'], name='task_assignee_due'),
             models.Index(fields=['due_date']),
             models.Index(fields=['status']),
         ]
     
     def __str__(self):
-        assigned_name = (
-            self.assigned_to.get_full_name() or 
-            self.assigned_to.username
-        )
+        # ไม่ query ผู้ใช้เพิ่มถ้ายังไม่ได้ select_related มา
+        if Task.assigned_to.is_cached(self):
+            assigned_name = (
+                self.assigned_to.get_full_name() or 
+                self.assigned_to.username
+            )
+        else:
+            assigned_name = f"#{self.assigned_to_id}"
         return (
             f"[{self.get_priority_display()}] "
             f"{self.title} → {assigned_name}"
@@ -328,8 +396,8 @@ class Task(models.Model):
         self.status = 'completed'
         self.completed_at = timezone.now()
         if notes:
-            current_notes = self.notes or ''
-            self.notes = f"{current_notes}\n[{timezone.now()}] {notes}"
+            # เก็บเฉพาะรายงานล่าสุด ประวัติเดิมอยู่ใน AuditLog
+            self.notes = notes
         self.save()
     
     def save(self, *args, **kwargs):
@@ -389,7 +457,394 @@ class CustomEvent(models.Model):
         verbose_name = "บันทึกของฉัน"
         verbose_name_plural = "บันทึกของฉัน"
         ordering = ['-priority', 'date', '-created_at']
+        indexes = [
+            # ปฏิทิน: ของตัวเอง / ที่แชร์ ในช่วงวันที่ (inventory/calendar_feed.py)
+            models.Index(fields=['created_by', 'date'], name='customevent_owner_date'),
+            models.Index(fields=['is_shared', 'date'], name='customevent_shared_date'),
+        ]
     
     def __str__(self):
         priority_display = self.get_priority_display()
-        return f"[{priority_display}] {self.title} ({self.date})"
\ No newline at end of file
+        return f"[{priority_display}] {self.title} ({self.date})"
+
+# ================ CLASS 9: ProductSearchToken ================
+class ProductSearchToken(models.Model):
+    """
+    ดัชนีค้นหาสินค้า (inverted index): token → สินค้า
+    สร้างจาก code, name และ listing title ดู inventory/search.py
+    """
+    product = models.ForeignKey(
+        Product,
+        related_name='search_tokens',
+        on_delete=models.CASCADE
+    )
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['token', 'product'],
+                name='uniq_search_token_product',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.token} → {self.product_id}"
+
+
+# ================ CLASS 10: ArchivedIssueLine ================
+class ArchivedIssueLine(models.Model):
+    """
+    รายการเบิกของเดือนที่ปิดแล้ว ย้ายมาจาก IssueLine (ดู inventory/archive.py)
+    เก็บ id เดิมไว้ → report อ่านรวมกับข้อมูลปัจจุบันได้โดย id ไม่ชนกัน
+    """
+    id = models.BigIntegerField(primary_key=True)
+    issue_id = models.BigIntegerField()
+    issue_status = models.CharField(max_length=20)
+    product = models.ForeignKey(
+        Product,
+        related_name='archived_issue_lines',
+        on_delete=models.PROTECT
+    )
+    qty = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at', 'product', 'qty'],
+                name='archline_created_prod_qty',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} × {self.qty} ({self.created_at:%Y-%m-%d})"
+
+
+# ================ CLASS 11: IssueRollup ================
+class IssueRollup(models.Model):
+    """ยอดเบิกรวมต่อสินค้าต่อเดือน (คำนวณไว้ตอน archive) ใช้กับ report ช่วงเวลายาว"""
+    month = models.DateField()  # วันที่ 1 ของเดือน (เวลาไทย)
+    product = models.ForeignKey(
+        Product,
+        related_name='issue_rollups',
+        on_delete=models.PROTECT
+    )
+    total_qty = models.PositiveIntegerField(default=0)
+    line_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'product'],
+                name='uniq_issue_rollup_month_product',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.product_id}: {self.total_qty}"
+
+
+# ================ CLASS 12: IssueArchivePeriod ================
+class IssueArchivePeriod(models.Model):
+    """เดือนที่ archive แล้ว"""
+    month = models.DateField(unique=True)
+    line_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} ({self.line_count} lines)"
+
+
+# ================ CLASS 13: StockMovement ================
+class StockMovement(models.Model):
+    """ประวัติการปรับสต็อก (นอกเหนือจากการเบิกซึ่งอยู่ใน IssueLine)"""
+    REASON_CHOICES = [
+        ('adjust', 'ปรับสต็อก'),
+        ('receive', 'รับเข้า'),
+        ('count', 'ตรวจนับ'),
+        ('correction', 'แก้ไขจำนวน'),
+        ('damaged', 'เสียหาย/สูญหาย'),
+    ]
+
+    product = models.ForeignKey(
+        Product,
+        related_name='stock_movements',
+        on_delete=models.CASCADE
+    )
+    delta = models.IntegerField(verbose_name="จำนวนที่เปลี่ยน")
+    stock_after = models.IntegerField(verbose_name="คงเหลือหลังปรับ")
+    stock_version = models.PositiveIntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='adjust')
+    note = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='stockmove_product_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} {self.delta:+d} → {self.stock_after}"
+
+
+# ================ CLASS 14: StockCount ================
+class StockCount(models.Model):
+    """รอบตรวจนับสต็อก (stocktake) — นับหลายคนพร้อมกัน แล้ว commit ทีเดียว ดู inventory/stocktake.py"""
+    STATUS_CHOICES = [
+        ('open', 'กำลังนับ'),
+        ('committed', 'ปรับสต็อกแล้ว'),
+        ('cancelled', 'ยกเลิก'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name="ชื่อรอบนับ")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='stock_counts',
+        verbose_name="งานตรวจสต็อก"
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    committed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    committed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+
+# ================ CLASS 15: StockCountLine ================
+class StockCountLine(models.Model):
+    """จำนวนที่นับได้ของสินค้า 1 ตัวในรอบนับ"""
+    stock_count = models.ForeignKey(
+        StockCount,
+        related_name='lines',
+        on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    counted = models.PositiveIntegerField(default=0)
+    # สต็อกในระบบตอน commit (ก่อนปรับ) → ผลต่าง = counted - expected
+    expected = models.IntegerField(null=True, blank=True)
+    counted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['stock_count', 'product'],
+                name='uniq_stock_count_product',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.stock_count_id}: {self.product_id} = {self.counted}"
+
+
+# ================ CLASS 16: ImageJob ================
+class ImageJob(models.Model):
+    """คิวสร้างรูปย่อ — worker (manage.py process_images) ดึงไปทำทีละชุด"""
+    STATUS_CHOICES = [
+        ('pending', 'รอทำ'),
+        ('processing', 'กำลังทำ'),
+        ('done', 'เสร็จ'),
+        ('failed', 'ล้มเหลว'),
+    ]
+
+    model_label = models.CharField(max_length=100)  # เช่น inventory.product
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    source = models.CharField(max_length=255)  # ชื่อไฟล์ต้นฉบับตอนเข้าคิว
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model_label', 'object_id', 'field', 'source'],
+                name='uniq_image_job_source',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'], name='imagejob_status_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}#{self.object_id}.{self.field} ({self.status})"
+
+
+# ================ CLASS 17: DemandForecast ================
+class DemandForecast(models.Model):
+    """ยอดเบิกที่คาดการณ์ต่อสินค้าสำหรับเทศกาลที่กำลังจะมาถึง (ดู inventory/forecasting.py)"""
+    BASIS_CHOICES = [
+        ('festival', 'ประวัติเทศกาลเดียวกัน'),
+        ('category', 'ประวัติเทศกาลหมวดเดียวกัน'),
+        ('baseline', 'ยอดปกติ'),
+    ]
+
+    festival = models.ForeignKey(
+        Festival,
+        related_name='demand_forecasts',
+        on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    window_start = models.DateField()  # รวมช่วงเตรียมของก่อนเทศกาล
+    window_end = models.DateField()
+    baseline_daily = models.FloatField(verbose_name="ยอดเบิกปกติต่อวัน")
+    uplift = models.FloatField(verbose_name="ตัวคูณช่วงเทศกาล")
+    forecast_qty = models.PositiveIntegerField(verbose_name="ยอดที่คาดว่าจะเบิก")
+    confidence = models.PositiveSmallIntegerField(default=0)  # 0-100
+    basis = models.CharField(max_length=20, choices=BASIS_CHOICES, default='festival')
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['festival', 'product'],
+                name='uniq_demand_forecast_festival_product',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['festival', '-forecast_qty'], name='forecast_festival_qty'),
+        ]
+
+    def __str__(self):
+        return f"{self.festival_id}: {self.product_id} × {self.forecast_qty}"
+
+
+# ================ CLASS 18: TaskReminder ================
+class TaskReminder(models.Model):
+    """แจ้งเตือนกำหนดส่งงานที่ส่งไปแล้ว (ดู inventory/reminders.py) กันส่งซ้ำเมื่อรันใหม่"""
+    STAGE_CHOICES = [
+        ('due_soon', 'ใกล้ถึงกำหนด'),
+        ('due_1h', 'ภายใน 1 ชั่วโมง'),
+        ('overdue', 'เลยกำหนด'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'กำลังส่ง'),
+        ('sent', 'ส่งแล้ว'),
+        ('no_line', 'ผู้รับไม่ได้เชื่อม LINE'),
+    ]
+
+    task = models.ForeignKey(Task, related_name='reminders', on_delete=models.CASCADE)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    # กำหนดส่ง ณ ตอนเตือน → ถ้าเลื่อนกำหนดส่ง จะเตือนรอบใหม่ได้
+    due_date = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='sent')
+    # รหัสของรอบที่จองแถวนี้ (ดู reminders._claim) → รู้ว่าแถวไหนรอบนี้ insert ได้จริง
+    claim = models.CharField(max_length=32, blank=True)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task', 'stage', 'due_date'],
+                name='uniq_task_reminder_stage',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['sent_at'], name='taskreminder_sent_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} {self.stage} ({self.status})"
+
+
+# ================ CLASS 19: AuditLog ================
+class CompactJSONEncoder(DjangoJSONEncoder):
+    # ไม่มีช่องว่างหลัง , และ : → JSON สั้นลง
+    item_separator = ','
+    key_separator = ':'
+
+
+class AuditLog(models.Model):
+    """ประวัติการแก้ไข Product / Listing / Task แบบเพิ่มอย่างเดียว (ดู inventory/audit.py)"""
+    ACTION_CHOICES = [
+        ('create', 'สร้าง'),
+        ('update', 'แก้ไข'),
+        ('delete', 'ลบ'),
+    ]
+
+    model = models.CharField(max_length=30)  # 'product' / 'listing' / 'task'
+    object_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # {field: [ค่าเดิม, ค่าใหม่]} เฉพาะ field ที่เปลี่ยน
+    changes = models.JSONField(default=dict, encoder=CompactJSONEncoder)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # เวลาที่แก้ไขจริง (แถวถูก insert ทีหลังตอน commit)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # ประวัติต่อ object / ต่อผู้ใช้ เรียงใหม่สุดก่อนด้วย id (keyset)
+            models.Index(fields=['model', 'object_id', 'id'], name='auditlog_object'),
+            models.Index(fields=['user', 'id'], name='auditlog_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.model}#{self.object_id} {self.action}"
+
+
+# ================ CLASS 20: ChangeCounter ================
+class ChangeCounter(models.Model):
+    """
+    เลข version ที่ทุก process เห็นตรงกัน (ดู caching.shared_versions)
+    ใช้กับข้อมูลที่ memo ไว้ในหน่วยความจำของแต่ละ worker เช่น ดัชนี autocomplete
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,137 @@
+# inventory/movements.py
+# feed การเคลื่อนไหวสินค้า (เบิกออก + รับเข้า) ที่ใช้ร่วมกันทั้ง dashboard พนักงานและ Admin
+#
+# รวม IssueLine + ArchivedIssueLine (out) กับ Product ที่รับเข้า (in) ด้วย UNION ALL แล้วให้ฐานข้อมูล
+# ORDER BY / LIMIT เอง → อ่านแค่จำนวนแถวที่จะแสดง ไม่ต้องโหลดทั้งวันมาเรียงใน Python
+#
+# "โหลดเพิ่ม" ใช้ cursor (keyset) = (เวลา, ชนิด, id) ของแถวสุดท้ายในหน้าก่อน
+# เรียงแบบ at DESC, kind DESC, ref_id DESC → แต่ละหน้ามีต้นทุนตามขนาดหน้าเท่านั้น
+
+import base64
+import json
+
+from django.db import connection
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils.dateparse import parse_datetime
+
+from .models import IssueLine, ArchivedIssueLine, Product
+
+KIND_OUT = 'out'
+KIND_IN = 'in'
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# ลำดับคอลัมน์ต้องตรงกันทั้งสองฝั่งของ UNION
+COLUMNS = ('kind', 'ref_id', 'at', 'p_code', 'p_name', 'p_qty')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    raw = json.dumps([row['at'].isoformat(), row['kind'], row['ref_id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        at, kind, ref_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        at = parse_datetime(at)
+        ref_id = int(ref_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor('cursor ไม่ถูกต้อง')
+    if at is None or kind not in (KIND_OUT, KIND_IN):
+        raise InvalidCursor('cursor ไม่ถูกต้อง')
+    return at, kind, ref_id
+
+
+def _after_cursor(kind, at_field, id_field, cursor):
+    """เงื่อนไข 'อยู่หลัง cursor' ของฝั่ง UNION ที่มี kind คงที่ (กรองก่อน union)"""
+    c_at, c_kind, c_id = cursor
+    if kind < c_kind:
+        # kind เรียง DESC → ฝั่งนี้อยู่หลัง cursor ถ้าเวลาเท่ากันด้วย
+        return Q(**{f'{at_field}__lte': c_at})
+    if kind > c_kind:
+        return Q(**{f'{at_field}__lt': c_at})
+    return Q(**{f'{at_field}__lt': c_at}) | Q(**{at_field: c_at, f'{id_field}__lt': c_id})
+
+
+def _issued(model, start, end, cursor):
+    # model = IssueLine หรือ ArchivedIssueLine (field ชื่อเดียวกัน, id ไม่ชนกัน)
+    qs = model.objects.all()
+    if start is not None:
+        qs = qs.filter(created_at__gte=start)
+    if end is not None:
+        qs = qs.filter(created_at__lte=end)
+    if cursor is not None:
+        qs = qs.filter(_after_cursor(KIND_OUT, 'created_at', 'id', cursor))
+    return qs.annotate(
+        kind=Value(KIND_OUT, output_field=CharField()),
+        ref_id=F('id'),
+        at=F('created_at'),
+        p_code=F('product__code'),
+        p_name=F('product__name'),
+        p_qty=F('qty'),
+    )
+
+
+def _received(start, end, cursor):
+    qs = Product.objects.filter(is_deleted=False)
+    if start is not None:
+        qs = qs.filter(created_at__gte=start)
+    if end is not None:
+        qs = qs.filter(created_at__lte=end)
+    if cursor is not None:
+        qs = qs.filter(_after_cursor(KIND_IN, 'created_at', 'id', cursor))
+    return qs.annotate(
+        kind=Value(KIND_IN, output_field=CharField()),
+        ref_id=F('id'),
+        at=F('created_at'),
+        p_code=F('code'),
+        p_name=F('name'),
+        # เหมือนเดิม: initial_stock ถ้ามี ไม่งั้นใช้ stock ปัจจุบัน
+        p_qty=Coalesce(NullIf('initial_stock', Value(0)), 'stock'),
+    )
+
+
+def movement_feed(start=None, end=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    คืน (movements, next_cursor)
+    - movements: [{'id', 'date', 'code', 'name', 'type', 'qty'}] ล่าสุดก่อน
+    - next_cursor: ส่งกลับมาเพื่อโหลดหน้าถัดไป (None = หมดแล้ว)
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if isinstance(cursor, str):
+        cursor = decode_cursor(cursor)
+
+    ordering = ('-at', '-kind', '-ref_id')
+    parts = [
+        _issued(IssueLine, start, end, cursor).values(*COLUMNS),
+        _issued(ArchivedIssueLine, start, end, cursor).values(*COLUMNS),
+        _received(start, end, cursor).values(*COLUMNS),
+    ]
+    if connection.features.supports_slicing_ordering_in_compound:
+        # MySQL: LIMIT แต่ละฝั่งก่อน union ด้วย → อ่านไม่เกิน 3 × (limit + 1) แถว
+        parts = [qs.order_by(*ordering)[:limit + 1] for qs in parts]
+
+    # ดึงเกิน 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปไหม
+    rows = list(parts[0].union(*parts[1:], all=True).order_by(*ordering)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    movements = [
+        {
+            'id':   f"{row['kind']}_{row['ref_id']}",
+            'date': row['at'].isoformat(),
+            'code': row['p_code'],
+            'name': row['p_name'],
+            'type': row['kind'],
+            'qty':  row['p_qty'],
+        }
+        for row in rows
+    ]
+    next_cursor = encode_cursor(rows[-1]) if has_more else None
+    return movements, next_cursor
@@ -0,0 +1,61 @@
+# inventory/parallel.py
+# รัน query ที่ไม่ขึ้นต่อกันพร้อมกัน (ใช้กับหน้า dashboard)
+#
+# - ใต้ ASGI (myapp.asgi): แต่ละ query รันใน thread ของตัวเองผ่าน sync_to_async
+#   แล้วรอพร้อมกันด้วย asyncio.gather → เวลารวม ≈ query ที่ช้าที่สุด แทนผลรวมของทุก query
+# - ใต้ WSGI / manage.py / test client: รันทีละตัวตามลำดับเหมือนเดิม
+#
+# แต่ละ thread ใช้ connection ของตัวเอง → ควรเปิด DB_POOL (myapp/db_pool) ไว้ด้วย
+# และตั้ง DASHBOARD_MAX_PARALLEL_QUERIES ให้น้อยกว่า DB_POOL_MAX_SIZE
+
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+
+def is_asgi_request(request):
+    # DRF Request ห่อ HttpRequest ของ Django ไว้ใน ._request
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+def _in_own_thread(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # คืน connection ของ thread นี้ (หรือเก็บไว้ตาม CONN_MAX_AGE)
+            close_old_connections()
+    return run
+
+
+async def _gather(parts, max_parallel):
+    # จำกัดจำนวน query พร้อมกันต่อ request ไม่ให้ request เดียวยึด connection pool จนหมด
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def run(func):
+        async with semaphore:
+            return await sync_to_async(_in_own_thread(func), thread_sensitive=False)()
+
+    names = list(parts)
+    results = await asyncio.gather(*(run(parts[name]) for name in names))
+    return dict(zip(names, results))
+
+
+def run_queries(request, parts, parallel=None):
+    """
+    parts = {'ชื่อ': ฟังก์ชันไม่มี argument ที่คืนผลลัพธ์ (ต้อง evaluate queryset ให้เสร็จในฟังก์ชัน)}
+    คืน dict ชื่อเดียวกัน → ผลลัพธ์
+    """
+    if parallel is None:
+        parallel = (
+            getattr(settings, 'DASHBOARD_PARALLEL_QUERIES', True)
+            and is_asgi_request(request)
+        )
+    if not parallel or len(parts) < 2:
+        return {name: func() for name, func in parts.items()}
+    return async_to_sync(_gather)(
+        parts, getattr(settings, 'DASHBOARD_MAX_PARALLEL_QUERIES', 4)
+    )
@@ -0,0 +1,180 @@
+# inventory/recurrence.py
+# ขยายเทศกาลประจำปี (is_recurring) ให้แสดงทุกปีโดยไม่ต้อง seed ใหม่
+#
+# rule: เทศกาลประจำปีเกิดซ้ำวัน/เดือนเดิมในปีถัดๆ ไปจากปีล่าสุดที่บันทึกไว้
+#   - ขยายเฉพาะเทศกาลวันที่คงที่ (is_recurring) — วันพระตามจันทรคติ seed เป็น is_recurring=False
+#     เพราะวันที่เปลี่ยนทุกปี จึงแสดงเฉพาะปีที่มีแถวจริง
+#   - ปีไหนมีแถวจริงชื่อเดียวกันอยู่แล้ว → ใช้แถวจริง ไม่ขยายซ้ำ
+#   - ชื่อเทียบแบบไม่สนวงเล็บท้าย: "วันสงกรานต์ (วันแรก)" = "วันสงกรานต์"
+#
+# - IntervalIndex: เรียงตามวันเริ่ม + ความยาวสูงสุด → หาเทศกาลที่ทับช่วงด้วย bisect O(log n + k)
+# - เทศกาลที่ขยายแล้วจำไว้ต่อปี และผลรายเดือนจำไว้ต่อเดือน (ใน process)
+# - ทั้งหมดสร้างใหม่เมื่อ version ของ caching.TAG_FESTIVALS เปลี่ยน (มีการแก้เทศกาล)
+
+import copy
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+
+from .models import Festival
+from . import caching
+
+# จำผลรายเดือนไว้ไม่เกินเท่านี้ (กันโตไม่จำกัดเมื่อมีคนเปิดหลายปี)
+MAX_MEMO_MONTHS = 240
+MAX_MEMO_YEARS = 50
+
+_SUFFIX = re.compile(r'\s*\([^)]*\)\s*$')
+
+
+def festival_key(name):
+    """ชื่อที่ใช้จับคู่เทศกาลเดียวกันข้ามปี"""
+    name = _SUFFIX.sub('', name or '')
+    return ' '.join(name.split()).lower()
+
+
+def shift_years(day, years):
+    try:
+        return day.replace(year=day.year + years)
+    except ValueError:
+        # 29 ก.พ. → 28 ก.พ.
+        return day.replace(year=day.year + years, day=28)
+
+
+def month_range(year, month):
+    first = date(year, month, 1)
+    following = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return first, following - timedelta(days=1)
+
+
+# ================ INTERVAL INDEX ================
+
+class IntervalIndex:
+    """ช่วงวันที่ [start, end] (รวม end) ค้นหาแบบทับช่วง"""
+
+    def __init__(self, items):
+        # items: [(start, end, value)]
+        items = sorted(items, key=lambda item: (item[0], item[1]))
+        self.starts = [start.toordinal() for start, _, _ in items]
+        self.ends = [end.toordinal() for _, end, _ in items]
+        self.values = [value for _, _, value in items]
+        # ช่วงที่ยาวที่สุด → รายการที่เริ่มก่อน first เกินนี้ไม่มีทางทับ
+        self.max_span = max((e - s for s, e in zip(self.starts, self.ends)), default=0)
+
+    def __len__(self):
+        return len(self.values)
+
+    def overlapping(self, first, last):
+        lo = bisect_left(self.starts, first.toordinal() - self.max_span)
+        hi = bisect_right(self.starts, last.toordinal())
+        first = first.toordinal()
+        return [self.values[i] for i in range(lo, hi) if self.ends[i] >= first]
+
+
+# ================ CALENDAR ================
+
+def project(festival, years):
+    """สำเนาเทศกาล (ไม่บันทึกลง DB) เลื่อนไป years ปี"""
+    occurrence = copy.copy(festival)
+    occurrence.start_date = shift_years(festival.start_date, years)
+    occurrence.end_date = shift_years(festival.end_date, years)
+    occurrence.is_projected = True
+    return occurrence
+
+
+class FestivalCalendar:
+    """เทศกาลทั้งหมด (แถวจริง + ที่ขยายจาก rule) ค้นหาตามช่วงวันที่"""
+
+    def __init__(self, festivals):
+        self.stored = IntervalIndex((f.start_date, f.end_date, f) for f in festivals)
+
+        self.stored_years = defaultdict(set)      # key → ปีที่มีแถวจริง
+        self.recurring = defaultdict(list)        # (key, ปี) → แถวประจำปี
+        for f in festivals:
+            key = festival_key(f.name)
+            self.stored_years[key].add(f.start_date.year)
+            if f.is_recurring:
+                self.recurring[(key, f.start_date.year)].append(f)
+        # key → ปีที่มีแถวประจำปี (เรียง) ใช้หาปีต้นแบบด้วย bisect
+        anchors = defaultdict(list)
+        for key, year in self.recurring:
+            anchors[key].append(year)
+        self.anchor_years = {key: sorted(years) for key, years in anchors.items()}
+
+        self._lock = threading.Lock()
+        self._years = {}
+        self._months = {}
+
+    def _projected(self, year):
+        """เทศกาลที่ขยายมาเริ่มในปี year (จำไว้)"""
+        index = self._years.get(year)
+        if index is not None:
+            return index
+
+        items = []
+        for key, years in self.anchor_years.items():
+            if year in self.stored_years[key]:
+                continue
+            i = bisect_left(years, year)
+            if i == 0:
+                continue  # ไม่ขยายย้อนหลังก่อนปีแรกที่บันทึกไว้
+            anchor = years[i - 1]
+            for f in self.recurring[(key, anchor)]:
+                try:
+                    occurrence = project(f, year - anchor)
+                except (ValueError, OverflowError):
+                    continue
+                items.append((occurrence.start_date, occurrence.end_date, occurrence))
+
+        index = IntervalIndex(items)
+        with self._lock:
+            if len(self._years) >= MAX_MEMO_YEARS:
+                self._years.clear()
+            self._years[year] = index
+        return index
+
+    def between(self, first, last):
+        """เทศกาลที่ทับช่วง [first, last] เรียงตามวันเริ่ม"""
+        found = self.stored.overlapping(first, last)
+        # เทศกาลที่เริ่มปลายปีก่อนอาจข้ามมาถึงช่วงนี้
+        for year in range(max(first.year - 1, 1), last.year + 1):
+            found.extend(self._projected(year).overlapping(first, last))
+        found.sort(key=lambda f: (f.start_date, f.end_date, f.name))
+        return found
+
+    def month(self, year, month):
+        key = (year, month)
+        found = self._months.get(key)
+        if found is None:
+            found = self.between(*month_range(year, month))
+            with self._lock:
+                if len(self._months) >= MAX_MEMO_MONTHS:
+                    self._months.clear()
+                self._months[key] = found
+        return list(found)
+
+    def upcoming(self, today, days=None, limit=None):
+        """เทศกาลที่เริ่มตั้งแต่วันนี้ (ภายใน days วัน)"""
+        last = today + timedelta(days=days if days is not None else 366)
+        found = [f for f in self.between(today, last) if f.start_date >= today]
+        return found[:limit] if limit else found
+
+
+_calendar = None
+_calendar_version = None
+_calendar_lock = threading.Lock()
+
+
+def get_calendar():
+    """FestivalCalendar ของ process นี้ (สร้างใหม่เมื่อมีการแก้เทศกาล)"""
+    global _calendar, _calendar_version
+    version = caching.shared_versions([caching.TAG_FESTIVALS])[0]
+    calendar = _calendar
+    if calendar is not None and _calendar_version == version:
+        return calendar
+    with _calendar_lock:
+        if _calendar is None or _calendar_version != version:
+            _calendar = FestivalCalendar(list(Festival.objects.all()))
+            _calendar_version = version
+        return _calendar
@@ -0,0 +1,241 @@
+# inventory/reminders.py
+# เตือนกำหนดส่งงานทาง LINE (manage.py send_task_reminders)
+#
+# - งานที่ยังไม่เสร็จซึ่งกำหนดส่งอยู่ในช่วง [ตอนนี้ - OVERDUE_LOOKBACK, ตอนนี้ + ช่วงเตือนล่วงหน้าสูงสุด]
+#   หาด้วย range query บน due_date (ใช้ index) ไม่ต้องไล่ทุกงาน
+# - แต่ละงานอยู่ได้ขั้นเดียว: ใกล้ถึงกำหนด → ภายใน 1 ชม. → เลยกำหนด (ขั้นหลังสุดที่ถึงแล้ว)
+# - รวมทุกงานของผู้รับคนเดียวเป็นข้อความ LINE เดียว
+# - บันทึก TaskReminder (task, ขั้น, กำหนดส่ง) → รันซ้ำไม่ส่งซ้ำ / เลื่อนกำหนดส่งแล้วเตือนใหม่ได้
+# - รันซ้อนกันหลาย process (cron ซ้อน / --loop หลายตัว) ได้: จองแถว TaskReminder (status='pending')
+#   ผ่าน unique constraint ก่อนส่ง → ส่งเฉพาะแถวที่รอบนี้จองได้ แล้วค่อยเปลี่ยนเป็น sent
+
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.models import NotificationSettings
+from .models import Task, TaskReminder
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('pending', 'in_progress')
+
+# เตือนล่วงหน้าก่อนกำหนดส่ง ตามความสำคัญ
+DUE_SOON = {
+    'urgent': timedelta(hours=48),
+    'high': timedelta(hours=24),
+    'medium': timedelta(hours=24),
+    'low': timedelta(hours=6),
+}
+DUE_1H = timedelta(hours=1)
+# งานที่เลยกำหนดนานกว่านี้ไม่เตือนแล้ว (ถือว่าถูกทิ้ง)
+OVERDUE_LOOKBACK = timedelta(days=7)
+KEEP_DAYS = 60
+
+STAGE_ORDER = ('overdue', 'due_1h', 'due_soon')
+STAGE_HEADINGS = {
+    'overdue': '🔴 เลยกำหนดแล้ว',
+    'due_1h': '🟠 ภายใน 1 ชั่วโมง',
+    'due_soon': '🟡 ใกล้ถึงกำหนด',
+}
+MAX_LINES = 15  # งานต่อข้อความ (ที่เหลือสรุปเป็นจำนวน)
+
+# แถวที่จองไว้แล้วค้าง (process ตายระหว่างส่ง) นานกว่านี้ → ปล่อยให้รอบถัดไปจองใหม่
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def stage_for(task, now):
+    if task.due_date <= now:
+        return 'overdue'
+    if task.due_date <= now + DUE_1H:
+        return 'due_1h'
+    if task.due_date <= now + DUE_SOON.get(task.priority, DUE_SOON['medium']):
+        return 'due_soon'
+    return None
+
+
+def due_reminders(now=None):
+    """
+    งานที่ถึงขั้นเตือนแล้วแต่ยังไม่ได้เตือน {assignee_id: [(task, stage)]}
+    (2 query: งานในช่วงเวลา + reminder ที่บันทึกไว้แล้วของงานเหล่านั้น)
+    """
+    now = now or timezone.now()
+    tasks = list(
+        Task.objects.filter(
+            status__in=OPEN_STATUSES,
+            due_date__gte=now - OVERDUE_LOOKBACK,
+            due_date__lte=now + max(DUE_SOON.values()),
+        ).only('id', 'title', 'priority', 'due_date', 'assigned_to_id').order_by('due_date', 'id')
+    )
+    sent = set(
+        TaskReminder.objects.filter(task_id__in=[t.id for t in tasks])
+        .values_list('task_id', 'stage', 'due_date')
+    )
+
+    pending = defaultdict(list)
+    for task in tasks:
+        stage = stage_for(task, now)
+        if stage and (task.id, stage, task.due_date) not in sent:
+            pending[task.assigned_to_id].append((task, stage))
+    return pending
+
+
+def _relative(due, now):
+    minutes = int(abs((due - now).total_seconds()) // 60)
+    if minutes < 60:
+        text = f'{minutes} นาที'
+    elif minutes < 60 * 48:
+        text = f'{minutes // 60} ชม.'
+    else:
+        text = f'{minutes // (60 * 24)} วัน'
+    return f'เลยมา {text}' if due <= now else f'อีก {text}'
+
+
+def build_message(items, now=None):
+    """ข้อความ LINE 1 ข้อความสำหรับงานทั้งหมดของผู้รับคนเดียว"""
+    now = now or timezone.now()
+    by_stage = defaultdict(list)
+    for task, stage in items:
+        by_stage[stage].append(task)
+
+    lines = [f'⏰ แจ้งเตือนงาน ({len(items)} งาน)']
+    shown = 0
+    for stage in STAGE_ORDER:
+        if not by_stage[stage]:
+            continue
+        lines.append('')
+        lines.append(STAGE_HEADINGS[stage])
+        for task in by_stage[stage]:
+            if shown >= MAX_LINES:
+                break
+            due = timezone.localtime(task.due_date)
+            lines.append(f'• {task.title} — {due:%d/%m %H:%M} ({_relative(task.due_date, now)})')
+            shown += 1
+    if len(items) > shown:
+        lines.append(f'… และอีก {len(items) - shown} งาน')
+    lines.append('')
+    lines.append('📱 ดูรายละเอียดในระบบ EasyStock')
+    return '\n'.join(lines)
+
+
+def line_sender():
+    """ฟังก์ชันส่งข้อความ LINE (user_id, text) → bool ไม่มี LINE SDK → None"""
+    try:
+        from .line_messaging import LineMessagingService
+    except ImportError:
+        return None
+    service = LineMessagingService(
+        channel_access_token=getattr(settings, 'LINE_CHANNEL_ACCESS_TOKEN', ''),
+        channel_secret=getattr(settings, 'LINE_CHANNEL_SECRET', ''),
+    )
+    return lambda user_id, text: service.send_text_message(user_id, text).get('success', False)
+
+
+def release_stale_claims(now=None):
+    """ลบแถวที่จองค้าง (process ตายก่อนส่งเสร็จ) → รอบนี้จองใหม่ได้"""
+    now = now or timezone.now()
+    return TaskReminder.objects.filter(status='pending', sent_at__lt=now - CLAIM_TIMEOUT).delete()[0]
+
+
+def _claim(pending):
+    """
+    จองแถว TaskReminder(status='pending') ด้วย unique (task, stage, due_date)
+    คืน {assignee_id: [(task, stage)]} เฉพาะรายการที่รอบนี้จองได้ (process อื่นจองไปแล้ว → ข้าม)
+    """
+    token = uuid.uuid4().hex
+    TaskReminder.objects.bulk_create(
+        [
+            TaskReminder(task=task, stage=stage, due_date=task.due_date, status='pending', claim=token)
+            for items in pending.values() for task, stage in items
+        ],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    mine = set(
+        TaskReminder.objects.filter(
+            task_id__in=[task.id for items in pending.values() for task, _ in items], claim=token
+        ).values_list('task_id', 'stage')
+    )
+    claimed = {}
+    for assignee_id, items in pending.items():
+        items = [(task, stage) for task, stage in items if (task.id, stage) in mine]
+        if items:
+            claimed[assignee_id] = items
+    return claimed, token
+
+
+def send_due_reminders(send=None, now=None, dry_run=False):
+    """
+    ส่งเตือนรอบเดียว คืน dict สถิติ
+    send: callable(line_user_id, text) → bool (ไม่ระบุ = LINE จริง)
+    """
+    now = now or timezone.now()
+    stats = {
+        'recipients': 0, 'tasks': 0, 'sent': 0, 'failed': 0, 'no_line': 0,
+        'skipped': 0, 'line_unavailable': False,
+    }
+
+    if not dry_run:
+        release_stale_claims(now)
+    pending = due_reminders(now)
+    stats['recipients'] = len(pending)
+    stats['tasks'] = sum(len(items) for items in pending.values())
+    if dry_run or not pending:
+        return stats
+
+    if send is None:
+        send = line_sender()
+    if send is None:
+        # ไม่มี LINE SDK → ไม่จองอะไร ติดตั้งแล้วรอบหน้าจะส่งให้
+        stats['line_unavailable'] = True
+        return stats
+
+    claimed, token = _claim(pending)
+    # process อื่นที่รันซ้อนกันจองไปแล้ว → ให้ process นั้นส่ง
+    stats['skipped'] = stats['tasks'] - sum(len(items) for items in claimed.values())
+    line_ids = dict(
+        NotificationSettings.objects.filter(
+            user_id__in=list(claimed), line_user_id__isnull=False
+        ).exclude(line_user_id='').values_list('user_id', 'line_user_id')
+    )
+
+    done = {'sent': [], 'no_line': []}
+    failed = []
+    for assignee_id, items in claimed.items():
+        task_ids = [task.id for task, _ in items]
+        line_id = line_ids.get(assignee_id)
+        if not line_id:
+            done['no_line'].extend(task_ids)
+            stats['no_line'] += 1
+            continue
+        try:
+            ok = send(line_id, build_message(items, now))
+        except Exception as e:
+            logger.error(f'Task reminder LINE error: {e}')
+            ok = False
+        if ok:
+            done['sent'].extend(task_ids)
+            stats['sent'] += 1
+        else:
+            # ปล่อยแถวที่จองไว้ → รอบหน้าลองใหม่
+            failed.extend(task_ids)
+            stats['failed'] += 1
+
+    mine = TaskReminder.objects.filter(claim=token, status='pending')
+    for status, task_ids in done.items():
+        if task_ids:
+            mine.filter(task_id__in=task_ids).update(status=status, sent_at=timezone.now())
+    if failed:
+        mine.filter(task_id__in=failed).delete()
+    return stats
+
+
+def purge(days=KEEP_DAYS):
+    """ลบประวัติการเตือนที่เก่ากว่า days วัน"""
+    deleted, _ = TaskReminder.objects.filter(
+        sent_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
@@ -0,0 +1,188 @@
+# inventory/replenishment.py
+# วางแผนเติมสินค้าทุกรายการในรอบเดียว แล้วสร้างงาน stock_replenishment ให้พนักงาน (manage.py plan_replenishment)
+#
+# 1. ยอดเบิกเฉลี่ยต่อวันย้อนหลัง velocity_days (archive.issued_totals → รวมข้อมูลที่ archive แล้วด้วย)
+# 2. ยอดที่ต้องใช้ในช่วง lead_days + cover_days = ยอดเฉลี่ย × วัน
+#    + ส่วนที่เกินของเทศกาลที่ทับช่วงนั้น (DemandForecast จาก manage.py forecast_demand)
+# 3. สต็อกหลังช่วงรอของ (lead_days) ต่ำกว่า safety stock → สั่งเติมให้พอถึงสิ้นช่วง + safety stock
+# 4. สินค้าที่มีงานเติมค้างอยู่แล้วข้าม / งานใหม่แจกให้คนที่มีงานค้างน้อยที่สุดก่อน
+#
+# ทุกอย่างเป็น query รวมไม่กี่ครั้ง + คำนวณใน memory → ไม่มี query ต่อสินค้า
+
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product, Task, DemandForecast
+from . import archive
+from .assignment import OPEN_STATUSES, WorkloadBalancer, assignees, save_tasks
+
+DEFAULT_VELOCITY_DAYS = 28
+DEFAULT_LEAD_DAYS = 3
+DEFAULT_COVER_DAYS = 14
+DEFAULT_SAFETY_DAYS = 2
+
+PRIORITY_ORDER = {'urgent': 0, 'high': 1, 'medium': 2, 'low': 3}
+# ลำดับความสำคัญ → กำหนดส่ง (วัน)
+DUE_DAYS = {'urgent': 1, 'high': 2, 'medium': DEFAULT_LEAD_DAYS, 'low': DEFAULT_COVER_DAYS}
+
+
+class ReplenishmentError(Exception):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class Suggestion:
+    """สินค้า 1 รายการที่ควรเติม"""
+    __slots__ = (
+        'product_id', 'code', 'name', 'unit', 'stock', 'daily', 'demand',
+        'quantity', 'days_left', 'priority', 'festival',
+    )
+
+    def __init__(self, **values):
+        for key, value in values.items():
+            setattr(self, key, value)
+
+    def title(self):
+        return f"เติมสินค้า {self.name} ({self.code})"
+
+    def description(self):
+        days_left = '-' if self.days_left is None else f'{self.days_left:.1f}'
+        text = (
+            f"สต็อก {self.stock} {self.unit} · เบิกเฉลี่ย {self.daily:.1f} {self.unit}/วัน · "
+            f"พอใช้อีก {days_left} วัน\n"
+            f"คาดว่าจะใช้ {self.demand:.0f} {self.unit} → เติม {self.quantity} {self.unit}"
+        )
+        if self.festival:
+            text += f"\nเตรียมของสำหรับเทศกาล: {self.festival}"
+        return text
+
+
+def _overlap(first, last, start, end):
+    """จำนวนวันที่ช่วง [first, last] (รวม last) ทับกับ [start, end)"""
+    return max((min(last + timedelta(days=1), end) - max(first, start)).days, 0)
+
+
+def _festival_extra(today, lead_end, horizon_end):
+    """
+    ยอดจากเทศกาลที่ทับช่วงวางแผน {product_id: [(daily ช่วงเทศกาล, first, last, ชื่อ)]}
+    """
+    extra = defaultdict(list)
+    rows = DemandForecast.objects.filter(
+        window_start__lt=horizon_end, window_end__gte=today
+    ).values_list('product_id', 'window_start', 'window_end', 'forecast_qty', 'festival__name')
+    for product_id, first, last, qty, name in rows.iterator(chunk_size=5000):
+        days = (last - first).days + 1
+        extra[product_id].append((qty / days, first, last, name))
+    return extra
+
+
+def plan(today=None, velocity_days=DEFAULT_VELOCITY_DAYS, lead_days=DEFAULT_LEAD_DAYS,
+         cover_days=DEFAULT_COVER_DAYS, safety_days=DEFAULT_SAFETY_DAYS, min_qty=1):
+    """คำนวณรายการที่ต้องเติม เรียงตามความด่วน คืน [Suggestion]"""
+    today = today or timezone.localdate()
+    lead_end = today + timedelta(days=lead_days)
+    horizon_end = lead_end + timedelta(days=cover_days)
+    since = timezone.now() - timedelta(days=velocity_days)
+
+    issued = archive.issued_totals(created_at__gte=since)
+    festivals = _festival_extra(today, lead_end, horizon_end)
+    # มีงานเติมค้างอยู่แล้ว → ไม่สร้างซ้ำ
+    pending = set(
+        Task.objects.filter(
+            task_type='stock_replenishment', status__in=OPEN_STATUSES, product__isnull=False
+        ).values_list('product_id', flat=True)
+    )
+
+    suggestions = []
+    products = Product.objects.filter(is_deleted=False).values_list(
+        'id', 'code', 'name', 'unit', 'stock'
+    )
+    for product_id, code, name, unit, stock in products.iterator(chunk_size=5000):
+        if product_id in pending:
+            continue
+        daily = issued.get(product_id, {}).get('total_issued', 0) / velocity_days
+        lead_demand = daily * lead_days
+        demand = daily * (lead_days + cover_days)
+
+        # ช่วงเทศกาลใช้ยอดคาดการณ์แทนยอดปกติ (เฉพาะส่วนที่มากกว่า)
+        festival = None
+        for festival_daily, first, last, festival_name in festivals.get(product_id, ()):
+            surplus = festival_daily - daily
+            if surplus <= 0:
+                continue
+            lead_demand += surplus * _overlap(first, last, today, lead_end)
+            demand += surplus * _overlap(first, last, today, horizon_end)
+            festival = festival or festival_name
+        if demand <= 0:
+            continue
+
+        safety = daily * safety_days
+        if stock - lead_demand >= safety:
+            continue
+        quantity = math.ceil(demand + safety - max(stock, 0))
+        if quantity < min_qty:
+            continue
+
+        days_left = stock / daily if daily else None
+        if stock <= 0 or (days_left is not None and days_left < 1):
+            priority = 'urgent'
+        elif days_left is not None and days_left < lead_days:
+            priority = 'high'
+        else:
+            priority = 'medium'
+
+        suggestions.append(Suggestion(
+            product_id=product_id, code=code, name=name, unit=unit, stock=stock,
+            daily=daily, demand=demand, quantity=quantity, days_left=days_left,
+            priority=priority, festival=festival,
+        ))
+
+    suggestions.sort(key=lambda s: (
+        PRIORITY_ORDER[s.priority],
+        s.days_left if s.days_left is not None else math.inf,
+        -s.quantity,
+    ))
+    return suggestions
+
+
+# ================ TASKS ================
+
+def create_tasks(suggestions, created_by=None, users=None, batch_size=1000):
+    """
+    สร้าง Task ทีละชุด (bulk_create) แจกให้คนที่มีงานค้างน้อยที่สุด
+    คืน Counter {user_id: จำนวนงานใหม่}
+    """
+    users = users if users is not None else assignees()
+    if not users:
+        raise ReplenishmentError('ไม่มีผู้ใช้ที่มอบหมายงานได้', status_code=409)
+
+    with transaction.atomic():
+        # คนที่มีงานค้างน้อยที่สุดได้งานก่อน (assignment.WorkloadBalancer ล็อกผู้รับงานไว้จนบันทึกเสร็จ)
+        balancer = WorkloadBalancer([u.id for u in users])
+
+        now = timezone.now()
+        assigned = Counter()
+        tasks = []
+        for s in suggestions:
+            user_id = balancer.next()
+            tasks.append(Task(
+                title=s.title()[:255],
+                description=s.description(),
+                task_type='stock_replenishment',
+                assigned_to_id=user_id,
+                created_by=created_by,
+                priority=s.priority,
+                product_id=s.product_id,
+                target_quantity=s.quantity,
+                due_date=now + timedelta(days=DUE_DAYS[s.priority]),
+            ))
+            assigned[user_id] += 1
+
+        save_tasks(tasks, batch_size=batch_size)
+    return assigned
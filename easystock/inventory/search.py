@@ -0,0 +1,190 @@
+# inventory/search.py
+# ดัชนีค้นหาสินค้า (n-gram + ตัดคำภาษาไทย) แทนการค้นด้วย LIKE '%...%'
+
+import re
+import unicodedata
+
+from django.db.models import (
+    Case, When, Value, IntegerField, Q, Sum, Count, OuterRef, Subquery
+)
+from django.db.models.functions import Coalesce
+
+from .models import Product, Listing, ProductSearchToken
+
+# pythainlp เป็น optional — ถ้ามีจะใช้ตัดคำไทย ถ้าไม่มีใช้ n-gram อย่างเดียว
+try:
+    from pythainlp.tokenize import word_tokenize as thai_word_tokenize
+    THAI_TOKENIZER_AVAILABLE = True
+except ImportError:
+    thai_word_tokenize = None
+    THAI_TOKENIZER_AVAILABLE = False
+
+
+NGRAM_SIZE = 2
+MAX_TOKEN_LENGTH = 64
+
+# น้ำหนักของแต่ละ field ใช้จัดอันดับผลการค้นหา
+WEIGHT_CODE = 5
+WEIGHT_NAME = 3
+WEIGHT_TITLE = 2
+
+# คะแนนพิเศษเมื่อรหัสสินค้าตรงทั้งหมด / ขึ้นต้นตรง (ใช้ index ของ code ได้)
+CODE_EXACT_BONUS = 1000
+CODE_PREFIX_BONUS = 500
+
+WORD_SEPARATORS = re.compile(r"[\s\-_/\\.,;:()\[\]{}'\"!?+*&#@|<>=~^%$]+")
+_THAI_CHARS = re.compile(r"[฀-๿]")
+
+
+def normalize(text):
+    return unicodedata.normalize('NFC', str(text or '')).lower().strip()
+
+
+def _words(text):
+    words = []
+    for part in WORD_SEPARATORS.split(normalize(text)):
+        if not part:
+            continue
+        if THAI_TOKENIZER_AVAILABLE and _THAI_CHARS.search(part):
+            words.extend(
+                w.strip() for w in thai_word_tokenize(part, keep_whitespace=False)
+                if w.strip()
+            )
+        else:
+            words.append(part)
+    return words
+
+
+def _ngrams(word):
+    if len(word) <= NGRAM_SIZE:
+        return {word}
+    return {word[i:i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1)}
+
+
+def tokenize(text):
+    """token สำหรับเก็บใน index: คำเต็ม + n-gram ของแต่ละคำ"""
+    tokens = set()
+    for word in _words(text):
+        tokens.add(word[:MAX_TOKEN_LENGTH])
+        tokens.update(_ngrams(word))
+    return tokens
+
+
+def query_tokens(query):
+    """
+    แยก query เป็น (grams, words)
+    - grams: ต้องเจอครบทุกตัวถึงจะนับว่าตรง
+    - words: ใช้เพิ่มคะแนนเมื่อคำตรงทั้งคำ
+    """
+    grams = set()
+    words = set()
+    for word in _words(query):
+        words.add(word[:MAX_TOKEN_LENGTH])
+        # คำที่สั้นกว่า n-gram (เช่นพิมพ์ตัวเดียว) ไม่ใช้กรอง
+        if len(word) >= NGRAM_SIZE:
+            grams.update(_ngrams(word))
+    return grams, words
+
+
+# ================ INDEXING ================
+
+def _product_tokens(product):
+    weights = {}
+
+    def add(text, weight):
+        for token in tokenize(text):
+            weights[token] = weights.get(token, 0) + weight
+
+    add(product.code, WEIGHT_CODE)
+    add(product.name, WEIGHT_NAME)
+    try:
+        listing = product.listing
+    except Listing.DoesNotExist:
+        listing = None
+    if listing and listing.title:
+        add(listing.title, WEIGHT_TITLE)
+    return weights
+
+
+def reindex_products(product_ids, batch_size=1000):
+    """สร้าง token ใหม่ของสินค้าที่ระบุ (สินค้าที่ถูกลบแล้วจะไม่มี token)"""
+    product_ids = list(product_ids)
+    for i in range(0, len(product_ids), batch_size):
+        chunk = product_ids[i:i + batch_size]
+        ProductSearchToken.objects.filter(product_id__in=chunk).delete()
+        products = Product.objects.select_related('listing').filter(
+            id__in=chunk, is_deleted=False
+        )
+        rows = [
+            ProductSearchToken(product_id=p.id, token=token, weight=weight)
+            for p in products
+            for token, weight in _product_tokens(p).items()
+        ]
+        ProductSearchToken.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def rebuild_index(batch_size=1000):
+    """ล้างแล้วสร้าง index ใหม่ทั้งหมด คืนค่าจำนวนสินค้าที่ index"""
+    ProductSearchToken.objects.all().delete()
+    ids = list(
+        Product.objects.filter(is_deleted=False)
+        .order_by('id').values_list('id', flat=True)
+    )
+    reindex_products(ids, batch_size=batch_size)
+    return len(ids)
+
+
+# ================ QUERYING ================
+
+def matching_product_ids(query):
+    """subquery ของ product_id ที่มี n-gram ของ query ครบทุกตัว"""
+    grams, _ = query_tokens(query)
+    if not grams:
+        return None
+    return (
+        ProductSearchToken.objects.filter(token__in=grams)
+        .values('product_id')
+        .annotate(hits=Count('token', distinct=True))
+        .filter(hits__gte=len(grams))
+        .values('product_id')
+    )
+
+
+def search_queryset(qs, query, product_field='pk', code_field='code',
+                    fallback_fields=('name', 'code')):
+    """
+    กรองและจัดอันดับ queryset ตาม query
+    - qs ของ Product ใช้ค่า default
+    - qs ของ Listing ส่ง product_field='product_id', code_field='product__code'
+    ถ้า query สั้นเกินไปจนไม่มี n-gram จะกลับไปใช้ icontains แบบเดิม
+    """
+    query = normalize(query)
+    grams, words = query_tokens(query)
+    matches = matching_product_ids(query)
+    if matches is None:
+        fallback = Q()
+        for field in fallback_fields:
+            fallback |= Q(**{f'{field}__icontains': query})
+        return qs.filter(fallback)
+
+    score = Subquery(
+        ProductSearchToken.objects.filter(
+            product_id=OuterRef(product_field),
+            token__in=grams | words,
+        ).values('product_id').annotate(
+            score=Sum('weight')
+        ).values('score')[:1],
+        output_field=IntegerField(),
+    )
+    code_bonus = Case(
+        When(**{f'{code_field}__iexact': query}, then=Value(CODE_EXACT_BONUS)),
+        When(**{f'{code_field}__istartswith': query}, then=Value(CODE_PREFIX_BONUS)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return qs.filter(
+        Q(**{f'{product_field}__in': matches}) |
+        Q(**{f'{code_field}__istartswith': query})
+    ).annotate(
+        search_rank=Coalesce(score, Value(0)) + code_bonus
+    ).order_by('-search_rank', '-id')
@@ -2,9 +2,10 @@
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from . import thumbnails
 from .models import (
     Product, Category, Listing, Festival,
-    Task, CustomEvent
+    Task, CustomEvent, StockMovement, StockCount
 )
 
 User = get_user_model()
@@ -40,6 +41,7 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only=True
     )
     image_url = serializers.SerializerMethodField()
+    image_thumbnails = serializers.SerializerMethodField()
     display_name = serializers.SerializerMethodField()
     listing_title = serializers.SerializerMethodField()
     has_listing = serializers.SerializerMethodField()
@@ -52,11 +54,18 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'code', 'name',
             'display_name', 'listing_title', 'has_listing',
             'selling_price',
-            'unit', 'stock', 'inventory_value', 'potential_revenue',
-            'image', 'image_url', 'category', 'category_name',
+            'unit', 'stock', 'stock_version', 'inventory_value', 'potential_revenue',
+            'image', 'image_url', 'image_thumbnails', 'category', 'category_name',
             'on_sale', 'created_at', 'created_by'
         ]
-        read_only_fields = ['created_at', 'created_by', 'on_sale']
+        read_only_fields = ['created_at', 'created_by', 'on_sale', 'stock_version']
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # บันทึกเฉพาะ field ที่ส่งมา → ไม่เขียนทับ stock ที่ถูกปรับพร้อมกันจาก request อื่น
+        instance.save(update_fields=list(validated_data))
+        return instance
     
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -68,6 +77,9 @@ class ProductSerializer(serializers.ModelSerializer):
             except:
                 return None
         return None
+
+    def get_image_thumbnails(self, obj):
+        return thumbnails.thumbnail_urls(obj.image_renditions, self.context.get('request'))
     
     def get_display_name(self, obj):
         try:
@@ -98,6 +110,37 @@ class ProductSerializer(serializers.ModelSerializer):
         return float(obj.selling_price * obj.stock)
 
 
+# ================ StockMovement Serializer ================
+class StockMovementSerializer(serializers.ModelSerializer):
+    product_code = serializers.CharField(source='product.code', read_only=True)
+    reason_display = serializers.CharField(source='get_reason_display', read_only=True)
+
+    class Meta:
+        model = StockMovement
+        fields = [
+            'id', 'product', 'product_code', 'delta', 'stock_after',
+            'stock_version', 'reason', 'reason_display', 'note',
+            'created_by', 'created_at'
+        ]
+        read_only_fields = fields
+
+
+# ================ StockCount Serializer ================
+class StockCountSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = StockCount
+        fields = [
+            'id', 'name', 'status', 'status_display', 'task', 'line_count',
+            'created_by', 'created_at', 'committed_by', 'committed_at'
+        ]
+        read_only_fields = [
+            'status', 'created_by', 'created_at', 'committed_by', 'committed_at'
+        ]
+
+
 # ================ Listing Serializer ================
 class ListingSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(
@@ -113,6 +156,7 @@ class ListingSerializer(serializers.ModelSerializer):
         read_only=True
     )
     image_url = serializers.SerializerMethodField()
+    image_thumbnails = serializers.SerializerMethodField()
     selling_price = serializers.SerializerMethodField()
     
     class Meta:
@@ -121,7 +165,7 @@ class ListingSerializer(serializers.ModelSerializer):
             'id', 'product', 'product_name', 'product_code',
             'category_name', 'title', 'sale_price', 'unit',
             'selling_price',
-            'image', 'image_url', 'is_active', 'quantity', 'created_at'
+            'image', 'image_url', 'image_thumbnails', 'is_active', 'quantity', 'created_at'
         ]
         read_only_fields = ['created_at']
     
@@ -146,19 +190,29 @@ class ListingSerializer(serializers.ModelSerializer):
                 pass
         return None
 
+    def get_image_thumbnails(self, obj):
+        # ใช้รูปของ listing ก่อน ถ้าไม่มี → รูปของสินค้า (เหมือน image_url)
+        request = self.context.get('request')
+        if obj.image:
+            return thumbnails.thumbnail_urls(obj.image_renditions, request)
+        if obj.product and obj.product.image:
+            return thumbnails.thumbnail_urls(obj.product.image_renditions, request)
+        return None
+
 
 # ================ Festival Serializer ================
 class FestivalSerializer(serializers.ModelSerializer):
     duration_days = serializers.SerializerMethodField()
     is_upcoming = serializers.SerializerMethodField()
     days_until = serializers.SerializerMethodField()
+    is_projected = serializers.SerializerMethodField()
 
     class Meta:
         model = Festival
         fields = [
             'id', 'name', 'description', 'start_date', 'end_date',
             'is_recurring', 'category', 'icon', 'color',
-            'duration_days', 'is_upcoming', 'days_until',
+            'duration_days', 'is_upcoming', 'days_until', 'is_projected',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['created_at', 'updated_at']
@@ -172,6 +226,10 @@ class FestivalSerializer(serializers.ModelSerializer):
     def get_days_until(self, obj):
         return obj.days_until
 
+    def get_is_projected(self, obj):
+        # True = ขยายจากเทศกาลประจำปีของปีก่อน (id คือแถวต้นแบบ)
+        return getattr(obj, 'is_projected', False)
+
 
 # ================ Task Serializer ================
 class TaskSerializer(serializers.ModelSerializer):
@@ -193,6 +251,7 @@ class TaskSerializer(serializers.ModelSerializer):
     )
     is_overdue = serializers.BooleanField(read_only=True)
     days_until_due = serializers.SerializerMethodField()
+    image_thumbnails = serializers.SerializerMethodField()
     
     class Meta:
         model = Task
@@ -200,9 +259,9 @@ class TaskSerializer(serializers.ModelSerializer):
             'id', 'title', 'description', 'task_type', 'task_type_display',
             'assigned_to', 'assigned_to_name',
             'status', 'status_display', 'priority', 'priority_display',
-            'target_quantity', 'notes',
+            'product', 'target_quantity', 'notes',
             'due_date', 'created_at', 'updated_at', 'completed_at',
-            'is_overdue', 'days_until_due'
+            'is_overdue', 'days_until_due', 'image_thumbnails'
             # ← ลบ festival, festival_name, products ออกแล้ว
         ]
         read_only_fields = ['created_at', 'updated_at', 'completed_at']
@@ -210,6 +269,17 @@ class TaskSerializer(serializers.ModelSerializer):
     def get_days_until_due(self, obj):
         return obj.days_until_due
 
+    def get_image_thumbnails(self, obj):
+        return thumbnails.thumbnail_urls(obj.image_renditions, self.context.get('request'))
+
+
+class TaskTemplateSerializer(serializers.ModelSerializer):
+    """แม่แบบงานสำหรับ POST /tasks/bulk/ (ผู้รับงาน/สินค้าส่งแยกเป็นรายการ id)"""
+
+    class Meta:
+        model = Task
+        fields = ['title', 'description', 'task_type', 'priority', 'due_date', 'target_quantity', 'checklist']
+
 
 # ================ CustomEvent Serializer ================
 class CustomEventSerializer(serializers.ModelSerializer):
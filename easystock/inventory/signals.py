@@ -0,0 +1,103 @@
+# inventory/signals.py
+# อัปเดตดัชนีค้นหา / autocomplete และล้าง cache ทุกครั้งที่ข้อมูลถูกบันทึกหรือลบ
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category, Issue, IssueLine, Listing, Festival, Task, CustomEvent
+from . import search, autocomplete, caching, thumbnails, audit
+
+# field ที่มีผลกับดัชนีค้นหา — save(update_fields=[...]) อื่นๆ (เช่น stock) ไม่ต้อง reindex
+PRODUCT_SEARCH_FIELDS = {'code', 'name', 'is_deleted'}
+LISTING_SEARCH_FIELDS = {'title'}
+
+
+def _search_fields_changed(instance, created, update_fields):
+    if created:
+        return True
+    if update_fields and not PRODUCT_SEARCH_FIELDS.intersection(update_fields):
+        return False
+    # ค่าที่โหลดจาก DB (LoadedValuesMixin) → save ที่ไม่ได้แก้รหัส / ชื่อ ไม่ต้อง reindex
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is None:
+        return True
+    return any(
+        field in loaded and loaded[field] != getattr(instance, field)
+        for field in PRODUCT_SEARCH_FIELDS
+    ) or not PRODUCT_SEARCH_FIELDS.issubset(loaded)
+
+
+@receiver(post_save, sender=Product)
+def reindex_product_on_save(sender, instance, created, update_fields=None, **kwargs):
+    # stock ไม่อยู่ในดัชนี (autocomplete อ่าน stock สดตอนค้น) → เฉพาะรหัส / ชื่อ / ลบ
+    if not _search_fields_changed(instance, created, update_fields):
+        return
+    # หลัง commit เพื่อไม่ให้ process อื่น build ดัชนีจากข้อมูลที่ยังไม่ commit
+    transaction.on_commit(autocomplete.bump_version)
+    search.reindex_products([instance.pk])
+
+
+@receiver(post_save, sender=Listing)
+def reindex_listing_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and not LISTING_SEARCH_FIELDS.intersection(update_fields):
+        return
+    search.reindex_products([instance.product_id])
+
+
+@receiver(post_delete, sender=Listing)
+def reindex_listing_on_delete(sender, instance, **kwargs):
+    search.reindex_products([instance.product_id])
+
+
+@receiver(post_delete, sender=Product)
+def invalidate_autocomplete_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(autocomplete.bump_version)
+
+
+# ================ CACHE INVALIDATION ================
+
+# model → tag ของ cache ที่ต้องล้างเมื่อ model นั้นเปลี่ยน
+CACHE_TAGS = {
+    Product: (caching.TAG_PRODUCTS,),
+    Category: (caching.TAG_CATEGORIES,),
+    Issue: (caching.TAG_ISSUES,),
+    IssueLine: (caching.TAG_ISSUES,),
+    Festival: (caching.TAG_FESTIVALS,),
+    CustomEvent: (caching.TAG_EVENTS,),
+    Task: (caching.TAG_TASKS,),
+}
+
+
+def invalidate_cache(sender, **kwargs):
+    tags = CACHE_TAGS[sender]
+    transaction.on_commit(lambda: caching.invalidate(*tags))
+
+
+for model in CACHE_TAGS:
+    post_save.connect(invalidate_cache, sender=model, dispatch_uid=f'cache_save_{model.__name__}')
+    post_delete.connect(invalidate_cache, sender=model, dispatch_uid=f'cache_delete_{model.__name__}')
+
+
+# ================ THUMBNAILS ================
+
+def enqueue_thumbnails(sender, instance, update_fields=None, **kwargs):
+    for field, renditions_field in thumbnails.SOURCES[sender._meta.label_lower]:
+        if update_fields and field not in update_fields:
+            continue
+        if thumbnails.needs_render(instance, field, renditions_field):
+            transaction.on_commit(lambda f=field: thumbnails.enqueue(instance, f))
+
+
+for model in (Product, Listing, Task, get_user_model()):
+    post_save.connect(
+        enqueue_thumbnails, sender=model, dispatch_uid=f'thumbnails_{model.__name__}'
+    )
+
+
+# ================ AUDIT LOG ================
+
+for model in audit.TRACKED:
+    post_save.connect(audit.record_save, sender=model, dispatch_uid=f'audit_save_{model.__name__}')
+    post_delete.connect(audit.record_delete, sender=model, dispatch_uid=f'audit_delete_{model.__name__}')
@@ -0,0 +1,177 @@
+# inventory/stock.py
+# ปรับสต็อกแบบ atomic — แทนการอ่านค่า แก้ใน Python แล้ว save() ทับทั้งแถว
+#
+# - adjust(): UPDATE ... SET stock = stock + delta WHERE ... (เงื่อนไขสต็อกพอ / version ตรง)
+#   ใน statement เดียว → ไม่มี lost update แม้มีหลาย request พร้อมกัน
+# - set_count(): ตั้งค่าตามที่นับได้ (ล็อกแถวก่อนคำนวณ delta)
+# - adjust_many(): หลายรายการใน transaction เดียว ล็อกตามลำดับ id เหมือน issuing.py
+# ทุกครั้งบันทึก StockMovement และเพิ่ม Product.stock_version
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Product, StockMovement
+from . import caching
+
+
+class StockError(Exception):
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class StockConflict(StockError):
+    """stock_version ไม่ตรง → มีคนปรับสต็อกไปก่อนแล้ว"""
+
+    def __init__(self, detail, current_version):
+        super().__init__(detail, status_code=409)
+        self.current_version = current_version
+
+
+REASONS = {value for value, _ in StockMovement.REASON_CHOICES}
+
+
+def notify_changed():
+    # QuerySet.update() ไม่ยิง post_save → ล้าง cache เอง
+    # (autocomplete อ่าน stock สดตอนค้นอยู่แล้ว ไม่ต้อง build ดัชนีใหม่)
+    transaction.on_commit(lambda: caching.invalidate(caching.TAG_PRODUCTS))
+
+
+def _raise_for(product_id, delta, expected_version):
+    """UPDATE ไม่โดนแถวไหน → หาสาเหตุ"""
+    current = Product.objects.filter(pk=product_id, is_deleted=False).values(
+        'code', 'stock', 'stock_version'
+    ).first()
+    if current is None:
+        raise StockError(f"product {product_id} not found", status_code=404)
+    if expected_version is not None and current['stock_version'] != expected_version:
+        raise StockConflict(
+            f"product {current['code']} was changed by someone else", current['stock_version']
+        )
+    raise StockError(
+        f"stock not enough for product {current['code']} "
+        f"(have {current['stock']}, need {-delta})"
+    )
+
+
+def _apply(product_id, delta, user, reason, note, expected_version, allow_negative):
+    qs = Product.objects.filter(pk=product_id, is_deleted=False)
+    if expected_version is not None:
+        qs = qs.filter(stock_version=expected_version)
+    if delta < 0 and not allow_negative:
+        qs = qs.filter(stock__gte=-delta)
+    if not qs.update(stock=F('stock') + delta, stock_version=F('stock_version') + 1):
+        _raise_for(product_id, delta, expected_version)
+
+    # แถวถูกล็อกโดย UPDATE ข้างบนแล้ว → ค่าที่อ่านได้คือค่าของ transaction นี้
+    stock_after, version = Product.objects.filter(pk=product_id).values_list(
+        'stock', 'stock_version'
+    ).get()
+    return StockMovement.objects.create(
+        product_id=product_id, delta=delta, stock_after=stock_after,
+        stock_version=version, reason=reason, note=note[:255], created_by=user,
+    )
+
+
+def _check_reason(reason):
+    if reason not in REASONS:
+        raise StockError(f"reason must be one of {', '.join(sorted(REASONS))}")
+
+
+def adjust(product_id, delta, user=None, reason='adjust', note='',
+           expected_version=None, allow_negative=False):
+    """เพิ่ม / ลดสต็อกตาม delta (มีเครื่องหมาย) คืน StockMovement"""
+    delta = int(delta)
+    if delta == 0:
+        raise StockError("delta must not be 0")
+    _check_reason(reason)
+    with transaction.atomic():
+        movement = _apply(product_id, delta, user, reason, note, expected_version, allow_negative)
+        notify_changed()
+    return movement
+
+
+def set_count(product_id, counted, user=None, reason='count', note='', expected_version=None,
+              record_unchanged=True):
+    """
+    ตั้งสต็อกเป็นจำนวนที่นับได้ คืน StockMovement (delta อาจเป็น 0 = นับแล้วตรง)
+    record_unchanged=False → จำนวนตรงกับ stock ตอนล็อกแถว ไม่บันทึกอะไร คืน None
+    """
+    counted = int(counted)
+    if counted < 0:
+        raise StockError("count must not be negative")
+    _check_reason(reason)
+    with transaction.atomic():
+        current = Product.objects.select_for_update().filter(
+            pk=product_id, is_deleted=False
+        ).values_list('stock', flat=True).first()
+        if current is None:
+            raise StockError(f"product {product_id} not found", status_code=404)
+        if counted == current and not record_unchanged:
+            return None
+        movement = _apply(
+            product_id, counted - current, user, reason, note, expected_version,
+            allow_negative=False
+        )
+        notify_changed()
+    return movement
+
+
+def parse_adjustments(items):
+    """
+    [{'product': id, 'delta': n} หรือ {'product': id, 'count': n}, 'stock_version'?]
+    → [(product_id, kind, value, version)] ตามลำดับใน payload
+    """
+    if not isinstance(items, list) or not items:
+        raise StockError("items is required")
+    parsed = []
+    for index, it in enumerate(items):
+        try:
+            pid = int(it.get("product", 0) or 0)
+            if "count" in it:
+                kind, value = "count", int(it["count"])
+            else:
+                kind, value = "delta", int(it.get("delta", 0) or 0)
+            version = it.get("stock_version")
+            version = int(version) if version not in (None, "") else None
+        except (AttributeError, TypeError, ValueError):
+            raise StockError(f"items[{index}] is invalid")
+        if pid <= 0 or (kind == "delta" and value == 0) or (kind == "count" and value < 0):
+            raise StockError(f"items[{index}] is invalid")
+        parsed.append((pid, kind, value, version))
+    return parsed
+
+
+def adjust_many(items, user=None, reason='count', note='', record_unchanged=True):
+    """
+    ปรับหลายสินค้าใน request เดียว (เช่นผลตรวจนับ) — สำเร็จทั้งหมดหรือไม่เปลี่ยนเลย
+    คืน [StockMovement] ตามลำดับใน payload
+    record_unchanged=False → ข้ามรายการ count ที่ตรงกับ stock อยู่แล้ว (ไม่อยู่ในผลลัพธ์)
+    """
+    parsed = parse_adjustments(items)
+    _check_reason(reason)
+    with transaction.atomic():
+        # ล็อกทุกแถวในครั้งเดียว เรียงตาม id → ไม่ deadlock กับใบเบิก / batch อื่น
+        pids = sorted({pid for pid, _, _, _ in parsed})
+        stock = dict(
+            Product.objects.select_for_update().filter(
+                id__in=pids, is_deleted=False
+            ).order_by('id').values_list('id', 'stock')
+        )
+        for pid in pids:
+            if pid not in stock:
+                raise StockError(f"product {pid} not found", status_code=404)
+
+        movements = {}
+        order = sorted(range(len(parsed)), key=lambda i: parsed[i][0])
+        for i in order:
+            pid, kind, value, version = parsed[i]
+            delta = value - stock[pid] if kind == "count" else value
+            if delta == 0 and not record_unchanged:
+                continue
+            movement = _apply(pid, delta, user, reason, note, version, allow_negative=False)
+            stock[pid] = movement.stock_after
+            movements[i] = movement
+        notify_changed()
+    return [movements[i] for i in range(len(parsed)) if i in movements]
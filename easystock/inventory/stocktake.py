@@ -0,0 +1,205 @@
+# inventory/stocktake.py
+# ตรวจนับสต็อกทั้งคลัง (stocktake)
+#
+# - พนักงานหลายคนส่งจำนวนที่นับได้เป็นชุด (ตาม code) → upsert ลง StockCountLine ทีละ batch
+# - ผลต่าง (variance) คำนวณใน DB ด้วย query เดียว ไม่วนทีละสินค้า
+# - commit: ล็อกสินค้าตามลำดับ id แล้ว bulk_update stock + bulk_create StockMovement
+#   ใน transaction เดียว — ไม่มี save() / signal / แจ้งเตือน LINE ทีละตัว
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum, Count
+from django.utils import timezone
+
+from .models import Product, StockCount, StockCountLine, StockMovement
+from . import audit
+from .stock import StockError, notify_changed
+
+# ขนาด IN (...) / bulk ต่อครั้ง
+CHUNK = 1000
+MODES = ('set', 'add')
+
+
+def _chunks(values, size=CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _lock_open(stock_count):
+    """ล็อกรอบนับ → batch ของรอบเดียวกันทำทีละชุด และ commit ไม่ชนกับการนับ"""
+    locked = StockCount.objects.select_for_update().get(pk=stock_count.pk)
+    if locked.status != 'open':
+        raise StockError(f"stock count is {locked.status}", status_code=409)
+    return locked
+
+
+def parse_counts(items, mode='set'):
+    """[{'code', 'qty'}] → {code: qty} (code ซ้ำ: set = ค่าล่าสุด, add = รวมกัน)"""
+    if mode not in MODES:
+        raise StockError(f"mode must be one of {', '.join(MODES)}")
+    if not isinstance(items, list) or not items:
+        raise StockError("items is required")
+    counts = {}
+    for index, it in enumerate(items):
+        try:
+            code = str(it.get("code", "")).strip()
+            qty = int(it.get("qty"))
+        except (AttributeError, TypeError, ValueError):
+            raise StockError(f"items[{index}] is invalid")
+        if not code or qty < 0:
+            raise StockError(f"items[{index}] is invalid")
+        counts[code] = counts.get(code, 0) + qty if mode == 'add' else qty
+    return counts
+
+
+def record_counts(stock_count, items, user=None, mode='set'):
+    """
+    บันทึกจำนวนที่นับได้ 1 batch
+    mode='set' → แทนค่าเดิม, mode='add' → บวกเพิ่ม (สแกนทีละชิ้น / นับหลายจุด)
+    คืน (จำนวนรายการที่บันทึก, [code ที่ไม่พบ])
+    """
+    counts = parse_counts(items, mode)
+    with transaction.atomic():
+        stock_count = _lock_open(stock_count)
+
+        ids = {}
+        for chunk in _chunks(list(counts)):
+            ids.update(
+                Product.objects.filter(code__in=chunk, is_deleted=False).values_list('code', 'id')
+            )
+        unknown = sorted(set(counts) - set(ids))
+
+        if mode == 'add':
+            existing = {}
+            for chunk in _chunks(list(ids.values())):
+                existing.update(StockCountLine.objects.filter(
+                    stock_count=stock_count, product_id__in=chunk
+                ).values_list('product_id', 'counted'))
+            counted = {code: existing.get(pid, 0) + counts[code] for code, pid in ids.items()}
+        else:
+            counted = {code: counts[code] for code in ids}
+
+        lines = [
+            StockCountLine(
+                stock_count=stock_count, product_id=pid,
+                counted=counted[code], counted_by=user,
+            )
+            for code, pid in ids.items()
+        ]
+        # MySQL (ON DUPLICATE KEY UPDATE) ระบุ unique_fields ไม่ได้
+        unique_fields = (
+            ['stock_count', 'product']
+            if connection.features.supports_update_conflicts_with_target else None
+        )
+        StockCountLine.objects.bulk_create(
+            lines, batch_size=CHUNK, update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['counted', 'counted_by', 'updated_at'],
+        )
+    return len(lines), unknown
+
+
+def variance_lines(stock_count):
+    """
+    รายการพร้อมผลต่าง: system = สต็อกในระบบ (ตอนนี้ หรือ ตอน commit), variance = counted - system
+    """
+    system = F('expected') if stock_count.status == 'committed' else F('product__stock')
+    return StockCountLine.objects.filter(stock_count=stock_count).annotate(
+        system=system, variance=F('counted') - system
+    )
+
+
+def summarize(stock_count):
+    lines = variance_lines(stock_count)
+    totals = lines.aggregate(
+        lines=Count('id'),
+        mismatched=Count('id', filter=~Q(variance=0)),
+        over=Sum('variance', filter=Q(variance__gt=0)),
+        short=Sum('variance', filter=Q(variance__lt=0)),
+    )
+    totals['over'] = totals['over'] or 0
+    totals['short'] = totals['short'] or 0
+    return totals
+
+
+def commit(stock_count, user=None):
+    """
+    ปรับสต็อกตามที่นับได้ทั้งรอบใน transaction เดียว
+    สต็อกใหม่ = counted (ผลต่างคิดจากสต็อกที่ล็อกไว้ตอน commit)
+    """
+    with transaction.atomic():
+        stock_count = _lock_open(stock_count)
+        lines = sorted(
+            StockCountLine.objects.filter(stock_count=stock_count).values_list(
+                'id', 'product_id', 'counted'
+            ),
+            key=lambda line: line[1]
+        )
+
+        # ล็อกสินค้าตามลำดับ id (เหมือน issuing / stock.adjust_many) → ไม่ deadlock
+        products = {}
+        for chunk in _chunks([pid for _, pid, _ in lines]):
+            products.update(
+                (p.id, p) for p in Product.objects.select_for_update().filter(
+                    id__in=chunk, is_deleted=False
+                ).order_by('id').only('id', 'stock', 'stock_version')
+            )
+
+        changed, movements, snapshots, audit_rows = [], [], [], []
+        increased = decreased = 0
+        note = f"stocktake #{stock_count.pk}: {stock_count.name}"[:255]
+        for line_id, pid, counted in lines:
+            p = products.get(pid)
+            if p is None:
+                continue  # ถูกลบระหว่างนับ
+            snapshots.append(StockCountLine(id=line_id, expected=p.stock))
+            delta = counted - p.stock
+            if delta == 0:
+                continue
+            if delta > 0:
+                increased += delta
+            else:
+                decreased -= delta
+            audit_rows.append((p, 'update', {'stock': [p.stock, counted]}))
+            p.stock = counted
+            p.stock_version += 1
+            changed.append(p)
+            movements.append(StockMovement(
+                product_id=pid, delta=delta, stock_after=counted,
+                stock_version=p.stock_version, reason='count', note=note,
+                created_by=user,
+            ))
+
+        Product.objects.bulk_update(changed, ['stock', 'stock_version'], batch_size=CHUNK)
+        StockMovement.objects.bulk_create(movements, batch_size=CHUNK)
+        StockCountLine.objects.bulk_update(snapshots, ['expected'], batch_size=CHUNK)
+        # bulk_update ไม่ยิง signal → บันทึก AuditLog ของทั้งรอบใน on_commit เดียว
+        audit.record_many(audit_rows, user=user)
+
+        stock_count.status = 'committed'
+        stock_count.committed_by = user
+        stock_count.committed_at = timezone.now()
+        stock_count.save(update_fields=['status', 'committed_by', 'committed_at'])
+
+        # งานตรวจสต็อกที่ผูกไว้ → เสร็จ
+        task = stock_count.task
+        if task is not None and task.status != 'completed':
+            task.status = 'completed'
+            task.save()
+
+        if changed:
+            notify_changed()
+
+    return {
+        'lines': len(snapshots),
+        'adjusted': len(changed),
+        'increased': increased,
+        'decreased': decreased,
+    }
+
+
+def cancel(stock_count):
+    with transaction.atomic():
+        stock_count = _lock_open(stock_count)
+        stock_count.status = 'cancelled'
+        stock_count.save(update_fields=['status'])
+    return stock_count
@@ -1,3 +1,1722 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import importlib
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIRequest
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import async_to_sync
+from PIL import Image
+from rest_framework.test import APIClient
+
+from accounts.models import NotificationSettings
+from myapp import db_pool
+from myapp.db_pool import ConnectionPool, PoolExhausted
+from myapp.db_router import ReplicaRouter, ReplicaStickinessMiddleware, reading_from_replica
+
+from . import (
+    archive, assignment, audit, autocomplete, benchmarks, caching, forecasting, issuing, parallel,
+    recurrence, reminders, replenishment, thumbnails,
+)
+from .models import (
+    Product, Category, Issue, IssueLine, ArchivedIssueLine, IssueRollup, IssueArchivePeriod,
+    StockMovement, StockCount, StockCountLine, Task, ImageJob, Festival, DemandForecast,
+    CustomEvent, AuditLog, TaskReminder, ChangeCounter, Listing, ProductSearchToken
+)
+from .importers import ProductImporter, read_rows
+from .middleware import RequestRoutingMiddleware
+from .movements import InvalidCursor, movement_feed
+
+
+class ProductImportTests(TestCase):
+    """นำเข้าสินค้าจาก CSV / XLSX"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user('import-admin', password='x', role='admin')
+
+    def run_import(self, text, **kwargs):
+        rows = read_rows(BytesIO(text.encode('utf-8')), 'products.csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImporter(user=self.admin, **kwargs).run(rows)
+
+    def test_upsert_by_code_with_row_errors(self):
+        Product.objects.create(code='IM100', name='ของเดิม', selling_price=10)
+        # สินค้าที่ลบแล้วใช้ code ซ้ำได้ → สร้างใหม่ ไม่แก้แถวที่ลบ
+        Product.objects.create(code='IM103', name='ลบแล้ว', is_deleted=True)
+        upload = SimpleUploadedFile('products.csv', (
+            'รหัส,ชื่อ,ราคา,หมวดหมู่\n'
+            'IM100,ของเดิม (ใหม่),12.5,เครื่องดื่ม\n'
+            'IM101,น้ำแข็ง,abc,\n'
+            'IM102,,5,\n'
+            'IM103,สินค้าใหม่,7,เครื่องดื่ม\n'
+            '\n'
+            'IM100,ซ้ำในไฟล์,1,\n'
+        ).encode('utf-8'), content_type='text/csv')
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/products/import/', {'file': upload, 'batch_size': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['created'], data['updated'], data['failed']), (1, 1, 3))
+        self.assertEqual([(e['row'], e['code']) for e in data['errors']], [
+            (3, 'IM101'), (4, 'IM102'), (7, 'IM100'),
+        ])
+        self.assertIn('invalid selling_price: abc', data['errors'][0]['errors'])
+        self.assertIn('duplicate code in file (first seen at row 2)', data['errors'][2]['errors'])
+
+        updated = Product.objects.get(code='IM100')
+        self.assertEqual((updated.name, updated.selling_price, updated.category.name),
+                         ('ของเดิม (ใหม่)', Decimal('12.50'), 'เครื่องดื่ม'))
+        self.assertEqual(Product.objects.filter(code='IM103').count(), 2)
+        self.assertFalse(Product.objects.filter(code__in=['IM101', 'IM102']).exists())
+
+    def test_dry_run_reports_without_writing(self):
+        summary = self.run_import('code,name\nIM200,ทดลอง\n', dry_run=True)
+        self.assertEqual((summary['dry_run'], summary['created']), (True, 1))
+        self.assertFalse(Product.objects.filter(code='IM200').exists())
+
+    def test_stock_of_existing_products_goes_through_ledger(self):
+        water = Product.objects.create(code='IM001', name='น้ำดื่ม', stock=10, initial_stock=10)
+        Product.objects.create(code='IM002', name='ข้าวสาร', stock=4, initial_stock=4)
+
+        summary = self.run_import('code,name,stock\nIM001,น้ำดื่ม,15\nIM002,ข้าวสาร 5 กก.,4\n')
+        self.assertEqual((summary['updated'], summary['failed']), (2, 0))
+
+        water.refresh_from_db()
+        self.assertEqual((water.stock, water.stock_version), (15, 1))
+        # จำนวนเท่าเดิม → ไม่มี movement / version ไม่เปลี่ยน
+        self.assertEqual(
+            list(StockMovement.objects.values_list('product__code', 'delta', 'stock_after', 'reason')),
+            [('IM001', 5, 15, 'count')]
+        )
+        self.assertEqual(
+            Product.objects.filter(code='IM002').values_list('name', 'stock_version').get(),
+            ('ข้าวสาร 5 กก.', 0)
+        )
+
+
+class ProductSearchTests(TestCase):
+    """ค้นหาสินค้าด้วยดัชนี n-gram (ภาษาไทยไม่มีช่องว่างระหว่างคำ)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('search-user', password='x')
+        for code, name in (
+            ('SK01', 'ขนมปังกรอบ'),
+            ('SK010', 'ขนมปังกรอบ แพ็คใหญ่'),
+            ('TH01', 'ขนม sk01 รสเดิม'),
+            ('TH02', 'น้ำปลาแท้'),
+            ('TH03', 'ปลากระป๋อง'),
+            ('TH04', 'ปลั๊กไฟ'),
+            ('TH05', 'น้ำตาลทราย'),
+        ):
+            Product.objects.create(code=code, name=name, stock=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def codes(self, q):
+        return [p['code'] for p in self.client.get('/api/products/', {'search': q}).json()]
+
+    def test_code_match_ranks_before_name_match(self):
+        # ตรงทั้งรหัส > ขึ้นต้นด้วยรหัส > เจอในชื่อ
+        self.assertEqual(self.codes('sk01'), ['SK01', 'SK010', 'TH01'])
+
+    def test_thai_substring_without_word_breaks(self):
+        # ต้องเจอ n-gram ครบทุกตัว: "ปลั๊กไฟ" มี "ปล" แต่ไม่มี "ลา"
+        self.assertEqual(sorted(self.codes('ปลา')), ['TH02', 'TH03'])
+        self.assertEqual(self.codes('น้ำตาล'), ['TH05'])
+        # สั้นกว่า n-gram → icontains แบบเดิม
+        self.assertEqual(self.codes('ไ'), ['TH04'])
+
+    def test_rename_reindexes_product(self):
+        product = Product.objects.get(code='TH05')
+        product.name = 'เกลือป่น'
+        product.save()
+        self.assertEqual(self.codes('น้ำตาล'), [])
+        self.assertEqual(self.codes('เกลือ'), ['TH05'])
+
+
+class CacheInvalidationTests(TestCase):
+    """cache ของ endpoint อ่านบ่อย ถูกล้างตาม tag เมื่อข้อมูลเปลี่ยน"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user('cache-admin', password='x', role='admin')
+        cls.category = Category.objects.create(name='เครื่องดื่ม')
+        cls.product = Product.objects.create(code='C001', name='น้ำดื่ม', stock=3, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+        caching._shared_seen.clear()
+        caching.reset_stats()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def breakdown(self):
+        rows = self.client.get('/api/admin-dashboard/category_breakdown/').json()['categories']
+        return {r['name']: (r['product_count'], r['total_stock']) for r in rows}
+
+    def stats(self):
+        entry = caching.get_stats()['endpoints']['category_breakdown']
+        return entry['hits'], entry['misses']
+
+    def test_hit_until_write_invalidates_tag(self):
+        self.assertEqual(self.breakdown(), {'เครื่องดื่ม': (1, 3)})
+        self.assertEqual(self.breakdown(), {'เครื่องดื่ม': (1, 3)})
+        self.assertEqual(self.stats(), (1, 1))
+
+        # save() → signal ล้าง tag products หลัง commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(code='C002', name='โซดา', stock=2, category=self.category)
+        self.assertEqual(self.breakdown(), {'เครื่องดื่ม': (2, 5)})
+        self.assertEqual(self.stats(), (1, 2))
+
+        # QuerySet.update ใน stock.adjust ไม่ยิง signal → ล้างเองใน notify_changed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.adjust_stock(4, user=self.admin)
+        self.assertEqual(self.breakdown(), {'เครื่องดื่ม': (2, 9)})
+
+    def test_unrelated_tag_keeps_entry(self):
+        self.breakdown()
+        caching.invalidate(caching.TAG_TASKS)
+        self.breakdown()
+        self.assertEqual(self.stats(), (1, 1))
+
+    def test_write_in_other_worker_invalidates_local_cache(self):
+        self.breakdown()
+        # worker อื่นล้าง tag: cache locmem ของ process นี้ไม่รู้ มีแค่ ChangeCounter ที่เปลี่ยน
+        ChangeCounter.objects.update_or_create(name=caching.TAG_PRODUCTS, defaults={'version': 100})
+        with override_settings(SHARED_VERSION_CHECK_SECONDS=0):
+            self.breakdown()
+        self.assertEqual(self.stats(), (0, 2))
+
+
+# ใช้ alias 'default' แทน replica → router คืน 'default' เมื่ออ่านจาก replica, None เมื่ออ่านจาก primary
+@override_settings(REPLICA_DATABASE_ALIAS='default')
+class ReplicaRouterTests(TestCase):
+    """อ่าน report จาก replica แต่ user ที่เพิ่งเขียนข้อมูลอ่านจาก primary"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('replica-user', password='x')
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def request(self):
+        request = self.factory.post('/api/products/')
+        request.user = self.user
+        return request
+
+    def read_db(self):
+        with reading_from_replica(self.user):
+            return self.router.db_for_read(Product)
+
+    def test_reads_use_replica_only_inside_block(self):
+        self.assertEqual(self.read_db(), 'default')
+        self.assertIsNone(self.router.db_for_read(Product))
+        self.assertIsNone(self.router.db_for_write(Product))
+
+    def test_write_pins_reads_to_primary(self):
+        def view(request):
+            # report ที่อ่านหลังเขียนใน request เดียวกันต้องเห็นข้อมูลที่เพิ่งเขียน
+            self.router.db_for_write(Product)
+            with reading_from_replica(request.user):
+                return HttpResponse(self.router.db_for_read(Product) or 'primary')
+
+        response = ReplicaStickinessMiddleware(view)(self.request())
+        self.assertEqual(response.content, b'primary')
+        # request ถัดไป (ภายใน REPLICA_STICKY_SECONDS) ก็ยังอ่านจาก primary
+        self.assertIsNone(self.read_db())
+
+    def test_sticky_flag_is_shared_through_database(self):
+        def view(request):
+            self.router.db_for_write(Product)
+            return HttpResponse()
+
+        ReplicaStickinessMiddleware(view)(self.request())
+        # worker อื่นไม่มี cache ร่วม → ต้องเห็นจากแถวใน DB
+        self.assertTrue(ChangeCounter.objects.filter(name=f'db:sticky:{self.user.pk}').exists())
+        cache.clear()
+        self.assertIsNone(self.read_db())
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.assertEqual(self.read_db(), 'default')
+
+    def test_non_inventory_write_is_not_sticky(self):
+        def view(request):
+            self.router.db_for_write(get_user_model())
+            return HttpResponse()
+
+        ReplicaStickinessMiddleware(view)(self.request())
+        self.assertEqual(self.read_db(), 'default')
+
+    def test_async_middleware_remembers_write(self):
+        async def view(request):
+            self.router.db_for_write(Product)
+            return HttpResponse()
+
+        middleware = ReplicaStickinessMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        # async_to_sync → sync_to_async ภายใน middleware กลับมารันบน thread นี้ (ใช้ connection ของ test)
+        async_to_sync(middleware)(self.request())
+        self.assertIsNone(self.read_db())
+
+
+class _FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """myapp/db_pool: ยืม / คืน connection, pool เต็ม, recycle ตามอายุ"""
+
+    def setUp(self):
+        self.clock = [1000.0]
+        patcher = mock.patch('myapp.db_pool.time.monotonic', lambda: self.clock[0])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.opened = []
+
+    def connect(self):
+        conn = _FakeConnection(len(self.opened))
+        self.opened.append(conn)
+        return conn
+
+    def test_pool_is_per_database_not_per_alias(self):
+        patcher = mock.patch.dict(db_pool._pools, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        settings_dict = {'NAME': 'easystock', 'HOST': 'db1', 'PORT': 3306, 'USER': 'app'}
+        pool = db_pool.get_pool('pool-test', settings_dict)
+        self.assertIs(db_pool.get_pool('pool-test', dict(settings_dict)), pool)
+        # alias เดิมแต่ชี้ฐานข้อมูลอื่น → ต้องไม่ได้ connection ของฐานข้อมูลเดิม
+        self.assertIsNot(db_pool.get_pool('pool-test', {**settings_dict, 'NAME': 'test_easystock'}), pool)
+        self.assertIsNot(db_pool.get_pool('pool-test', {**settings_dict, 'HOST': 'db2'}), pool)
+        self.assertEqual(len(db_pool.all_stats()), 3)
+
+    def test_checkin_rolls_back_and_reuses(self):
+        pool = ConnectionPool('test', max_size=2, health_check_after=None)
+        first = pool.checkout(self.connect)
+        pool.checkin(first)
+        self.assertEqual(first.rollbacks, 1)
+        self.assertIs(pool.checkout(self.connect), first)
+        self.assertEqual(len(self.opened), 1)
+        stats = pool.stats()
+        self.assertEqual((stats['checkouts'], stats['created'], stats['in_use']), (2, 1, 1))
+        self.assertEqual(stats['reuse_ratio'], 0.5)
+
+    def test_exhausted_pool_raises_after_timeout(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0, health_check_after=None)
+        pool.checkout(self.connect)
+        with self.assertRaises(PoolExhausted):
+            pool.checkout(self.connect)
+        self.assertEqual((pool.stats()['waits'], pool.stats()['exhausted']), (1, 1))
+
+    def test_expired_connection_is_recycled(self):
+        pool = ConnectionPool('test', max_size=1, max_lifetime=60, health_check_after=None)
+        old = pool.checkout(self.connect)
+        pool.checkin(old)
+        self.clock[0] += 61
+        fresh = pool.checkout(self.connect)
+        self.assertIsNot(fresh, old)
+        self.assertTrue(old.closed)
+        self.assertEqual((pool.stats()['recycled'], pool.stats()['size']), (1, 1))
+
+    def test_foreign_connection_is_closed_not_pooled(self):
+        pool = ConnectionPool('test', max_size=1, health_check_after=None)
+        stranger = _FakeConnection(-1)
+        pool.checkin(stranger)
+        self.assertTrue(stranger.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+
+class RunQueriesTests(SimpleTestCase):
+    """inventory/parallel.run_queries: WSGI ทีละตัว, ASGI พร้อมกัน"""
+
+    def test_wsgi_request_runs_sequentially_in_caller_thread(self):
+        request = RequestFactory().get('/api/dashboard/overview/')
+        self.assertFalse(parallel.is_asgi_request(request))
+        order = []
+        results = parallel.run_queries(request, {
+            'a': lambda: order.append('a') or threading.get_ident(),
+            'b': lambda: order.append('b') or threading.get_ident(),
+        })
+        self.assertEqual(order, ['a', 'b'])
+        self.assertEqual(set(results.values()), {threading.get_ident()})
+
+    def test_asgi_request_runs_parts_concurrently(self):
+        request = ASGIRequest(
+            {'type': 'http', 'method': 'GET', 'path': '/api/dashboard/overview/', 'headers': []},
+            BytesIO(),
+        )
+        self.assertTrue(parallel.is_asgi_request(request))
+        # ทั้งสองส่วนต้องมาถึง barrier พร้อมกัน ถ้ารันทีละตัวจะ timeout
+        barrier = threading.Barrier(2, timeout=5)
+
+        def part(value):
+            def run():
+                barrier.wait()
+                return value
+            return run
+
+        with override_settings(DASHBOARD_MAX_PARALLEL_QUERIES=2):
+            results = parallel.run_queries(request, {'first': part(1), 'second': part(2)})
+        self.assertEqual(list(results.items()), [('first', 1), ('second', 2)])
+
+
+class MovementFeedTests(TestCase):
+    """feed เบิกออก + รับเข้า: โหลดทีละหน้าด้วย cursor ไม่ข้าม ไม่ซ้ำ แม้เวลาเท่ากัน"""
+
+    @classmethod
+    def setUpTestData(cls):
+        tz = timezone.get_current_timezone()
+        t0 = timezone.make_aware(datetime(2026, 5, 1, 9), tz)
+        t1 = timezone.make_aware(datetime(2026, 5, 1, 10), tz)
+        products = [
+            Product.objects.create(code=f'MF{i}', name=f'สินค้า {i}', stock=10, initial_stock=10)
+            for i in range(4)
+        ]
+        # รับเข้าเวลาเดียวกับการเบิก → ต้องตัดสินด้วย kind / id
+        Product.objects.filter(pk__in=[p.pk for p in products[:2]]).update(created_at=t1)
+        Product.objects.filter(pk__in=[p.pk for p in products[2:]]).update(created_at=t0)
+        issue = Issue.objects.create(status='completed')
+        for product in products:
+            IssueLine.objects.create(issue=issue, product=product, qty=1, created_at=t1)
+        ArchivedIssueLine.objects.bulk_create([
+            ArchivedIssueLine(
+                id=10_000 + i, issue_id=0, issue_status='completed',
+                product=products[i], qty=2, created_at=t0,
+            ) for i in range(3)
+        ])
+        cls.t0, cls.t1 = t0, t1
+
+    def test_pages_cover_feed_without_gaps_or_duplicates(self):
+        everything, last_cursor = movement_feed(limit=100)
+        self.assertIsNone(last_cursor)
+        self.assertEqual(len(everything), 4 + 4 + 3)
+        self.assertEqual([m['type'] for m in everything[:6]], ['out'] * 4 + ['in'] * 2)
+
+        for size in (1, 2, 3, 5):
+            paged, cursor = [], None
+            while True:
+                page, cursor = movement_feed(limit=size, cursor=cursor)
+                self.assertLessEqual(len(page), size)
+                paged.extend(page)
+                if cursor is None:
+                    break
+            self.assertEqual([m['id'] for m in paged], [m['id'] for m in everything])
+
+    def test_range_and_invalid_cursor(self):
+        movements, _ = movement_feed(start=self.t1, end=self.t1, limit=100)
+        self.assertEqual(len(movements), 6)
+        with self.assertRaises(InvalidCursor):
+            movement_feed(cursor='not-a-cursor')
+
+
+class IssueLineTimestampTests(TestCase):
+    """IssueLine.created_at / created_by คัดลอกจาก Issue ตอนบันทึก"""
+
+    def test_save_copies_issue_timestamp_and_author(self):
+        user = get_user_model().objects.create_user('line-user', password='x')
+        product = Product.objects.create(code='IL01', name='สินค้า', stock=5)
+        issue = Issue.objects.create(created_by=user)
+        line = IssueLine.objects.create(issue=issue, product=product, qty=1)
+        self.assertEqual((line.created_at, line.created_by_id), (issue.created_at, user.pk))
+
+        # ระบุเวลาเองได้ (ใช้ตอนย้ายข้อมูล / archive)
+        when = issue.created_at - timedelta(days=1)
+        other = IssueLine.objects.create(issue=issue, product=product, qty=1, created_at=when)
+        self.assertEqual(other.created_at, when)
+
+
+class IssueLineBackfillMigrationTests(TransactionTestCase):
+    """0030: เติม created_at / created_by ของ IssueLine เดิมจาก Issue (ทีละช่วง id)"""
+
+    def setUp(self):
+        # จำลองตารางช่วงก่อน backfill: created_at ยังเป็น NULL ได้
+        field = IssueLine._meta.get_field('created_at')
+        nullable = field.clone()
+        nullable.set_attributes_from_name('created_at')
+        nullable.null = True
+        with connection.schema_editor() as editor:
+            editor.alter_field(IssueLine, field, nullable)
+        self.addCleanup(self.restore, field, nullable)
+
+    def restore(self, field, nullable):
+        IssueLine.objects.all().delete()
+        with connection.schema_editor() as editor:
+            editor.alter_field(IssueLine, nullable, field)
+
+    def test_backfill_copies_from_issue(self):
+        migration = importlib.import_module('inventory.migrations.0030_issueline_created_at')
+        user = get_user_model().objects.create_user('backfill-user', password='x')
+        product = Product.objects.create(code='BF01', name='สินค้า')
+        issues = [Issue.objects.create(created_by=user if i else None) for i in range(3)]
+        lines = [
+            IssueLine.objects.create(issue=issue, product=product, qty=1, created_at=issue.created_at)
+            for issue in issues
+        ]
+        IssueLine.objects.update(created_at=None, created_by=None)
+
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.backfill_created(django_apps, None)
+        self.assertEqual(
+            list(IssueLine.objects.order_by('id').values_list('id', 'created_at', 'created_by')),
+            [(line.id, issue.created_at, issue.created_by_id) for line, issue in zip(lines, issues)]
+        )
+
+
+class SyntheticBenchmarkTests(TestCase):
+    """generate_synthetic_data + ชุด benchmark บนข้อมูลขนาดเล็ก"""
+
+    def generate(self, *extra):
+        call_command(
+            'generate_synthetic_data', '--products', '30', '--issue-lines', '60', '--users', '4',
+            '--tasks', '5', '--festivals', '3', '--categories', '2', '--days', '10',
+            '--batch-size', '20', *extra, stdout=StringIO(),
+        )
+
+    def test_generator_is_repeatable_with_clear(self):
+        self.generate()
+        counts = (Product.objects.count(), IssueLine.objects.count(), Task.objects.count())
+        self.assertEqual(counts, (30, 60, 5))
+        # created_at ของรายการเบิกต้องตรงกับใบเบิก (report กรองจาก IssueLine อย่างเดียว)
+        self.assertFalse(IssueLine.objects.exclude(created_at=F('issue__created_at')).exists())
+
+        Listing.objects.create(product=Product.objects.first(), title='SYN listing')
+        self.generate('--clear')
+        self.assertEqual((Product.objects.count(), IssueLine.objects.count(), Task.objects.count()), counts)
+        # ลบตรงด้วย SQL → แถวที่อ้างอิงสินค้าเก่าต้องหายไปด้วย ดัชนีค้นหาสร้างใหม่จากสินค้าชุดใหม่
+        self.assertFalse(Listing.objects.exists())
+        self.assertFalse(ProductSearchToken.objects.exclude(product__in=Product.objects.all()).exists())
+        self.assertTrue(ProductSearchToken.objects.exists())
+
+    def test_suite_runs_and_flags_regressions(self):
+        self.generate()
+        stock_before = dict(Product.objects.values_list('id', 'stock'))
+        cache.set('bench-untouched', 1)
+        results = benchmarks.run_suite(
+            iterations=2, warmup=0, only=['issue_products', 'product_search', 'movement_history'],
+        )
+        self.assertEqual(sorted(results), ['issue_products', 'movement_history', 'product_search'])
+        self.assertEqual({r['status'] for r in results.values()}, {200, 201})
+        # scenario ที่เขียนข้อมูล rollback ทุกรอบ
+        self.assertEqual(dict(Product.objects.values_list('id', 'stock')), stock_before)
+        # วัดแบบ cold ด้วย caching.bypass() ไม่ใช่ cache.clear()
+        self.assertEqual(cache.get('bench-untouched'), 1)
+
+        baseline = {'product_search': {'p95_ms': 1.0}, 'movement_history': {'p95_ms': 10_000.0}}
+        current = {'product_search': {'p95_ms': 1.5}, 'movement_history': {'p95_ms': 5.0}}
+        self.assertEqual(
+            [(name, regressed) for name, _, _, _, regressed in benchmarks.compare(current, baseline)],
+            [('product_search', True), ('movement_history', False)]
+        )
+
+
+class IssueProductsTests(TestCase):
+    """เบิกสินค้า: ทั้งใบสำเร็จหรือ rollback ทั้งใบ, ลองใหม่เมื่อ deadlock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('issue-user', password='x')
+        cls.a = Product.objects.create(code='IS01', name='สินค้า A', stock=10)
+        cls.b = Product.objects.create(code='IS02', name='สินค้า B', stock=1)
+
+    def setUp(self):
+        issuing.reset_stats()
+
+    def test_error_mid_issue_rolls_back_earlier_lines(self):
+        # A (id น้อยกว่า) ถูกหักก่อน แล้ว B สต็อกไม่พอ → ต้องคืนสต็อก A ด้วย
+        with self.assertRaises(issuing.IssueError):
+            issuing.issue_products(self.user, [
+                {'product': self.b.id, 'qty': 5}, {'product': self.a.id, 'qty': 3},
+            ])
+        self.assertEqual(
+            dict(Product.objects.values_list('code', 'stock')), {'IS01': 10, 'IS02': 1}
+        )
+        self.assertEqual(Product.objects.get(pk=self.a.pk).stock_version, 0)
+        self.assertFalse(Issue.objects.exists())
+        self.assertFalse(IssueLine.objects.exists())
+        self.assertFalse(Listing.objects.exists())
+        self.assertEqual(issuing.get_stats()['failed'], 1)
+
+        with self.assertRaises(issuing.IssueError) as missing:
+            issuing.issue_products(self.user, [{'product': self.a.id, 'qty': 1}, {'product': 999999, 'qty': 1}])
+        self.assertEqual(missing.exception.status_code, 404)
+        self.assertEqual(Product.objects.get(pk=self.a.pk).stock, 10)
+
+    def test_success_returns_payload_order(self):
+        issue, lines = issuing.issue_products(self.user, [
+            {'product': self.b.id, 'qty': 1}, {'product': self.a.id, 'qty': 4},
+        ])
+        self.assertEqual([(p.code, p.stock, qty) for p, qty in lines], [('IS02', 0, 1), ('IS01', 6, 4)])
+        self.assertEqual(issue.lines.count(), 2)
+        self.assertEqual(Listing.objects.get(product=self.a).quantity, 4)
+
+    def test_deadlock_is_retried_outside_transaction(self):
+        result = (mock.sentinel.issue, [])
+        deadlock = OperationalError(1213, 'Deadlock found when trying to get lock')
+        with mock.patch.object(issuing, 'connection', mock.Mock(in_atomic_block=False)), \
+                mock.patch.object(issuing, '_issue_once', side_effect=[deadlock, result]), \
+                mock.patch.object(issuing.time, 'sleep'):
+            self.assertEqual(issuing.issue_products(self.user, []), result)
+        stats = issuing.get_stats()
+        self.assertEqual((stats['deadlocks'], stats['retries'], stats['issues']), (1, 1, 1))
+
+        # อยู่ใน transaction ของผู้เรียก → ไม่ลองใหม่เอง
+        with mock.patch.object(issuing, '_issue_once', side_effect=deadlock):
+            with self.assertRaises(OperationalError):
+                issuing.issue_products(self.user, [])
+
+
+class AutocompleteTests(TestCase):
+    """autocomplete: build ใหม่เมื่อรหัส/ชื่อเปลี่ยน (ทุก worker) แต่ stock อ่านสดโดยไม่ build ใหม่"""
+
+    def setUp(self):
+        # ดัชนี / counter ที่จำไว้ของ test ก่อนหน้า (counter ใน DB ถูก rollback ไปแล้ว)
+        autocomplete._index = None
+        caching._shared_seen.clear()
+        self.product = Product.objects.create(code='AC001', name='น้ำปลา ตราปลาหมึก', stock=5)
+        Product.objects.create(code='AC002', name='น้ำตาลทราย', stock=0)
+
+    def names(self, q, **kwargs):
+        return [r['name'] for r in autocomplete.search(q, **kwargs)]
+
+    def test_rename_rebuilds_and_stock_is_live(self):
+        self.assertEqual(self.names('น้ำ', min_stock=1), ['น้ำปลา ตราปลาหมึก'])
+        self.assertEqual(self.names('น้ำ'), ['น้ำตาลทราย', 'น้ำปลา ตราปลาหมึก'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'ซีอิ๊วขาว'
+            self.product.save()
+        self.assertEqual(self.names('ซีอิ๊'), ['ซีอิ๊วขาว'])
+        self.assertEqual(self.names('ตราปลา'), [])
+
+        # stock อย่างเดียว → ไม่ build ดัชนีใหม่ แต่ผลค้นเห็น stock ล่าสุด
+        version = autocomplete.get_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(code='AC002').update(stock=7)
+            self.product.stock = 9
+            self.product.save(update_fields=['stock'])
+        self.assertEqual(autocomplete.get_version(), version)
+        results = autocomplete.search('AC', min_stock=1)
+        self.assertEqual({r['code']: r['stock'] for r in results}, {'AC001': 9, 'AC002': 7})
+
+    @override_settings(SHARED_VERSION_CHECK_SECONDS=0)
+    def test_change_from_other_worker_rebuilds(self):
+        autocomplete.search('AC')
+        # อีก worker แก้ชื่อ + เพิ่ม counter ในฐานข้อมูล (process นี้ไม่ได้รับ signal)
+        Product.objects.filter(pk=self.product.pk).update(name='พริกไทย')
+        ChangeCounter.objects.update_or_create(
+            name=autocomplete.VERSION_NAME, defaults={'version': autocomplete.get_version() + 1}
+        )
+        self.assertEqual(self.names('พริก'), ['พริกไทย'])
+
+
+class IssueArchiveTests(TestCase):
+    """archive ประวัติการเบิกบนข้อมูลสังเคราะห์ 3 ปี"""
+
+    TODAY = date(2026, 6, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_user('archive-admin', password='x', role='admin')
+        cls.products = [
+            Product.objects.create(code=f'A{i:03d}', name=f'สินค้า {i}', stock=1000, initial_stock=1000)
+            for i in range(8)
+        ]
+
+        rng = random.Random(35)
+        tz = timezone.get_current_timezone()
+        start = date(2023, 7, 1)
+        lines = []
+        day = start
+        while day <= cls.TODAY:
+            # ใบเบิก 1 ใบทุก 3 วัน รายการละ 1-3 สินค้า
+            at = timezone.make_aware(datetime(day.year, day.month, day.day, rng.randint(8, 20)), tz)
+            issue = Issue.objects.create(created_by=cls.admin, status='completed')
+            Issue.objects.filter(pk=issue.pk).update(created_at=at)
+            for product in rng.sample(cls.products, rng.randint(1, 3)):
+                lines.append(IssueLine(
+                    issue=issue, product=product, qty=rng.randint(1, 40),
+                    created_at=at, created_by=cls.admin,
+                ))
+            day += timedelta(days=3)
+        IssueLine.objects.bulk_create(lines)
+        cls.total_lines = len(lines)
+
+    def test_archives_only_closed_months_before_cutoff(self):
+        cutoff = archive.archive_cutoff(12, today=self.TODAY)
+        self.assertEqual(cutoff, date(2025, 6, 1))
+
+        archive.archive_before(cutoff)
+
+        start, _ = archive.month_bounds(cutoff)
+        self.assertFalse(IssueLine.objects.filter(created_at__lt=start).exists())
+        self.assertFalse(ArchivedIssueLine.objects.filter(created_at__gte=start).exists())
+        self.assertEqual(
+            IssueLine.objects.count() + ArchivedIssueLine.objects.count(), self.total_lines
+        )
+        # ใบเบิกของเดือนที่ archive แล้วถูกลบ
+        self.assertFalse(Issue.objects.filter(created_at__lt=start).exists())
+        self.assertEqual(IssueArchivePeriod.objects.count(), 23)
+
+    def test_archived_history_protects_product(self):
+        archive.archive_before(date(2025, 1, 1))
+        product = ArchivedIssueLine.objects.first().product
+        Product.objects.filter(pk=product.pk).update(stock=0)
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_superuser('archive-root', password='x'))
+
+        r = client.delete(f'/api/products/{product.pk}/')
+        self.assertEqual(r.status_code, 400)
+        # ลบไม่สำเร็จ → ประวัติปัจจุบันก็ต้องไม่หาย
+        self.assertTrue(IssueLine.objects.filter(product=product).exists())
+        self.assertTrue(IssueRollup.objects.filter(product=product).exists())
+
+    def test_rollups_match_archived_lines(self):
+        archive.archive_before(date(2025, 1, 1))
+
+        for rollup in IssueRollup.objects.all():
+            start, end = archive.month_bounds(rollup.month)
+            qty = sum(ArchivedIssueLine.objects.filter(
+                product=rollup.product, created_at__gte=start, created_at__lt=end
+            ).values_list('qty', flat=True))
+            self.assertEqual(rollup.total_qty, qty)
+
+    def test_totals_unchanged_after_archive(self):
+        window_start = timezone.make_aware(datetime(2024, 3, 10))
+        before_all = archive.issued_totals()
+        before_window = archive.issued_totals(created_at__gte=window_start)
+
+        archive.archive_before(date(2025, 1, 1))
+
+        self.assertEqual(archive.issued_totals(), before_all)
+        self.assertEqual(archive.issued_totals(created_at__gte=window_start), before_window)
+
+    def test_archive_is_idempotent(self):
+        archive.archive_before(date(2025, 1, 1))
+        rollups = list(IssueRollup.objects.order_by('month', 'product').values_list(
+            'month', 'product', 'total_qty', 'line_count'
+        ))
+
+        self.assertEqual(sum(moved for _, moved in archive.archive_before(date(2025, 1, 1))), 0)
+        self.assertEqual(rollups, list(IssueRollup.objects.order_by('month', 'product').values_list(
+            'month', 'product', 'total_qty', 'line_count'
+        )))
+
+    def test_reports_read_across_live_and_archive(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        params = {'type': 'out', 'start_date': '2024-11-01', 'end_date': '2025-02-28', 'limit': 1000}
+        history_before = client.get('/api/movement-history/', params).json()
+        top_before = client.get('/api/best-sellers/top_products/', {'period': 'all', 'min_qty': 0}).json()
+        day_start = timezone.make_aware(datetime(2024, 12, 1))
+        feed_before = movement_feed(day_start, day_start + timedelta(days=60), limit=100)[0]
+        self.assertGreater(history_before['total'], 0)
+        self.assertTrue(top_before['results'])
+        self.assertTrue(feed_before)
+
+        archive.archive_before(date(2025, 1, 1))
+        cache.clear()
+        history_after = client.get('/api/movement-history/', params).json()
+        top_after = client.get('/api/best-sellers/top_products/', {'period': 'all', 'min_qty': 0}).json()
+        feed_after = movement_feed(day_start, day_start + timedelta(days=60), limit=100)[0]
+
+        self.assertEqual(history_after['total'], history_before['total'])
+        self.assertEqual(
+            sorted(m['id'] for m in history_after['movements']),
+            sorted(m['id'] for m in history_before['movements'])
+        )
+        self.assertEqual(top_after['results'], top_before['results'])
+        self.assertEqual(feed_after, feed_before)
+
+    def test_command_dry_run_and_run(self):
+        out = StringIO()
+        call_command('archive_issues', '--before', '2024-01', '--dry-run', stdout=out)
+        self.assertFalse(ArchivedIssueLine.objects.exists())
+
+        call_command('archive_issues', '--before', '2024-01', stdout=out)
+        start, _ = archive.month_bounds(date(2024, 1, 1))
+        self.assertTrue(ArchivedIssueLine.objects.exists())
+        self.assertFalse(IssueLine.objects.filter(created_at__lt=start).exists())
+
+
+class StockAdjustTests(TestCase):
+    """ปรับสต็อกแบบ atomic ผ่าน /products/.../adjust-stock/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('stock-admin', password='x', role='admin')
+        cls.a = Product.objects.create(code='S001', name='สินค้า A', stock=10, initial_stock=10)
+        cls.b = Product.objects.create(code='S002', name='สินค้า B', stock=5, initial_stock=5)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_adjust_applies_delta_and_records_movement(self):
+        response = self.client.post(
+            f'/api/products/{self.a.id}/adjust-stock/', {'delta': -4, 'note': 'แตก'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock, 6)
+        self.assertEqual(self.a.stock_version, 1)
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.delta, movement.stock_after), (-4, 6))
+
+    def test_adjust_rejects_overdraw_and_stale_version(self):
+        overdraw = self.client.post(
+            f'/api/products/{self.a.id}/adjust-stock/', {'delta': -11}, format='json'
+        )
+        self.assertEqual(overdraw.status_code, 400)
+
+        self.a.adjust_stock(3, user=self.user)
+        stale = self.client.post(
+            f'/api/products/{self.a.id}/adjust-stock/',
+            {'delta': 1, 'stock_version': 0}, format='json'
+        )
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()['stock_version'], 1)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.stock, 13)
+
+    def test_batch_count_is_all_or_nothing(self):
+        response = self.client.post('/api/products/adjust-stock/', {'items': [
+            {'product': self.a.id, 'count': 7},
+            {'product': self.b.id, 'delta': -6},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.get(pk=self.a.pk).stock, 10)
+        self.assertFalse(StockMovement.objects.exists())
+
+        response = self.client.post('/api/products/adjust-stock/', {'items': [
+            {'product': self.a.id, 'count': 7},
+            {'product': self.b.id, 'delta': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['delta'] for m in response.json()['movements']], [-3, 2])
+        self.assertEqual(Product.objects.get(pk=self.b.pk).stock, 7)
+
+    def test_product_update_sets_stock_through_movement(self):
+        response = self.client.patch(
+            f'/api/products/{self.a.id}/', {'name': 'สินค้า A2', 'stock': 12}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 12)
+        self.assertEqual(response.data['name'], 'สินค้า A2')
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.reason, movement.delta), ('correction', 2))
+
+    def test_update_with_unchanged_stock_records_nothing(self):
+        response = self.client.patch(
+            f'/api/products/{self.a.id}/', {'name': 'สินค้า A3', 'stock': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock_version'], 0)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_receive_adds_delta_to_current_stock(self):
+        # หน้ารับสินค้าเห็น stock=10 แต่มีคนเบิกไปก่อน → ต้องบวกจากค่าจริง ไม่ใช่ 10 + 5
+        self.a.adjust_stock(-3, user=self.user)
+        response = self.client.post(
+            f'/api/products/{self.a.id}/adjust-stock/', {'delta': 5, 'reason': 'receive'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['stock_after'], response.json()['reason']), (12, 'receive'))
+
+
+class StocktakeTests(TestCase):
+    """ตรวจนับสต็อกเป็นชุดแล้ว commit ทีเดียว"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user('count-admin', password='x', role='admin')
+        cls.products = [
+            Product.objects.create(code=f'C{i:03d}', name=f'สินค้า {i}', stock=10, initial_stock=10)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.session = self.client.post('/api/stock-counts/', {'name': 'นับสิ้นเดือน'}).json()
+        self.url = f"/api/stock-counts/{self.session['id']}/"
+
+    def test_counts_in_batches_and_reports_variances(self):
+        r = self.client.post(self.url + 'counts/', {'items': [
+            {'code': 'C000', 'qty': 8}, {'code': 'C001', 'qty': 10}, {'code': 'NOPE', 'qty': 1},
+        ]}, format='json')
+        self.assertEqual(r.json(), {'accepted': 2, 'unknown_codes': ['NOPE']})
+        # สแกนเพิ่มอีกจุด
+        self.client.post(self.url + 'counts/', {'mode': 'add', 'items': [
+            {'code': 'C001', 'qty': 3}, {'code': 'C002', 'qty': 4},
+        ]}, format='json')
+
+        data = self.client.get(self.url + 'variances/').json()
+        self.assertEqual(
+            {row['code']: row['variance'] for row in data['results']},
+            {'C000': -2, 'C001': 3, 'C002': -6}
+        )
+        self.assertEqual(data['summary']['lines'], 3)
+        self.assertEqual((data['summary']['over'], data['summary']['short']), (3, -8))
+
+    def test_commit_applies_all_counts_once(self):
+        task = Task.objects.create(
+            title='ตรวจสต็อก', description='-', task_type='inventory_check',
+            assigned_to=self.admin, due_date=timezone.now()
+        )
+        StockCount.objects.filter(pk=self.session['id']).update(task=task)
+        self.client.post(self.url + 'counts/', {'items': [
+            {'code': p.code, 'qty': 12} for p in self.products[:3]
+        ]}, format='json')
+
+        result = self.client.post(self.url + 'commit/').json()
+        self.assertEqual(result, {'lines': 3, 'adjusted': 3, 'increased': 6, 'decreased': 0})
+        self.assertEqual(
+            list(Product.objects.order_by('code').values_list('stock', flat=True)), [12, 12, 12, 10, 10]
+        )
+        self.assertEqual(StockMovement.objects.filter(reason='count').count(), 3)
+        self.assertEqual(set(StockCountLine.objects.values_list('expected', flat=True)), {10})
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'completed')
+
+        # commit แล้วนับเพิ่ม / commit ซ้ำไม่ได้
+        self.assertEqual(self.client.post(self.url + 'commit/').status_code, 409)
+        self.assertEqual(self.client.post(self.url + 'counts/', {'items': [
+            {'code': 'C000', 'qty': 1}
+        ]}, format='json').status_code, 409)
+
+
+class ThumbnailTests(TestCase):
+    """อัปโหลดรูป → เข้าคิว → worker สร้างรูปย่อ → serializer คืน URL"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user('thumb-admin', password='x', role='admin')
+        )
+
+    def _upload(self, code, color='red'):
+        buffer = BytesIO()
+        Image.new('RGBA', (2000, 1000), color).save(buffer, 'PNG')
+        image = SimpleUploadedFile(f'{code}.png', buffer.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/products/', {
+                'code': code, 'name': f'สินค้า {code}', 'stock': 1, 'image': image,
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def test_upload_queues_job_and_worker_renders_all_sizes(self):
+        pid = self._upload('T001')
+        self.assertEqual(ImageJob.objects.get().status, 'pending')
+        self.assertIsNone(self.client.get(f'/api/products/{pid}/').json()['image_thumbnails'])
+
+        self.assertEqual(thumbnails.process_pending(), (1, 0))
+        data = self.client.get(f'/api/products/{pid}/').json()['image_thumbnails']
+        self.assertEqual(set(data), set(thumbnails.SIZES))
+        self.assertEqual((data['sm']['width'], data['sm']['height']), (160, 80))
+        self.assertEqual((data['lg']['width'], data['lg']['height']), (1200, 600))
+        self.assertTrue(data['md']['webp'].endswith('-md.webp'))
+        self.assertTrue(data['md']['jpg'].endswith('-md.jpg'))
+
+    def test_identical_images_share_content_hashed_files(self):
+        first, second = self._upload('T002', 'blue'), self._upload('T003', 'blue')
+        thumbnails.process_pending()
+        a = Product.objects.get(pk=first).image_renditions
+        b = Product.objects.get(pk=second).image_renditions
+        self.assertNotEqual(a['source'], b['source'])
+        self.assertEqual(a['sizes'], b['sizes'])
+
+
+class MediaServingTests(TestCase):
+    """myapp/media.py: ETag / 304, Range, ไฟล์บีบอัดไว้แล้ว"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _write(self, name, data):
+        path = f'{self.media}/{name}'
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def test_hashed_files_are_immutable_and_revalidate(self):
+        self._write('thumbs/ab/abcdef0123456789abcd-sm.webp', b'x' * 100)
+        self._write('products/a.png', b'y' * 100)
+
+        response = self.client.get('/media/thumbs/ab/abcdef0123456789abcd-sm.webp')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), b'x' * 100)
+        self.assertNotIn('immutable', self.client.get('/media/products/a.png')['Cache-Control'])
+
+        again = self.client.get(
+            '/media/thumbs/ab/abcdef0123456789abcd-sm.webp', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+    def test_etag_is_stable_across_copies(self):
+        # ไฟล์เดียวกันบนอีกเครื่อง (inode ต่างกัน แต่ mtime + ขนาดเท่ากัน) → ETag เดียวกัน
+        self._write('products/a.png', b'y' * 100)
+        first = self.client.get('/media/products/a.png')['ETag']
+        path = f'{self.media}/products/a.png'
+        st = os.stat(path)
+        shutil.copyfile(path, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertNotEqual(os.stat(path).st_ino, st.st_ino)
+        self.assertEqual(self.client.get('/media/products/a.png')['ETag'], first)
+
+    def test_range_requests(self):
+        self._write('files/data.bin', bytes(range(256)) * 4)
+
+        partial = self.client.get('/media/files/data.bin', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(partial.streaming_content), bytes(range(10, 20)))
+
+        suffix = self.client.get('/media/files/data.bin', HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(suffix.streaming_content), bytes(range(252, 256)))
+        self.assertEqual(
+            self.client.get('/media/files/data.bin', HTTP_RANGE='bytes=5000-').status_code, 416
+        )
+
+    def test_precompressed_variant(self):
+        text = b'{"stock": 1}\n' * 200
+        self._write('exports/report.json', text)
+        self._write('exports/report.json.gz', gzip.compress(text))
+
+        compressed = self.client.get('/media/exports/report.json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed['Content-Type'], 'application/json')
+        self.assertEqual(gzip.decompress(b''.join(compressed.streaming_content)), text)
+
+        plain = self.client.get('/media/exports/report.json')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+
+    def test_accel_precompressed_variant_keeps_type_and_encoding(self):
+        text = b'{"stock": 1}\n' * 200
+        self._write('exports/report.json', text)
+        self._write('exports/report.json.gz', gzip.compress(text))
+
+        with override_settings(MEDIA_ACCEL='x-accel'):
+            compressed = self.client.get('/media/exports/report.json', HTTP_ACCEPT_ENCODING='gzip')
+            plain = self.client.get('/media/exports/report.json')
+        self.assertEqual(compressed['X-Accel-Redirect'], '/protected-media/exports/report.json.gz')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(compressed['Content-Type'], 'application/json')
+        self.assertEqual(plain['X-Accel-Redirect'], '/protected-media/exports/report.json')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Content-Type'], 'application/json')
+
+        with override_settings(MEDIA_ACCEL='x-sendfile'):
+            sendfile = self.client.get('/media/exports/report.json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(sendfile['X-Sendfile'], f'{self.media}/exports/report.json.gz')
+        self.assertEqual(sendfile['Content-Encoding'], 'gzip')
+        self.assertEqual(sendfile['Content-Type'], 'application/json')
+
+
+@skipUnless(forecasting.NUMPY_AVAILABLE, 'numpy is not installed')
+class DemandForecastTests(TestCase):
+    """คาดการณ์ยอดเบิกช่วงเทศกาลจากประวัติปีก่อน"""
+
+    TODAY = date(2026, 3, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_user('forecast-admin', password='x', role='admin')
+        cls.water = Product.objects.create(code='F001', name='น้ำดื่ม', stock=40, initial_stock=40)
+        cls.rice = Product.objects.create(code='F002', name='ข้าวสาร', stock=40, initial_stock=40)
+        cls.last_year = Festival.objects.create(
+            name='สงกรานต์', start_date=date(2025, 4, 13), end_date=date(2025, 4, 15),
+            category='songkran', is_recurring=True,
+        )
+        cls.festival = Festival.objects.create(
+            name='สงกรานต์', start_date=date(2026, 4, 13), end_date=date(2026, 4, 15),
+            category='songkran', is_recurring=True,
+        )
+
+        # น้ำดื่ม: ปกติ 2/วัน ช่วงสงกรานต์ (รวม 7 วันก่อน) 10/วัน, ข้าวสาร 1/วันตลอด
+        tz = timezone.get_current_timezone()
+        lines = []
+        day = date(2025, 1, 1)
+        while day < cls.TODAY:
+            at = timezone.make_aware(datetime(day.year, day.month, day.day, 10), tz)
+            issue = Issue.objects.create(created_by=cls.admin, status='completed')
+            in_window = date(2025, 4, 6) <= day <= date(2025, 4, 15)
+            lines.append(IssueLine(issue=issue, product=cls.water, qty=10 if in_window else 2, created_at=at))
+            lines.append(IssueLine(issue=issue, product=cls.rice, qty=1, created_at=at))
+            day += timedelta(days=1)
+        IssueLine.objects.bulk_create(lines)
+
+    def test_uplift_from_same_festival_last_year(self):
+        history, forecasts = forecasting.forecast_upcoming(today=self.TODAY, history_days=400)
+        self.assertEqual([f.festival for f in forecasts], [self.festival])
+        forecast = forecasts[0]
+        self.assertEqual((forecast.basis, forecast.occurrences), ('festival', 1))
+        self.assertEqual(forecast.window_start, date(2026, 4, 6))
+
+        qty = dict(zip(history.product_ids.tolist(), forecast.quantity.tolist()))
+        # baseline 2 × uplift (100 + 2) / (20 + 2) × 10 วัน
+        self.assertEqual(qty[self.water.id], 93)
+        self.assertEqual(qty[self.rice.id], 10)
+
+    def test_stored_forecast_shows_shortfall(self):
+        history, forecasts = forecasting.forecast_upcoming(today=self.TODAY, history_days=400)
+        self.assertEqual(forecasting.store(history, forecasts[0]), 2)
+        self.assertEqual(DemandForecast.objects.filter(festival=self.festival).count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        data = client.get(f'/api/festivals/{self.festival.id}/forecast/').json()
+        self.assertEqual(data['total_qty'], 103)
+        self.assertEqual(
+            [(row['product_code'], row['shortfall']) for row in data['results']],
+            [('F001', 53), ('F002', 0)]
+        )
+
+    def test_history_bounds_are_local_midnight(self):
+        # ขอบวันตามเวลาท้องถิ่น: 00:00 ของวันแรกนับ, 00:00 ของวัน end ไม่นับ
+        tz = timezone.get_current_timezone()
+        issue = Issue.objects.create(created_by=self.admin, status='completed')
+        for moment, qty in ((datetime(2026, 3, 1, 0, 0), 7), (datetime(2026, 3, 2, 23, 59), 11),
+                            (datetime(2026, 3, 3, 0, 0), 13)):
+            IssueLine.objects.create(
+                issue=issue, product=self.rice, qty=qty, created_at=timezone.make_aware(moment, tz),
+            )
+
+        with CaptureQueriesContext(connection) as ctx:
+            history = forecasting.IssueHistory(date(2026, 3, 1), date(2026, 3, 3))
+        self.assertEqual(history.day_index.tolist(), [0, 1])
+        self.assertEqual(history.qty.tolist(), [7.0, 11.0])
+        # ไม่ครอบ created_at ด้วยฟังก์ชันวันที่ใน WHERE → ใช้ index ได้
+        where = ctx.captured_queries[0]['sql'].split('WHERE', 1)[1].split('GROUP BY')[0]
+        self.assertNotIn('cast_date', where)
+
+
+class ReplenishmentTests(TestCase):
+    """วางแผนเติมสินค้าทุกรายการ แล้วแจกงานตามจำนวนงานค้าง"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_user('refill-admin', password='x', role='admin')
+        cls.busy = User.objects.create_user('refill-busy', password='x', role='employee')
+        cls.free = User.objects.create_user('refill-free', password='x', role='employee')
+
+        stocks = {'R000': 0, 'R001': 100, 'R002': 5, 'R003': 5, 'R004': 0}
+        cls.products = {
+            code: Product.objects.create(code=code, name=f'สินค้า {code}', stock=stock, initial_stock=stock)
+            for code, stock in stocks.items()
+        }
+        # ยอดเบิก 28 วันล่าสุด: R000 / R002 / R004 = 2 ต่อวัน, R001 = 1 ต่อวัน
+        issue = Issue.objects.create(created_by=cls.admin, status='completed')
+        IssueLine.objects.bulk_create([
+            IssueLine(issue=issue, product=cls.products[code], qty=qty,
+                      created_at=timezone.now() - timedelta(days=1))
+            for code, qty in (('R000', 56), ('R001', 28), ('R002', 56), ('R004', 56))
+        ])
+        # R003 ไม่มียอดเบิกปกติ แต่มีเทศกาลพรุ่งนี้ คาดว่าเบิก 50 ใน 10 วัน
+        today = timezone.localdate()
+        festival = Festival.objects.create(
+            name='ลอยกระทง', start_date=today + timedelta(days=1), end_date=today + timedelta(days=10),
+        )
+        DemandForecast.objects.create(
+            festival=festival, product=cls.products['R003'],
+            window_start=festival.start_date, window_end=festival.end_date,
+            baseline_daily=0, uplift=1, forecast_qty=50, generated_at=timezone.now(),
+        )
+        # R004 มีงานเติมค้างอยู่แล้ว
+        Task.objects.create(
+            title='เติม R004', description='-', task_type='stock_replenishment',
+            assigned_to=cls.busy, product=cls.products['R004'], due_date=timezone.now(),
+        )
+
+    def test_plan_uses_velocity_stock_and_festivals(self):
+        plan = replenishment.plan()
+        self.assertEqual(
+            [(s.code, s.priority, s.quantity) for s in plan],
+            # (2 × 17 วัน + safety 4) - สต็อก, เทศกาล 50 - สต็อก 5
+            [('R000', 'urgent', 38), ('R002', 'high', 33), ('R003', 'medium', 45)]
+        )
+        self.assertEqual(plan[2].festival, 'ลอยกระทง')
+
+    def test_tasks_go_to_least_loaded_employee(self):
+        out = StringIO()
+        call_command('plan_replenishment', '--created-by', 'refill-admin', stdout=out)
+        tasks = Task.objects.filter(created_by=self.admin).order_by('product__code')
+        self.assertEqual(
+            [(t.product.code, t.assigned_to.username, t.target_quantity) for t in tasks],
+            [('R000', 'refill-free', 38), ('R002', 'refill-busy', 33), ('R003', 'refill-free', 45)]
+        )
+
+        # รันซ้ำ → งานค้างอยู่แล้ว ไม่สร้างซ้ำ
+        call_command('plan_replenishment', stdout=out)
+        self.assertEqual(Task.objects.filter(task_type='stock_replenishment').count(), 4)
+
+
+class FestivalRecurrenceTests(TestCase):
+    """เทศกาลประจำปีแสดงทุกปีโดยไม่ต้อง seed ใหม่"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('calendar-user', password='x')
+        for name, start, end in (
+            ('วันสงกรานต์ (วันแรก)', date(2025, 4, 13), date(2025, 4, 14)),
+            ('วันสงกรานต์ (วันทำนายศก)', date(2025, 4, 14), date(2025, 4, 15)),
+            ('วันสงกรานต์', date(2026, 4, 13), date(2026, 4, 15)),
+            ('ส่งท้ายปีเก่า', date(2025, 12, 31), date(2026, 1, 1)),
+        ):
+            Festival.objects.create(name=name, start_date=start, end_date=end, is_recurring=True)
+        Festival.objects.create(
+            name='งานครบรอบร้าน', start_date=date(2025, 4, 20), end_date=date(2025, 4, 20),
+            is_recurring=False,
+        )
+
+    def setUp(self):
+        # TestCase ไม่ commit → on_commit ไม่ล้าง cache ให้ / ChangeCounter ย้อนกลับทุก test
+        cache.clear()
+        caching._shared_seen.clear()
+        recurrence._calendar = None
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def calendar(self, year, month):
+        data = self.client.get(f'/api/festivals/calendar/?year={year}&month={month}').json()
+        return [(f['name'], f['start_date'], f['is_projected']) for f in data['festivals']]
+
+    def test_stored_year_is_not_expanded_again(self):
+        self.assertEqual(self.calendar(2026, 4), [('วันสงกรานต์', '2026-04-13', False)])
+        # ปีถัดไปขยายจากแถวปีล่าสุดเท่านั้น
+        self.assertEqual(self.calendar(2028, 4), [('วันสงกรานต์', '2028-04-13', True)])
+        self.assertEqual(
+            [name for name, _, _ in self.calendar(2025, 4)],
+            ['วันสงกรานต์ (วันแรก)', 'วันสงกรานต์ (วันทำนายศก)', 'งานครบรอบร้าน']
+        )
+
+    def test_expansion_crosses_year_boundary(self):
+        self.assertEqual(self.calendar(2027, 1), [('ส่งท้ายปีเก่า', '2026-12-31', True)])
+        calendar = recurrence.get_calendar()
+        self.assertEqual(
+            [(f.name, f.start_date) for f in calendar.upcoming(date(2026, 12, 1), days=150)],
+            [('ส่งท้ายปีเก่า', date(2026, 12, 31)), ('วันสงกรานต์', date(2027, 4, 13))]
+        )
+
+    def test_other_worker_change_rebuilds_calendar(self):
+        self.assertEqual(self.calendar(2026, 4), [('วันสงกรานต์', '2026-04-13', False)])
+        Festival.objects.filter(name='วันสงกรานต์').update(start_date=date(2026, 4, 12))
+        # worker อื่นล้าง cache ของตัวเอง: locmem ของ process นี้ไม่รู้ แต่ ChangeCounter เปลี่ยน
+        caching.bump_shared(caching.TAG_FESTIVALS)
+        self.assertEqual(
+            [(f.name, f.start_date) for f in recurrence.get_calendar().between(date(2026, 4, 1), date(2026, 4, 30))],
+            [('วันสงกรานต์', date(2026, 4, 12))]
+        )
+
+    def test_lunar_holiday_is_not_projected_into_unseeded_year(self):
+        call_command('seed_festivals_from_api', '2026', stdout=StringIO())
+        recurrence._calendar = None
+        caching._shared_seen.clear()
+        names = [f.name for f in recurrence.get_calendar().between(date(2027, 1, 1), date(2027, 12, 31))]
+        # วันวิสาขบูชา 2026 = 3 พ.ค. แต่ปี 2027 ไม่ใช่วันเดียวกัน → ไม่แสดงจนกว่าจะ seed ปี 2027
+        self.assertNotIn('วันวิสาขบูชา', names)
+        self.assertNotIn('วันลอยกระทง', names)
+        self.assertIn('วันแม่ของไทย', names)
+        self.assertEqual(self.calendar(2027, 5), [])
+
+    def test_seed_upserts_in_bulk(self):
+        call_command('seed_festivals_from_api', '2026', stdout=StringIO())
+        count = Festival.objects.count()
+        Festival.objects.filter(name='วันแม่ของไทย').update(color='#000000')
+
+        call_command('seed_festivals_from_api', '2026', stdout=StringIO())
+        self.assertEqual(Festival.objects.count(), count)
+        self.assertEqual(Festival.objects.get(name='วันแม่ของไทย').color, '#FF69B4')
+        # วันสงกรานต์ 2026 มีอยู่แล้ว → อัปเดต ไม่สร้างซ้ำ
+        self.assertEqual(Festival.objects.filter(name='วันสงกรานต์').count(), 1)
+
+
+class CalendarFeedTests(TestCase):
+    """ปฏิทินรวมเทศกาล / บันทึก / งาน"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user('cal-user', password='x', role='employee')
+        cls.other = User.objects.create_user('cal-other', password='x', role='employee')
+        Festival.objects.create(
+            name='วันแม่', start_date=date(2026, 8, 12), end_date=date(2026, 8, 12), icon='👩',
+        )
+        CustomEvent.objects.create(title='สั่งน้ำแข็ง', date=date(2026, 8, 10), created_by=cls.user, is_shared=True)
+        CustomEvent.objects.create(title='ส่วนตัว', date=date(2026, 8, 11), created_by=cls.user, is_shared=False)
+        CustomEvent.objects.create(title='ของคนอื่น', date=date(2026, 8, 11), created_by=cls.other, is_shared=False)
+        tz = timezone.get_current_timezone()
+        for user, title in ((cls.user, 'ตรวจนับ, ชั้น A'), (cls.other, 'งานคนอื่น')):
+            Task.objects.create(
+                title=title, description='-', assigned_to=user,
+                due_date=timezone.make_aware(datetime(2026, 8, 12, 16), tz),
+            )
+
+    def setUp(self):
+        cache.clear()
+        caching._shared_seen.clear()
+        recurrence._calendar = None
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_feed_merges_sources_and_honours_etag(self):
+        url = '/api/calendar/feed/?start=2026-08-01&end=2026-08-31'
+        r = self.client.get(url)
+        self.assertEqual(
+            [(e['type'], e['title']) for e in r.json()['entries']],
+            [('event', 'สั่งน้ำแข็ง'), ('event', 'ส่วนตัว'),
+             ('festival', 'วันแม่'), ('task', 'ตรวจนับ, ชั้น A')]
+        )
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag']).status_code, 304)
+
+        # แก้ข้อมูล → ETag เปลี่ยน
+        caching.invalidate(caching.TAG_EVENTS)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag']).status_code, 200)
+        self.assertEqual(self.client.get('/api/calendar/feed/?start=2026-08-01').status_code, 400)
+
+    def test_etag_follows_changes_from_other_workers(self):
+        url = '/api/calendar/feed/?start=2026-08-01&end=2026-08-31'
+        r = self.client.get(url)
+        CustomEvent.objects.create(title='ใหม่', date=date(2026, 8, 20), created_by=self.user, is_shared=True)
+        # worker อื่นบันทึก: cache locmem ของ process นี้ไม่เปลี่ยน มีแค่ ChangeCounter
+        caching.bump_shared(caching.TAG_EVENTS)
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(fresh.status_code, 200)
+        self.assertIn('ใหม่', [e['title'] for e in fresh.json()['entries']])
+
+    def test_ics_export_streams_events(self):
+        r = self.client.get('/api/calendar/feed.ics?start=2026-08-01&end=2026-08-31')
+        self.assertTrue(r.streaming)
+        body = b''.join(r.streaming_content).decode('utf-8')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 4)
+        self.assertIn('DTSTART;VALUE=DATE:20260812\r\nDTEND;VALUE=DATE:20260813', body)
+        self.assertIn('SUMMARY:ตรวจนับ\\, ชั้น A', body)
+        self.assertIn('DTSTART:20260812T090000Z', body)
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in body.split('\r\n')))
+
+
+class TaskBoardTests(TestCase):
+    """บอร์ดงาน: จำนวน query คงที่ไม่ขึ้นกับจำนวนงาน"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_user('board-admin', password='x', role='admin')
+        cls.user = User.objects.create_user('board-user', password='x', role='employee')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_tasks(self, n, status):
+        Task.objects.bulk_create([
+            Task(
+                title=f'{status} {i}', description='-', assigned_to=self.user, created_by=self.admin,
+                status=status, due_date=timezone.now() + timedelta(days=2 * i - 1),
+                completed_at=timezone.now() - timedelta(hours=i) if status == 'completed' else None,
+            )
+            for i in range(n)
+        ])
+
+    def board_queries(self, url='/api/tasks/board/'):
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(url).json()
+        return data, len(ctx.captured_queries)
+
+    def test_board_groups_and_counts(self):
+        self.make_tasks(2, 'pending')
+        self.make_tasks(1, 'in_progress')
+        self.make_tasks(3, 'completed')
+        data, few = self.board_queries('/api/tasks/board/?limit=2')
+        self.assertEqual(
+            data['counts'],
+            {'total': 6, 'pending': 2, 'in_progress': 1, 'completed': 3, 'cancelled': 0, 'overdue': 2}
+        )
+        self.assertEqual([t['title'] for t in data['pending']], ['pending 0', 'pending 1'])
+        self.assertEqual([t['title'] for t in data['completed']['results']], ['completed 0', 'completed 1'])
+        self.assertEqual(data['completed']['next_offset'], 2)
+
+        self.make_tasks(20, 'pending')
+        self.make_tasks(20, 'completed')
+        _, many = self.board_queries('/api/tasks/board/?limit=2')
+        self.assertEqual(few, many)
+
+    def test_my_tasks_single_query(self):
+        self.make_tasks(2, 'pending')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/tasks/my_tasks/')
+        few = len(ctx.captured_queries)
+        self.make_tasks(10, 'completed')
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get('/api/tasks/my_tasks/').json()
+        self.assertEqual(len(ctx.captured_queries), few)
+        self.assertEqual(data['total'], 12)
+
+
+class TaskBulkCreateTests(TestCase):
+    """สร้างงานทีละชุด: ทุกคนตามแม่แบบ / แจกตามงานค้าง"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_user('bulk-admin', password='x', role='admin')
+        cls.busy = User.objects.create_user('bulk-busy', password='x', role='employee')
+        cls.free = User.objects.create_user('bulk-free', password='x', role='employee')
+        cls.products = [
+            Product.objects.create(code=f'B00{i}', name=f'สินค้า {i}', stock=0, initial_stock=0)
+            for i in range(4)
+        ]
+        Task.objects.bulk_create([
+            Task(title='ค้าง', description='-', assigned_to=cls.busy, due_date=timezone.now())
+            for _ in range(3)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.template = {
+            'title': 'ตรวจนับ {product} ({code})', 'description': 'ตรวจประจำเดือน',
+            'task_type': 'inventory_check', 'priority': 'high',
+            'due_date': (timezone.now() + timedelta(days=1)).isoformat(),
+        }
+
+    def bulk(self, **body):
+        return self.client.post('/api/tasks/bulk/', dict(template=self.template, **body), format='json')
+
+    def test_each_assignee_gets_every_product(self):
+        products = [p.id for p in self.products[:2]]
+        res = self.bulk(mode='each', assignees=[self.busy.id, self.free.id], products=products)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.json()['created'], 4)
+        titles = set(Task.objects.filter(assigned_to=self.free).values_list('title', flat=True))
+        self.assertEqual(titles, {'ตรวจนับ สินค้า 0 (B000)', 'ตรวจนับ สินค้า 1 (B001)'})
+        self.assertEqual(Task.objects.filter(product=self.products[0]).count(), 2)
+
+    def test_balance_fills_least_loaded_first(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.bulk(mode='balance', products=[p.id for p in self.products])
+        self.assertEqual(res.status_code, 201)
+        # busy ค้าง 3 งาน → free ได้ 3 งานแรกจนเท่ากัน แล้วงานที่ 4 ไป busy (id น้อยกว่า)
+        self.assertEqual(res.json()['assigned'], {str(self.free.id): 3, str(self.busy.id): 1})
+        res = self.bulk(mode='balance', count=3)
+        self.assertEqual(res.json()['assigned'], {str(self.free.id): 2, str(self.busy.id): 1})
+        self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_balance_locks_assignees_in_same_transaction_as_insert(self):
+        calls = []
+
+        def lock(user_ids):
+            calls.append(('lock', sorted(user_ids), Task.objects.count()))
+
+        def save(tasks):
+            calls.append(('save', None, Task.objects.count()))
+            raise assignment.AssignmentError('ยกเลิก')
+
+        # ล็อกก่อนอ่านภาระงาน และ error ตอนบันทึก → ไม่มีงานถูกสร้าง (อยู่ใน transaction เดียวกัน)
+        with mock.patch.object(assignment, 'lock_assignees', side_effect=lock), \
+                mock.patch.object(assignment, 'save_tasks', side_effect=save):
+            res = self.bulk(mode='balance', count=2)
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(calls, [('lock', sorted([self.busy.id, self.free.id]), 3), ('save', None, 3)])
+
+    def test_rejects_unknown_ids_without_creating(self):
+        before = Task.objects.count()
+        res = self.bulk(mode='each', assignees=[self.free.id, 999999])
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('999999', res.json()['error'])
+        res = self.bulk(mode='balance', products=[self.products[0].id, 888888])
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(Task.objects.count(), before)
+        self.client.force_authenticate(self.free)
+        self.assertEqual(self.bulk(mode='each', assignees=[self.free.id]).status_code, 403)
+
+
+class TaskReminderTests(TestCase):
+    """เตือนกำหนดส่งงาน: รวมต่อผู้รับ และรันซ้ำไม่ส่งซ้ำ"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user('remind-user', password='x', role='employee')
+        cls.offline = User.objects.create_user('remind-offline', password='x', role='employee')
+        NotificationSettings.objects.create(user=cls.user, line_user_id='U123')
+
+    def make_task(self, title, hours, user=None, priority='medium', status='pending'):
+        return Task.objects.create(
+            title=title, description='-', assigned_to=user or self.user, priority=priority,
+            status=status, due_date=timezone.now() + timedelta(hours=hours),
+        )
+
+    def test_batches_per_assignee_and_is_idempotent(self):
+        self.make_task('เลยกำหนด', -3)
+        self.make_task('อีกครึ่งชั่วโมง', 0.5)
+        self.make_task('พรุ่งนี้', 20)
+        self.make_task('ด่วน 2 วัน', 40, priority='urgent')
+        self.make_task('ยังไม่ถึง', 40)
+        self.make_task('เสร็จแล้ว', -1, status='completed')
+        self.make_task('ไม่มี LINE', -1, user=self.offline)
+
+        messages = []
+        send = lambda line_id, text: messages.append((line_id, text)) or True
+        stats = reminders.send_due_reminders(send=send)
+        self.assertEqual((stats['sent'], stats['no_line'], stats['tasks']), (1, 1, 5))
+        self.assertEqual(len(messages), 1)
+        line_id, text = messages[0]
+        self.assertEqual(line_id, 'U123')
+        self.assertIn('(4 งาน)', text)
+        self.assertLess(text.index('เลยกำหนด'), text.index('อีกครึ่งชั่วโมง'))
+        self.assertNotIn('ยังไม่ถึง', text)
+
+        # รันซ้ำ → ไม่มีอะไรส่ง
+        stats = reminders.send_due_reminders(send=send)
+        self.assertEqual(stats['tasks'], 0)
+        self.assertEqual(len(messages), 1)
+
+    def test_next_stage_and_rescheduled_due_date_remind_again(self):
+        task = self.make_task('ตรวจสต็อก', 10)
+        send = lambda line_id, text: True
+        reminders.send_due_reminders(send=send)
+        self.assertEqual(list(task.reminders.values_list('stage', flat=True)), ['due_soon'])
+
+        # เวลาผ่านไปจนเลยกำหนด → เตือนขั้นถัดไป
+        later = timezone.now() + timedelta(hours=11)
+        self.assertEqual(reminders.send_due_reminders(send=send, now=later)['sent'], 1)
+        # ส่งไม่สำเร็จ → ไม่บันทึก ลองใหม่รอบหน้า
+        Task.objects.filter(pk=task.pk).update(due_date=later + timedelta(minutes=30))
+        self.assertEqual(reminders.send_due_reminders(send=lambda *a: False, now=later)['failed'], 1)
+        self.assertEqual(reminders.send_due_reminders(send=send, now=later)['sent'], 1)
+        self.assertEqual(task.reminders.count(), 3)
+
+    def test_overlapping_runs_send_only_what_they_claimed(self):
+        mine = self.make_task('ของรอบนี้', -1)
+        other = self.make_task('รอบอื่นจองแล้ว', -2)
+        stale = self.make_task('จองค้าง', -3)
+        # อีก process จองไว้แล้ว (ยังส่งไม่เสร็จ) / จองค้างจาก process ที่ตายไปนานแล้ว
+        TaskReminder.objects.create(
+            task=other, stage='overdue', due_date=other.due_date, status='pending', claim='other'
+        )
+        old = TaskReminder.objects.create(
+            task=stale, stage='overdue', due_date=stale.due_date, status='pending', claim='dead'
+        )
+        TaskReminder.objects.filter(pk=old.pk).update(
+            sent_at=timezone.now() - reminders.CLAIM_TIMEOUT - timedelta(minutes=1)
+        )
+
+        messages = []
+        stats = reminders.send_due_reminders(send=lambda line_id, text: messages.append(text) or True)
+        self.assertEqual((stats['tasks'], stats['skipped'], stats['sent']), (2, 0, 1))
+        self.assertIn(mine.title, messages[0])
+        self.assertIn(stale.title, messages[0])
+        self.assertNotIn(other.title, messages[0])
+        self.assertEqual(
+            dict(TaskReminder.objects.values_list('task_id', 'status')),
+            {mine.id: 'sent', other.id: 'pending', stale.id: 'sent'},
+        )
+
+        # อีก process จองแทรกระหว่างหางานกับจอง → รอบนี้ไม่ได้แถวนั้น
+        late = self.make_task('แทรก', -1)
+        pending = reminders.due_reminders()
+        TaskReminder.objects.create(
+            task=late, stage='overdue', due_date=late.due_date, status='pending', claim='other'
+        )
+        claimed, _ = reminders._claim(pending)
+        self.assertEqual(claimed, {})
+
+
+class AuditLogTests(TestCase):
+    """ประวัติการแก้ไข: เก็บเฉพาะ field ที่เปลี่ยน และเขียนทีเดียวหลัง commit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_user('audit-admin', password='x', role='admin', is_staff=True)
+        cls.user = User.objects.create_user('audit-user', password='x', role='employee')
+
+    def test_batched_after_commit_and_skips_rolled_back(self):
+        with CaptureQueriesContext(connection) as ctx, \
+                self.captureOnCommitCallbacks(execute=True), audit.acting_as(self.admin):
+            with transaction.atomic():
+                products = [
+                    Product.objects.create(code=f'A00{i}', name=f'สินค้า {i}') for i in range(3)
+                ]
+                for product in products:
+                    product.name += ' (ใหม่)'
+                    product.save()
+                try:
+                    with transaction.atomic():
+                        products[0].on_sale = True
+                        products[0].save()
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.assertEqual(AuditLog.objects.count(), 0)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "inventory_auditlog"')]
+        self.assertEqual(len(inserts), 1)
+
+        rows = audit.history('product', products[0].pk)
+        self.assertEqual([r['action'] for r in rows], ['update', 'create'])
+        self.assertEqual(rows[0]['changes'], {'name': ['สินค้า 0', 'สินค้า 0 (ใหม่)']})
+        self.assertEqual(rows[0]['user_id'], self.admin.pk)
+        self.assertEqual(AuditLog.objects.count(), 6)
+
+        # โหลดจาก DB แล้ว save โดยไม่เปลี่ยน → ไม่บันทึก
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=products[1].pk).save()
+        self.assertEqual(AuditLog.objects.count(), 6)
+
+    def test_bulk_paths_are_recorded(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        template = {'title': 'นับ {n}', 'description': '-', 'due_date': timezone.now().isoformat()}
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/api/tasks/bulk/', {
+                'template': template, 'mode': 'balance', 'count': 3, 'assignees': [self.user.id],
+            }, format='json')
+        rows = AuditLog.objects.filter(model='task', action='create')
+        self.assertEqual(sorted(rows.values_list('object_id', flat=True)), sorted(Task.objects.values_list('id', flat=True)))
+        self.assertEqual({r.user_id for r in rows}, {self.admin.pk})
+        self.assertEqual(rows.first().changes['assigned_to'], [None, self.user.pk])
+
+        existing = Product.objects.create(code='AU100', name='เดิม', stock=5)
+        rows = read_rows(BytesIO('code,name,stock\nAU100,ใหม่,5\nAU101,น้ำแข็ง,3\n'.encode('utf-8')), 'p.csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImporter(user=self.admin).run(rows)
+        created = Product.objects.get(code='AU101')
+        self.assertEqual(audit.history('product', existing.pk)[0]['changes'], {'name': ['เดิม', 'ใหม่']})
+        self.assertEqual(audit.history('product', created.pk)[0]['action'], 'create')
+
+        session = client.post('/api/stock-counts/', {'name': 'นับ'}).json()
+        url = f"/api/stock-counts/{session['id']}/"
+        client.post(url + 'counts/', {'items': [{'code': 'AU100', 'qty': 2}]}, format='json')
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            client.post(url + 'commit/')
+        self.assertEqual(audit.history('product', existing.pk)[0]['changes'], {'stock': [5, 2]})
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "inventory_auditlog"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_expression_updates_are_not_diffed(self):
+        # Listing.quantity = F() + qty (issuing) → ไม่มีค่าจริงให้บันทึก แต่ field อื่นยังบันทึกได้
+        product = Product.objects.create(code='AU200', name='น้ำดื่ม', stock=10)
+        listing = Listing.objects.create(product=product, title='น้ำดื่ม', quantity=1, is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            listing.quantity = F('quantity') + 2
+            listing.is_active = True
+            listing.save(update_fields=['quantity', 'is_active'])
+            listing.title = 'น้ำดื่มเย็น'
+            listing.save(update_fields=['title'])
+        listing.refresh_from_db()
+        self.assertEqual(listing.quantity, 3)
+        self.assertEqual(
+            [r['changes'] for r in audit.history('listing', listing.pk)[:2]],
+            [{'title': ['น้ำดื่ม', 'น้ำดื่มเย็น']}, {'is_active': [False, True]}],
+        )
+
+    def test_task_notes_keep_latest_and_history_has_all(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(
+                title='ตรวจสต็อก', description='-', assigned_to=self.user, due_date=timezone.now()
+            )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for status, notes in (('in_progress', 'เริ่มนับ'), ('completed', 'นับครบแล้ว')):
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(f'/api/tasks/{task.pk}/update_status/', {'status': status, 'notes': notes})
+        task.refresh_from_db()
+        self.assertEqual(task.notes, 'นับครบแล้ว')
+
+        rows = client.get(f'/api/tasks/{task.pk}/history/').json()
+        self.assertEqual([r['action'] for r in rows], ['update', 'update', 'create'])
+        self.assertEqual(rows[0]['changes']['notes'], ['เริ่มนับ', 'นับครบแล้ว'])
+        self.assertEqual(rows[0]['changes']['status'], ['in_progress', 'completed'])
+        self.assertEqual(rows[0]['user__username'], 'audit-user')
+
+        admin = APIClient()
+        admin.force_authenticate(self.admin)
+        data = admin.get(f'/api/audit-log/?user={self.user.pk}&limit=1').json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertEqual(data['next_before'], rows[0]['id'])
+        self.assertEqual(client.get('/api/audit-log/?model=task&object_id=1').status_code, 403)
+
+
+class RequestRoutingMiddlewareTests(TestCase):
+    """middleware: ข้าม CSRF ตาม path ที่ compile ไว้ ใช้ได้ทั้ง sync / async"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_sync_marks_only_exempt_paths(self):
+        middleware = RequestRoutingMiddleware(lambda request: HttpResponse('ok'))
+        webhook = self.factory.post('/api/line/webhook/')
+        other = self.factory.post('/api/line/webhook-test/')
+        self.assertEqual(middleware(webhook).status_code, 200)
+        middleware(other)
+        self.assertTrue(getattr(webhook, '_dont_enforce_csrf_checks', False))
+        self.assertFalse(getattr(other, '_dont_enforce_csrf_checks', False))
+
+    @override_settings(REQUEST_LOG_SAMPLE_RATE=1.0)
+    def test_async_and_sampled_log(self):
+        async def get_response(request):
+            return HttpResponse(status=204)
+
+        middleware = RequestRoutingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = self.factory.get('/api/products/')
+        with self.assertLogs('inventory.requests', 'INFO') as logs:
+            response = asyncio.run(middleware(request))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(logs.records[0].path, '/api/products/')
+        self.assertEqual(logs.records[0].status, 204)
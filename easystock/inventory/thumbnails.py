@@ -0,0 +1,222 @@
+# inventory/thumbnails.py
+# สร้างรูปย่อ (WebP + JPEG หลายขนาด) จากรูปที่อัปโหลด
+#
+# - บันทึกรูป → signal เข้าคิว ImageJob หลัง commit → worker (manage.py process_images) ทำ
+# - ชื่อไฟล์รูปย่อมาจาก hash ของเนื้อไฟล์ต้นฉบับ → URL ไม่เปลี่ยนตราบที่รูปเดิม
+#   cache ฝั่ง browser / CDN ได้ยาว (immutable) และรูปซ้ำกันใช้ไฟล์ร่วมกัน
+# - ผลลัพธ์เก็บใน <field>_renditions (JSONField) ของ model เอง → serializer ไม่ต้อง query เพิ่ม
+
+import hashlib
+from datetime import timedelta
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ImageJob
+from . import caching
+
+# ชื่อขนาด → ด้านยาวสุด (px)
+SIZES = {
+    'sm': 160,
+    'md': 480,
+    'lg': 1200,
+}
+# นามสกุล → (format ของ Pillow, options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+DIRECTORY = 'thumbs'
+MAX_ATTEMPTS = 3
+
+# model label → [(field รูป, field ที่เก็บรูปย่อ)]
+# (model ใหม่ที่มีรูป: เพิ่มที่นี่ + connect signal ใน inventory/signals.py)
+SOURCES = {
+    'inventory.product': [('image', 'image_renditions')],
+    'inventory.listing': [('image', 'image_renditions')],
+    'inventory.task': [('image', 'image_renditions')],
+    'accounts.user': [('profile_image', 'profile_image_renditions')],
+}
+
+
+def _renditions_field(model_label, field):
+    return dict(SOURCES[model_label])[field]
+
+
+# ================ RENDER ================
+
+def _file_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:20]
+
+
+def _flatten(image):
+    """JPEG ไม่มี alpha → วางบนพื้นขาว"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render(field_file, storage=None):
+    """
+    สร้างรูปย่อทุกขนาด / ทุก format จากไฟล์ต้นฉบับ คืน dict ที่เก็บลง *_renditions
+    {'source', 'hash', 'width', 'height', 'sizes': {'sm': {'width', 'height', 'webp', 'jpg'}, ...}}
+    """
+    storage = storage or default_storage
+    with field_file.open('rb') as f:
+        content_hash = _file_hash(f)
+        with Image.open(f) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+
+    base = original.convert('RGBA') if original.mode not in ('RGB', 'RGBA') else original
+    result = {
+        'source': field_file.name,
+        'hash': content_hash,
+        'width': original.width,
+        'height': original.height,
+        'sizes': {},
+    }
+    for size_name, edge in SIZES.items():
+        image = base.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)  # ไม่ขยายรูปที่เล็กกว่า
+        entry = {'width': image.width, 'height': image.height}
+        for ext, (fmt, options) in FORMATS.items():
+            name = f'{DIRECTORY}/{content_hash[:2]}/{content_hash}-{size_name}.{ext}'
+            if not storage.exists(name):
+                buffer = BytesIO()
+                (_flatten(image) if fmt == 'JPEG' else image).save(buffer, fmt, **options)
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            entry[ext] = name
+        result['sizes'][size_name] = entry
+    return result
+
+
+def thumbnail_urls(renditions, request=None, storage=None):
+    """แปลง *_renditions เป็น URL สำหรับ serializer — ยังไม่มีรูปย่อ → None"""
+    if not renditions or not renditions.get('sizes'):
+        return None
+    storage = storage or default_storage
+
+    def url(name):
+        value = storage.url(name)
+        return request.build_absolute_uri(value) if request else value
+
+    return {
+        size_name: {
+            'width': entry['width'],
+            'height': entry['height'],
+            **{ext: url(entry[ext]) for ext in FORMATS if ext in entry},
+        }
+        for size_name, entry in renditions['sizes'].items()
+    }
+
+
+# ================ QUEUE ================
+
+def needs_render(instance, field, renditions_field):
+    image = getattr(instance, field)
+    if not image:
+        return False
+    return (getattr(instance, renditions_field) or {}).get('source') != image.name
+
+
+def enqueue(instance, field):
+    """เข้าคิวสร้างรูปย่อ (ซ้ำได้ — source เดิมไม่เข้าคิวซ้ำ)"""
+    image = getattr(instance, field)
+    if not image:
+        return None
+    job, _ = ImageJob.objects.get_or_create(
+        model_label=instance._meta.label_lower, object_id=instance.pk,
+        field=field, source=image.name,
+    )
+    if getattr(settings, 'THUMBNAILS_INLINE', False) and job.status == 'pending':
+        process_job(job)
+    return job
+
+
+def process_job(job):
+    """ทำ 1 งาน คืน True ถ้าสำเร็จ (หรือรูปถูกเปลี่ยนไปแล้ว ไม่ต้องทำ)"""
+    model = apps.get_model(job.model_label)
+    renditions_field = _renditions_field(job.model_label, job.field)
+    instance = model._default_manager.filter(pk=job.object_id).first()
+
+    try:
+        if instance is not None and getattr(instance, job.field).name == job.source:
+            data = render(getattr(instance, job.field))
+            # อัปเดตเฉพาะถ้ารูปยังเป็นไฟล์เดิม (ไม่ยิง post_save → ไม่เข้าคิวซ้ำ)
+            model._default_manager.filter(
+                pk=job.object_id, **{job.field: job.source}
+            ).update(**{renditions_field: data})
+            if job.model_label in ('inventory.product', 'inventory.listing'):
+                caching.invalidate(caching.TAG_PRODUCTS)
+    except Exception as e:
+        job.attempts += 1
+        job.error = f'{type(e).__name__}: {e}'
+        job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+        job.save(update_fields=['attempts', 'error', 'status', 'updated_at'])
+        return False
+
+    job.status = 'done'
+    job.error = ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    return True
+
+
+def claim(limit=20):
+    """จองงานที่รออยู่ (skip_locked → หลาย worker ไม่แย่งงานเดียวกัน)"""
+    with transaction.atomic():
+        jobs = list(
+            ImageJob.objects.select_for_update(skip_locked=True)
+            .filter(status='pending').order_by('id')[:limit]
+        )
+        ImageJob.objects.filter(id__in=[j.id for j in jobs]).update(
+            status='processing', updated_at=timezone.now()
+        )
+    return jobs
+
+
+def process_pending(limit=20):
+    """คืน (สำเร็จ, ล้มเหลว)"""
+    done = failed = 0
+    for job in claim(limit):
+        if process_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def requeue_stale(minutes=15):
+    """งานที่ค้าง processing (worker ตายกลางทาง) → กลับไปรอ"""
+    cutoff = timezone.now() - timedelta(minutes=minutes)
+    return ImageJob.objects.filter(status='processing', updated_at__lt=cutoff).update(
+        status='pending'
+    )
+
+
+def backfill():
+    """เข้าคิวรูปเดิมที่ยังไม่มีรูปย่อ คืนจำนวนงาน"""
+    count = 0
+    for label, fields in SOURCES.items():
+        model = apps.get_model(label)
+        for field, renditions_field in fields:
+            qs = model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            for instance in qs.only('pk', field, renditions_field).iterator():
+                if needs_render(instance, field, renditions_field):
+                    enqueue(instance, field)
+                    count += 1
+    return count
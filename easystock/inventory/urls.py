@@ -10,6 +10,7 @@ router = DefaultRouter()
 router.register(r'products', views.ProductViewSet, basename='product')
 router.register(r'categories', views.CategoryViewSet, basename='category')
 router.register(r'listings', views.ListingViewSet, basename='listing')
+router.register(r'stock-counts', views.StockCountViewSet, basename='stock-count')
 
 # ================ FESTIVAL ================
 router.register(r'festivals', views.FestivalViewSet, basename='festival')
@@ -59,6 +60,23 @@ urlpatterns = [
         views.movement_history, 
         name='movement-history'
     ),
+    path(
+        'movements/feed/',
+        views.movement_feed_view,
+        name='movement-feed'
+    ),
+
+    # ================ CALENDAR (เทศกาล + บันทึก + งาน) ================
+    path(
+        'calendar/feed/',
+        views.calendar_feed_view,
+        name='calendar-feed'
+    ),
+    path(
+        'calendar/feed.ics',
+        views.calendar_ics,
+        name='calendar-ics'
+    ),
     
     # ================ TOP PRODUCTS (สินค้าขายดี) ================
     path(
@@ -67,6 +85,25 @@ urlpatterns = [
         name='top-products'
     ),
     
+    # ================ AUDIT LOG ================
+    path(
+        'audit-log/',
+        views.audit_log,
+        name='audit-log'
+    ),
+
+    # ================ CACHE ================
+    path(
+        'cache-stats/',
+        views.cache_stats,
+        name='cache-stats'
+    ),
+    path(
+        'db-pool-stats/',
+        views.db_pool_stats,
+        name='db-pool-stats'
+    ),
+
     # ================ LINE MESSAGING API ================
     path(
         'line/webhook/', 
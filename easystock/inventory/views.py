@@ -3,16 +3,17 @@
 from rest_framework import viewsets, status
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.parsers import MultiPartParser, FormParser 
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
-from django.db import transaction
+from django.db import transaction, connection
 from django.utils import timezone
-from django.db.models import Q, Sum, Count, F
+from django.db.models import Q, Sum, Count, F, ProtectedError
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ObjectDoesNotExist
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, StreamingHttpResponse
+)
 from django.conf import settings
 import random
 import string
@@ -23,13 +24,25 @@ User = get_user_model()
 
 from .models import (
     Product, Category, Issue, IssueLine, Listing,
-    Festival, Task, CustomEvent
+    Festival, Task, CustomEvent, StockCount, DemandForecast
 )
 
 from .serializers import (
     ProductSerializer, CategorySerializer, ListingSerializer,
     FestivalSerializer, TaskSerializer, UserSerializer,
-    CustomEventSerializer
+    CustomEventSerializer, StockMovementSerializer, StockCountSerializer,
+    TaskTemplateSerializer
+)
+
+from .search import search_queryset
+from .autocomplete import search as autocomplete_search
+from . import caching, archive, issuing, stock, stocktake, recurrence, calendar_feed, assignment, audit
+from .parallel import run_queries
+from .movements import movement_feed, InvalidCursor
+from myapp.db_router import use_replica
+from myapp import db_pool
+from .importers import (
+    ProductImporter, ImportFormatError, read_rows, DEFAULT_BATCH_SIZE
 )
 
 try:
@@ -80,6 +93,73 @@ class UserViewSet(ReadOnlyModelViewSet):
 
 # ==================== PRODUCT VIEWSET ====================
 
+def _stock_error_response(e):
+    data = {"detail": e.detail}
+    if isinstance(e, stock.StockConflict):
+        data["stock_version"] = e.current_version
+    return Response(data, status=e.status_code)
+
+
+def _notify_stock_change(user, product, stock_change):
+    """แจ้งเตือน LINE เมื่อ stock เปลี่ยน (บวก = รับเข้า, ลบ = ลดลง)"""
+    new_stock = product.stock
+    # ถ้า stock เปลี่ยนแปลง และระบบ LINE พร้อมใช้งาน → ส่งแจ้งเตือน
+    if stock_change != 0 and LINE_AVAILABLE and line_service:
+        try:
+            # ดึงการตั้งค่าแจ้งเตือน LINE ของ user คนนี้
+            settings_obj = NotificationSettings.objects.get(
+                user=user
+            )
+            user_id = settings_obj.line_user_id
+
+            if user_id:
+                # ดึงชื่อ user ที่ทำการอัปเดต
+                updated_by = (
+                    user.get_full_name() or
+                    user.username
+                )
+
+                if stock_change > 0:
+                    # stock เพิ่มขึ้น → แจ้งเตือนรับเข้าสินค้า
+                    line_service.send_stock_in_notification(
+                        user_id, product.name, product.code,
+                        stock_change, product.unit
+                    )
+
+                    # ถ้า stock ใกล้หมด (น้อยกว่า 5) → แจ้งเตือนเพิ่มเติม
+                    if product.stock < 5 and product.stock > 0:
+                        line_service.send_low_stock_alert(
+                            user_id, product.name, product.code,
+                            product.stock, product.unit
+                        )
+                else:
+                    # stock ลดลง → แจ้งเตือนว่ามีการปรับปรุงสต็อก
+                    line_service.send_text_message(
+                        user_id,
+                        f"""📉 ปรับปรุงสต็อก
+
+📦 สินค้า: {product.name}
+🔖 รหัส: {product.code}
+📉 ลดลง: {abs(stock_change)} {product.unit}
+📊 คงเหลือ: {new_stock} {product.unit}
+👤 ปรับปรุงโดย: {updated_by}
+
+บันทึกเรียบร้อยแล้ว"""
+                    )
+
+                    # ถ้า stock เหลือ 0 → แจ้งเตือนสินค้าหมดเพิ่มเติม
+                    if new_stock == 0:
+                        line_service.send_out_of_stock_alert(
+                            user_id, product.name, product.code
+                        )
+        except NotificationSettings.DoesNotExist:
+            # ถ้า user ยังไม่ได้ตั้งค่า LINE → ข้ามไปเลย ไม่ error
+            pass
+        except Exception as e:
+            # ถ้าส่ง LINE ไม่สำเร็จ → แค่ print log ไม่หยุดการทำงาน
+            print(f"Error sending LINE notification: {e}")
+
+
 class ProductViewSet(viewsets.ModelViewSet):
     """
     จัดการสินค้าในคลัง
@@ -104,12 +184,16 @@ class ProductViewSet(viewsets.ModelViewSet):
             qs = qs.filter(stock__gt=0)
 
         # ถ้า Frontend ส่ง ?search=... มา → ค้นหาจากชื่อหรือรหัสสินค้า
+        # ใช้ดัชนีค้นหา (inventory/search.py) เรียงตามความเกี่ยวข้อง
         search = self.request.query_params.get("search")
         if search:
-            qs = qs.filter(
-                Q(name__icontains=search) | Q(code__icontains=search)
+            return self._filter_category(
+                search_queryset(qs, search)
             )
 
+        return self._filter_category(qs).order_by("-id")
+
+    def _filter_category(self, qs):
         # ถ้า Frontend ส่ง ?category=... มา → กรองตาม id หรือชื่อหมวดหมู่
         cat = self.request.query_params.get("category")
         if cat:
@@ -117,9 +201,7 @@ class ProductViewSet(viewsets.ModelViewSet):
                 qs = qs.filter(category_id=int(cat))
             else:
                 qs = qs.filter(category__name=cat)
-
-        # เรียงจากสินค้าที่เพิ่มล่าสุดก่อน
-        return qs.order_by("-id")
+        return qs
 
     def get_object(self):
         # Override สำหรับ DELETE, PATCH, PUT → เช็คว่าสินค้ายังไม่ถูกลบก่อนดึงมาใช้
@@ -184,77 +266,47 @@ class ProductViewSet(viewsets.ModelViewSet):
         return response
 
     def update(self, request, *args, **kwargs):
-        # ดึง product เดิมมาก่อน เพื่อเก็บ stock เดิมไว้เปรียบเทียบ
+        partial = kwargs.pop('partial', False)
         instance = self.get_object()
-        old_stock = instance.stock
-
-        # ส่งต่อให้ ProductSerializer validate + product.save() ทันที
-        response = super().update(request, *args, **kwargs)
 
-        # ถ้าอัปเดตไม่สำเร็จ (ไม่ใช่ 200) → ส่ง error กลับไปเลย
-        if response.status_code != 200:
-            return response
-
-        # คำนวณว่า stock เปลี่ยนไปเท่าไหร่ (บวก = รับเข้า, ลบ = เบิกออก)
-        new_stock = response.data.get('stock', old_stock)
-        stock_change = new_stock - old_stock
+        # stock ไม่เขียนผ่าน serializer (อ่านค่าเดิมแล้ว save ทับ = lost update)
+        # → ตั้งค่าผ่าน stock.set_count() ซึ่งล็อกแถวก่อนคำนวณ delta
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.fields['stock'].read_only = True
+        serializer.is_valid(raise_exception=True)
 
-        # ถ้า stock เปลี่ยนแปลง และระบบ LINE พร้อมใช้งาน → ส่งแจ้งเตือน
-        if stock_change != 0 and LINE_AVAILABLE and line_service:
-            try:
-                # ดึงการตั้งค่าแจ้งเตือน LINE ของ user คนนี้
-                settings_obj = NotificationSettings.objects.get(
-                    user=request.user
-                )
-                user_id = settings_obj.line_user_id
+        target = request.data.get('stock')
+        version = request.data.get('stock_version')
+        try:
+            target = int(target) if target not in (None, '') else None
+            version = int(version) if version not in (None, '') else None
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "stock and stock_version must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-                if user_id:
-                    product = Product.objects.get(id=response.data['id'])
-                    # ดึงชื่อ user ที่ทำการอัปเดต
-                    updated_by = (
-                        request.user.get_full_name() or
-                        request.user.username
+        movement = None
+        try:
+            with transaction.atomic():
+                self.perform_update(serializer)
+                # ส่ง stock เท่าเดิมมาพร้อม field อื่น → ไม่บันทึก movement / ไม่เพิ่ม version
+                # (รับสินค้าเข้าใช้ POST adjust-stock reason=receive แทนการส่ง stock เดิม + qty)
+                if target is not None:
+                    movement = stock.set_count(
+                        instance.pk, target, user=request.user,
+                        reason='correction', expected_version=version,
+                        record_unchanged=False,
                     )
+        except stock.StockError as e:
+            return _stock_error_response(e)
 
-                    if stock_change > 0:
-                        # stock เพิ่มขึ้น → แจ้งเตือนรับเข้าสินค้า
-                        line_service.send_stock_in_notification(
-                            user_id, product.name, product.code,
-                            stock_change, product.unit
-                        )
-
-                        # ถ้า stock ใกล้หมด (น้อยกว่า 5) → แจ้งเตือนเพิ่มเติม
-                        if product.stock < 5 and product.stock > 0:
-                            line_service.send_low_stock_alert(
-                                user_id, product.name, product.code,
-                                product.stock, product.unit
-                            )
-                    else:
-                        # stock ลดลง → แจ้งเตือนว่ามีการปรับปรุงสต็อก
-                        line_service.send_text_message(
-                            user_id,
-                            f"""📉 ปรับปรุงสต็อก
-
-📦 สินค้า: {product.name}
-🔖 รหัส: {product.code}
-📉 ลดลง: {abs(stock_change)} {product.unit}
-📊 คงเหลือ: {new_stock} {product.unit}
-👤 ปรับปรุงโดย: {updated_by}
-
-บันทึกเรียบร้อยแล้ว"""
-                        )
+        instance.refresh_from_db()
+        response = Response(self.get_serializer(instance).data)
 
-                        # ถ้า stock เหลือ 0 → แจ้งเตือนสินค้าหมดเพิ่มเติม
-                        if new_stock == 0:
-                            line_service.send_out_of_stock_alert(
-                                user_id, product.name, product.code
-                            )
-            except NotificationSettings.DoesNotExist:
-                # ถ้า user ยังไม่ได้ตั้งค่า LINE → ข้ามไปเลย ไม่ error
-                pass
-            except Exception as e:
-                # ถ้าส่ง LINE ไม่สำเร็จ → แค่ print log ไม่หยุดการทำงาน
-                print(f"Error sending LINE notification: {e}")
+        # คำนวณว่า stock เปลี่ยนไปเท่าไหร่ (บวก = รับเข้า, ลบ = เบิกออก)
+        stock_change = movement.delta if movement else 0
+        _notify_stock_change(request.user, instance, stock_change)
 
         # ส่ง 200 OK พร้อมข้อมูลสินค้าที่อัปเดตแล้วกลับไปให้ Frontend
         return response
@@ -276,21 +328,130 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # ลบ Listing ที่เชื่อมอยู่กับสินค้านี้ (ถ้ามี)
         try:
-            product.listing.delete()
-        except Exception:
-            pass
+            with transaction.atomic():
+                # ลบ Listing ที่เชื่อมอยู่กับสินค้านี้ (ถ้ามี)
+                try:
+                    product.listing.delete()
+                except Exception:
+                    pass
 
-        # ลบประวัติการเบิกสินค้าที่อ้างอิงสินค้านี้
-        IssueLine.objects.filter(product=product).delete()
+                # ลบประวัติการเบิกสินค้าที่อ้างอิงสินค้านี้
+                IssueLine.objects.filter(product=product).delete()
 
-        # ลบสินค้าออกจากฐานข้อมูล
-        product.delete()
+                # ลบสินค้าออกจากฐานข้อมูล
+                product.delete()
+        except ProtectedError:
+            # ประวัติที่ archive แล้ว (ArchivedIssueLine / IssueRollup) ต้องเก็บไว้ทำ report
+            return Response(
+                {"detail": "ไม่สามารถลบสินค้าที่มีประวัติการเบิกใน archive"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
         # ส่ง 204 No Content กลับไป → ลบสำเร็จ ไม่มีข้อมูลส่งคืน
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=True, methods=['post'], url_path='adjust-stock',
+        parser_classes=[JSONParser, FormParser]
+    )
+    def adjust_stock(self, request, pk=None):
+        # POST /products/{id}/adjust-stock/ {delta, reason?, note?, stock_version?}
+        # delta มีเครื่องหมาย: บวก = รับเข้า, ลบ = ตัดออก
+        # หน้ารับสินค้าเข้าใช้ reason=receive (ไม่ต้องส่ง stock_version เพราะบวก delta ใน SQL)
+        try:
+            delta = int(request.data.get("delta", 0) or 0)
+            version = request.data.get("stock_version")
+            version = int(version) if version not in (None, "") else None
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "delta and stock_version must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            movement = stock.adjust(
+                pk, delta, user=request.user,
+                reason=request.data.get("reason") or "adjust",
+                note=request.data.get("note") or "",
+                expected_version=version,
+            )
+        except stock.StockError as e:
+            return _stock_error_response(e)
+
+        if LINE_AVAILABLE and line_service:
+            _notify_stock_change(request.user, movement.product, movement.delta)
+
+        return Response(StockMovementSerializer(movement).data)
+
+    @action(
+        detail=False, methods=['post'], url_path='adjust-stock',
+        parser_classes=[JSONParser]
+    )
+    def adjust_stock_batch(self, request):
+        # POST /products/adjust-stock/
+        # {reason?, note?, items: [{product, delta} | {product, count}, stock_version?]}
+        # ใช้บันทึกผลตรวจนับทั้งชุด — ผ่านทั้งหมดหรือไม่เปลี่ยนเลย
+        try:
+            movements = stock.adjust_many(
+                request.data.get("items"), user=request.user,
+                reason=request.data.get("reason") or "count",
+                note=request.data.get("note") or "",
+            )
+        except stock.StockError as e:
+            return _stock_error_response(e)
+
+        return Response({
+            'count': len(movements),
+            'movements': StockMovementSerializer(movements, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        # GET /products/autocomplete/?q=...&limit=10&show_empty=0
+        # ค้นหาจากดัชนีในหน่วยความจำ + stock ของสินค้าที่ match (query เดียว) สำหรับพิมพ์ค้นหาทีละตัวอักษร
+        q = request.query_params.get("q", "")
+        try:
+            limit = min(max(int(request.query_params.get("limit", 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        show_empty = request.query_params.get("show_empty", "0")
+        min_stock = None if str(show_empty).lower() in ("1", "true", "yes") else 1
+
+        results = autocomplete_search(q, limit=limit, min_stock=min_stock)
+        return Response({'query': q, 'results': results})
+
+    @action(
+        detail=False, methods=['post'], url_path='import',
+        permission_classes=[IsAdmin]
+    )
+    def import_products(self, request):
+        # POST /products/import/ (FormData: file, format?, dry_run?, batch_size?)
+        # นำเข้าสินค้าทีละหลายพันรายการ → upsert ตาม code + รายงาน error รายแถว
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response(
+                {"detail": "file is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        dry_run = str(request.data.get('dry_run', '0')).lower() in ("1", "true", "yes")
+        try:
+            batch_size = int(request.data.get('batch_size') or DEFAULT_BATCH_SIZE)
+        except ValueError:
+            batch_size = DEFAULT_BATCH_SIZE
+
+        importer = ProductImporter(
+            user=request.user, batch_size=batch_size, dry_run=dry_run
+        )
+        try:
+            rows = read_rows(upload, upload.name, request.data.get('format'))
+            result = importer.run(rows)
+        except ImportFormatError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result, status=status.HTTP_200_OK)
+
 
 # ==================== CATEGORY VIEWSET ====================
 
@@ -329,13 +490,14 @@ class ListingViewSet(viewsets.ModelViewSet):
         if str(active).lower() in ("1", "true", "yes"):
             qs = qs.filter(is_active=True)
 
-        # ค้นหาจากชื่อ รหัส หรือ title ถ้าส่ง ?search=xxx มา
+        # ค้นหาจากชื่อ รหัส หรือ title ถ้าส่ง ?search=xxx มา (ผ่านดัชนีค้นหา)
         search = self.request.query_params.get("search")
         if search:
-            qs = qs.filter(
-                Q(product__name__icontains=search) |
-                Q(product__code__icontains=search) |
-                Q(title__icontains=search)
+            qs = search_queryset(
+                qs, search,
+                product_field='product_id',
+                code_field='product__code',
+                fallback_fields=('product__name', 'product__code', 'title'),
             )
 
         # กรองตามหมวดหมู่ถ้าส่ง ?category=xxx มา
@@ -375,37 +537,131 @@ class TaskViewSet(viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated] # ต้อง login ก่อน
 
+    # serializer อ่านชื่อผู้รับงาน → join มาพร้อมกันทีเดียว
+    RELATED = ('assigned_to', 'created_by')
+
     def get_queryset(self):
         user = self.request.user
+        tasks = Task.objects.select_related(*self.RELATED)
+        # ?status=pending,in_progress → กรองตามสถานะ (Admin ไม่ต้องโหลดงานทั้งหมด)
+        statuses = [s for s in self.request.query_params.get('status', '').split(',') if s]
+        if statuses:
+            tasks = tasks.filter(status__in=statuses)
         if user.is_staff or user.is_superuser:
             # Admin → ดึงงานทั้งหมด
-            return Task.objects.all().order_by('-due_date')
+            return tasks.order_by('-due_date')
         else:
             # พนักงาน → ดึงเฉพาะงานที่มอบหมายให้ตัวเอง
-            return Task.objects.filter(
+            return tasks.filter(
                 assigned_to=user
             ).order_by('-due_date')
 
     @action(detail=False, methods=['get'])
     def my_tasks(self, request):
-        # GET /tasks/my_tasks/ → ดึงงานของตัวเองแยกตาม status
-        tasks = Task.objects.filter(assigned_to=request.user)
+        # GET /tasks/my_tasks/ → ดึงงานของตัวเองแยกตาม status (query เดียว แล้วแยกใน memory)
+        groups = {'pending': [], 'in_progress': [], 'completed': []}
+        tasks = list(Task.objects.filter(assigned_to=request.user).select_related(*self.RELATED))
+        for task in tasks:
+            if task.status in groups:
+                groups[task.status].append(task)
         return Response({
-            'pending':     TaskSerializer(tasks.filter(status='pending'), many=True).data,     # รอดำเนินการ
-            'in_progress': TaskSerializer(tasks.filter(status='in_progress'), many=True).data, # กำลังทำ
-            'completed':   TaskSerializer(tasks.filter(status='completed'), many=True).data,   # เสร็จแล้ว
-            'total':       tasks.count()
+            'pending':     TaskSerializer(groups['pending'], many=True).data,     # รอดำเนินการ
+            'in_progress': TaskSerializer(groups['in_progress'], many=True).data, # กำลังทำ
+            'completed':   TaskSerializer(groups['completed'], many=True).data,   # เสร็จแล้ว
+            'total':       len(tasks)
         })
 
+    @action(detail=False, methods=['get'])
+    def board(self, request):
+        # GET /tasks/board/?limit=20&offset=0&assigned_to=<id (Admin)>
+        # งานที่ยังไม่เสร็จทั้งหมด + งานที่เสร็จแล้วทีละหน้า + จำนวนต่อสถานะ (รวม 3 query)
+        user_id = request.user.id
+        if request.user.is_staff and request.query_params.get('assigned_to'):
+            try:
+                user_id = int(request.query_params['assigned_to'])
+            except ValueError:
+                return Response({'error': 'assigned_to ไม่ถูกต้อง'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            limit, offset = 20, 0
+
+        tasks = Task.objects.filter(assigned_to_id=user_id)
+        open_statuses = ['pending', 'in_progress']
+        counts = tasks.aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status='pending')),
+            in_progress=Count('id', filter=Q(status='in_progress')),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            overdue=Count('id', filter=Q(status__in=open_statuses, due_date__lt=timezone.now())),
+        )
+
+        groups = {s: [] for s in open_statuses}
+        for task in (
+            tasks.filter(status__in=open_statuses)
+            .select_related(*self.RELATED).order_by('due_date', 'id')
+        ):
+            groups[task.status].append(task)
+        completed = list(
+            tasks.filter(status='completed').select_related(*self.RELATED)
+            .order_by('-completed_at', '-id')[offset:offset + limit]
+        )
+
+        context = self.get_serializer_context()
+        next_offset = offset + limit
+        return Response({
+            'counts': counts,
+            'pending': TaskSerializer(groups['pending'], many=True, context=context).data,
+            'in_progress': TaskSerializer(groups['in_progress'], many=True, context=context).data,
+            'completed': {
+                'results': TaskSerializer(completed, many=True, context=context).data,
+                'limit': limit,
+                'offset': offset,
+                'next_offset': next_offset if next_offset < counts['completed'] else None,
+            },
+        })
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[IsAdmin])
+    def bulk(self, request):
+        # POST /tasks/bulk/ {template: {...}, mode: each|balance, assignees: [id], products: [id], count}
+        # each    → ทุกคนได้งานตามแม่แบบ (× สินค้า)  balance → แจกให้คนที่งานค้างน้อยที่สุดก่อน
+        # ชื่องานใส่ {product} / {code} / {n} ได้ · สร้างทั้งหมดด้วย bulk_create ใน transaction เดียว
+        template = TaskTemplateSerializer(data=request.data.get('template') or {})
+        template.is_valid(raise_exception=True)
+        try:
+            tasks = assignment.create_bulk(
+                dict(template.validated_data, created_by=request.user),
+                mode=request.data.get('mode') or 'each',
+                assignee_ids=request.data.get('assignees'),
+                product_ids=request.data.get('products'),
+                count=request.data.get('count'),
+            )
+        except assignment.AssignmentError as e:
+            return Response({'error': e.detail}, status=e.status_code)
+        # MySQL ไม่คืน id จาก bulk_create → ตอบเป็นสรุปจำนวนต่อคน
+        return Response({
+            'created': len(tasks),
+            'assigned': assignment.summarize(tasks),
+        }, status=status.HTTP_201_CREATED)
+
     @action(detail=False, methods=['get'])
     def urgent_tasks(self, request):
         # GET /tasks/urgent_tasks/ → ดึงงานด่วน/สูงที่ยังไม่เสร็จ
-        tasks = Task.objects.filter(
+        tasks = list(Task.objects.filter(
             assigned_to=request.user,
             priority__in=['high', 'urgent'],        # priority สูงหรือด่วน
             status__in=['pending', 'in_progress']   # ยังไม่เสร็จ
-        ).order_by('due_date') # เรียงจากใกล้กำหนดก่อน
-        return Response({'count': tasks.count(), 'tasks': TaskSerializer(tasks, many=True).data})
+        ).select_related(*self.RELATED).order_by('due_date')) # เรียงจากใกล้กำหนดก่อน
+        return Response({'count': len(tasks), 'tasks': TaskSerializer(tasks, many=True).data})
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        # GET /tasks/{id}/history/?limit=50&before=<id> → ประวัติการแก้ไข (รวม notes เดิมทุกครั้ง)
+        task = self.get_object()
+        limit, before = _audit_page_params(request)
+        return Response(audit.history('task', task.pk, limit=limit, before=before))
 
     @action(detail=True, methods=['post', 'patch'])
     def update_status(self, request, pk=None):
@@ -417,13 +673,116 @@ class TaskViewSet(viewsets.ModelViewSet):
         if status_choice in dict(Task.STATUS_CHOICES):
             task.status = status_choice
             if notes:
-                # ต่อ notes เดิม + เพิ่ม notes ใหม่พร้อมเวลา
-                task.notes = f"{task.notes or ''}\n[{timezone.now()}] {notes}"
+                # เก็บเฉพาะรายงานล่าสุด ประวัติเดิมดูได้ที่ /tasks/{id}/history/ (AuditLog)
+                task.notes = notes
             task.save() # บันทึกลง DB
             return Response(TaskSerializer(task).data) # ส่ง 200 OK
         else:
             return Response({'error': 'Invalid status'}, status=400)
 
+# ==================== STOCK COUNT (ตรวจนับสต็อก) ====================
+
+class StockCountViewSet(viewsets.ModelViewSet):
+    """
+    รอบตรวจนับสต็อก: สร้างรอบ → ส่งจำนวนที่นับได้เป็นชุด → ดูผลต่าง → commit ทีเดียว
+    """
+    serializer_class = StockCountSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    def get_queryset(self):
+        return StockCount.objects.annotate(line_count=Count('lines'))
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def counts(self, request, pk=None):
+        # POST /stock-counts/{id}/counts/ {mode?: set|add, items: [{code, qty}]}
+        # ส่งได้หลายครั้ง (ทีละหลักร้อย-พันรายการ) ระหว่างนับ
+        stock_count = self.get_object()
+        try:
+            accepted, unknown = stocktake.record_counts(
+                stock_count, request.data.get('items'), user=request.user,
+                mode=request.data.get('mode') or 'set'
+            )
+        except stock.StockError as e:
+            return _stock_error_response(e)
+        return Response({'accepted': accepted, 'unknown_codes': unknown})
+
+    @action(detail=True, methods=['get'])
+    def variances(self, request, pk=None):
+        # GET /stock-counts/{id}/variances/?all=0&limit=100&offset=0
+        # ค่าเริ่มต้นแสดงเฉพาะรายการที่นับได้ไม่ตรงกับระบบ เรียงตามผลต่างมากสุด
+        stock_count = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 100)), 1), 1000)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            limit, offset = 100, 0
+
+        lines = stocktake.variance_lines(stock_count)
+        if str(request.query_params.get('all', '0')).lower() not in ('1', 'true', 'yes'):
+            lines = lines.exclude(variance=0)
+        rows = lines.order_by('variance', 'product_id').values(
+            'product_id', 'product__code', 'product__name',
+            'counted', 'system', 'variance'
+        )[offset:offset + limit]
+
+        return Response({
+            'summary': stocktake.summarize(stock_count),
+            'results': [
+                {
+                    'product': r['product_id'],
+                    'code': r['product__code'],
+                    'name': r['product__name'],
+                    'counted': r['counted'],
+                    'system': r['system'],
+                    'variance': r['variance'],
+                }
+                for r in rows
+            ],
+        })
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
+    def commit(self, request, pk=None):
+        # POST /stock-counts/{id}/commit/ → ปรับสต็อกทั้งรอบใน transaction เดียว
+        stock_count = self.get_object()
+        try:
+            result = stocktake.commit(stock_count, user=request.user)
+        except stock.StockError as e:
+            return _stock_error_response(e)
+
+        # แจ้งเตือน LINE สรุปครั้งเดียวทั้งรอบ (ไม่ส่งทีละสินค้า)
+        if result['adjusted'] and LINE_AVAILABLE and line_service:
+            try:
+                settings_obj = NotificationSettings.objects.get(user=request.user)
+                if settings_obj.line_user_id:
+                    line_service.send_text_message(
+                        settings_obj.line_user_id,
+                        f"""🔍 ตรวจนับสต็อกเสร็จ: {stock_count.name}
+
+📦 นับทั้งหมด: {result['lines']} รายการ
+✏️ ปรับสต็อก: {result['adjusted']} รายการ
+📈 เกิน: +{result['increased']}
+📉 ขาด: -{result['decreased']}"""
+                    )
+            except NotificationSettings.DoesNotExist:
+                pass
+            except Exception as e:
+                print(f"Error sending LINE notification: {e}")
+
+        return Response(result)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
+    def cancel(self, request, pk=None):
+        # POST /stock-counts/{id}/cancel/
+        try:
+            stock_count = stocktake.cancel(self.get_object())
+        except stock.StockError as e:
+            return _stock_error_response(e)
+        return Response(StockCountSerializer(stock_count).data)
+
 class EmployeeDashboardViewSet(viewsets.ModelViewSet):
     """
     แดชบอร์ดสำหรับพนักงาน
@@ -434,6 +793,16 @@ class EmployeeDashboardViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def overview(self, request):
+        # cache ต่อวัน ล้างเมื่อสินค้า / การเบิก / เทศกาลเปลี่ยน
+        data = caching.get_or_set(
+            'employee_overview',
+            (request.get_host(), timezone.localdate()),
+            (caching.TAG_PRODUCTS, caching.TAG_ISSUES, caching.TAG_FESTIVALS),
+            lambda: self._build_overview(request),
+        )
+        return Response(data)
+
+    def _build_overview(self, request):
         from zoneinfo import ZoneInfo
         from datetime import time
         
@@ -442,104 +811,78 @@ class EmployeeDashboardViewSet(viewsets.ModelViewSet):
         today = now.date()
         start = datetime.combine(today, time.min, tzinfo=bangkok_tz)
         end = datetime.combine(today, time.max, tzinfo=bangkok_tz)
-        
-        total_products = Product.objects.filter(is_deleted=False).count()
-        
-        # ✅ แก้ตรงนี้ — เปลี่ยนจาก .values() เป็น loop เพื่อสร้าง image_url
-        low_stock_qs = Product.objects.filter(
-            is_deleted=False, stock__gt=0, stock__lt=5
-        ).order_by('stock')[:10]
-
-        low_items = []
-        for p in low_stock_qs:
-            # สร้าง URL รูปภาพแบบ absolute เหมือน Admin
-            img = request.build_absolute_uri(p.image.url) if p.image else None
-            low_items.append({
-                'id':        p.id,
-                'code':      p.code,
-                'name':      p.name,
-                'stock':     p.stock,
-                'unit':      p.unit,
-                'image_url': img,  # ✅ เพิ่ม image_url
-            })
-        
-        today_issued = IssueLine.objects.filter(
-            issue__created_at__gte=start,
-            issue__created_at__lte=end
-        ).aggregate(total_qty=Sum('qty'), total_items=Count('id'))
-        
-        upcoming_festivals = Festival.objects.filter(
-            start_date__gte=today
-        ).order_by('start_date')[:5].values('id', 'name', 'icon', 'start_date')
-        
-        top_products_today = IssueLine.objects.filter(
-            issue__created_at__gte=start,
-            issue__created_at__lte=end
-        ).values(
-            'product__id', 'product__code', 'product__name'
-        ).annotate(qty=Sum('qty')).order_by('-qty')[:5]
-
-        # ── movements (เหมือน Admin) ──
-        all_mv = []
-
-        issued = IssueLine.objects.select_related(
-            "issue", "product"
-        ).filter(
-            issue__created_at__gte=start,
-            issue__created_at__lte=end
-        )
-        for l in issued:
-            all_mv.append({
-                'datetime': l.issue.created_at,
-                'id':   f'out_{l.id}',
-                'date': l.issue.created_at.isoformat(),
-                'code': l.product.code,
-                'name': l.product.name,
-                'type': 'out',
-                'qty':  l.qty
-            })
 
-        received = Product.objects.filter(
-            is_deleted=False,
-            created_at__gte=start,
-            created_at__lte=end
-        )
-        for p in received:
-            all_mv.append({
-                'datetime': p.created_at,
-                'id':   f'in_{p.id}',
-                'date': p.created_at.isoformat(),
-                'code': p.code,
-                'name': p.name,
-                'type': 'in',
-                'qty':  p.initial_stock or p.stock
-            })
+        # query แต่ละตัวไม่ขึ้นต่อกัน → ใต้ ASGI รันพร้อมกัน (inventory/parallel.py)
+        def total_products():
+            return Product.objects.filter(is_deleted=False).count()
 
-        all_mv.sort(key=lambda x: x['datetime'], reverse=True)
-        movements = [
-            {
-                'id':   m['id'],
-                'date': m['date'],
-                'code': m['code'],
-                'name': m['name'],
-                'type': m['type'],
-                'qty':  m['qty']
-            }
-            for m in all_mv[:20]
-        ]
+        # ✅ แก้ตรงนี้ — เปลี่ยนจาก .values() เป็น loop เพื่อสร้าง image_url
+        def low_items():
+            low_stock_qs = Product.objects.filter(
+                is_deleted=False, stock__gt=0, stock__lt=5
+            ).order_by('stock')[:10]
+
+            items = []
+            for p in low_stock_qs:
+                # สร้าง URL รูปภาพแบบ absolute เหมือน Admin
+                img = request.build_absolute_uri(p.image.url) if p.image else None
+                items.append({
+                    'id':        p.id,
+                    'code':      p.code,
+                    'name':      p.name,
+                    'stock':     p.stock,
+                    'unit':      p.unit,
+                    'image_url': img,  # ✅ เพิ่ม image_url
+                })
+            return items
+
+        def today_issued():
+            return IssueLine.objects.filter(
+                created_at__gte=start,
+                created_at__lte=end
+            ).aggregate(total_qty=Sum('qty'), total_items=Count('id'))
+
+        def upcoming_festivals():
+            return [
+                {'id': f.id, 'name': f.name, 'icon': f.icon, 'start_date': f.start_date}
+                for f in recurrence.get_calendar().upcoming(today, limit=5)
+            ]
+
+        def top_products_today():
+            return list(IssueLine.objects.filter(
+                created_at__gte=start,
+                created_at__lte=end
+            ).values(
+                'product__id', 'product__code', 'product__name'
+            ).annotate(qty=Sum('qty')).order_by('-qty')[:5])
+
+        # ── movements: UNION ALL + LIMIT ในฐานข้อมูล (inventory/movements.py) ──
+        def movements():
+            return movement_feed(start, end, limit=20)
+
+        r = run_queries(request, {
+            'total_products': total_products,
+            'low_items': low_items,
+            'today_issued': today_issued,
+            'upcoming_festivals': upcoming_festivals,
+            'top_products_today': top_products_today,
+            'movements': movements,
+        })
+        movement_items, movements_next_cursor = r['movements']
         
-        return Response({
-            'total_products':   total_products,
-            'low_stock_count':  len(low_items),       # ✅ ใช้ len แทน .count()
-            'low_stock_items':  low_items,             # ✅ มี image_url แล้ว
+        return {
+            'total_products':   r['total_products'],
+            'low_stock_count':  len(r['low_items']),       # ✅ ใช้ len แทน .count()
+            'low_stock_items':  r['low_items'],             # ✅ มี image_url แล้ว
             'today_sales': {
-                'total_quantity':    today_issued['total_qty'] or 0,
-                'total_transactions': today_issued['total_items'] or 0,
+                'total_quantity':    r['today_issued']['total_qty'] or 0,
+                'total_transactions': r['today_issued']['total_items'] or 0,
             },
-            'upcoming_festivals': list(upcoming_festivals),
-            'top_products_today': list(top_products_today),
-            'movements':          movements,
-        })
+            'upcoming_festivals': r['upcoming_festivals'],
+            'top_products_today': r['top_products_today'],
+            'movements':          movement_items,
+            'movements_next_cursor': movements_next_cursor,  # ใช้กับ /movements/feed/ (โหลดเพิ่ม)
+        }
 
 
 class AdminDashboardViewSet(viewsets.ModelViewSet):
@@ -548,7 +891,18 @@ class AdminDashboardViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.none()
  
     @action(detail=False, methods=['get'])
+    @use_replica
     def overview(self, request):
+        # cache ต่อวัน ล้างเมื่อสินค้า / หมวดหมู่ / การเบิกเปลี่ยน
+        data = caching.get_or_set(
+            'admin_overview',
+            (request.get_host(), timezone.localdate()),
+            (caching.TAG_PRODUCTS, caching.TAG_CATEGORIES, caching.TAG_ISSUES),
+            lambda: self._build_overview(request),
+        )
+        return Response(data)
+
+    def _build_overview(self, request):
         from zoneinfo import ZoneInfo
         from datetime import time
 
@@ -559,102 +913,98 @@ class AdminDashboardViewSet(viewsets.ModelViewSet):
         start = datetime.combine(today, time.min, tzinfo=bangkok_tz)  # 00:00:00 วันนี้
         end = datetime.combine(today, time.max, tzinfo=bangkok_tz)    # 23:59:59 วันนี้
 
+        # query แต่ละตัวไม่ขึ้นต่อกัน → ใต้ ASGI รันพร้อมกัน (inventory/parallel.py)
+
         # ดึงสินค้าทั้งหมดที่ยังไม่ถูกลบจาก Model Product
         products    = Product.objects.filter(is_deleted=False)
-        # รวมจำนวน stock ทั้งหมด
-        total_stock = products.aggregate(total=Sum("stock"))["total"] or 0
- 
         # ดึงสินค้าที่ stock เหลือน้อย (1-4 ชิ้น) จาก Model Product
         low_qs = Product.objects.filter(is_deleted=False, stock__gt=0, stock__lt=5)
- 
+
+        # รวมจำนวน stock ทั้งหมด
+        def total_stock():
+            return products.aggregate(total=Sum("stock"))["total"] or 0
+
+        def low_stock_count():
+            return low_qs.count()
+
         # นับสินค้าที่รับเข้าวันนี้ จาก Model Product
-        in_today = Product.objects.filter(
-            is_deleted=False,
-            created_at__gte=start,
-            created_at__lte=end
-        ).count()
- 
+        def in_today():
+            return Product.objects.filter(
+                is_deleted=False,
+                created_at__gte=start,
+                created_at__lte=end
+            ).count()
+
         # รวมจำนวนสินค้าที่เบิกออกวันนี้ จาก Model IssueLine
-        out_today = IssueLine.objects.filter(
-            issue__created_at__gte=start,
-            issue__created_at__lte=end
-        ).aggregate(total=Sum("qty"))["total"] or 0
- 
+        def out_today():
+            return IssueLine.objects.filter(
+                created_at__gte=start,
+                created_at__lte=end
+            ).aggregate(total=Sum("qty"))["total"] or 0
+
         # คำนวณมูลค่าสต็อกรวมทั้งหมด (ราคา x จำนวน)
-        total_inventory_value = sum(
-            float(p.selling_price or 0) * p.stock for p in products
-        )
- 
+        def total_inventory_value():
+            return sum(
+                float(p.selling_price or 0) * p.stock for p in products
+            )
+
         # สร้างรายการสินค้าใกล้หมด พร้อมรูปภาพ
-        low_items = []
-        for p in low_qs.order_by("stock")[:10]:
-            img = request.build_absolute_uri(p.image.url) if p.image else None
-            low_items.append({
-                "id": p.id, "code": p.code, "name": p.name,
-                "stock": p.stock, "unit": p.unit, "image_url": img
-            })
- 
-        # ดึงประวัติการเบิกสินค้าออกวันนี้ จาก Model IssueLine
-        all_mv = []
-        issued = IssueLine.objects.select_related("issue", "product").filter(
-            issue__created_at__gte=start, issue__created_at__lte=end
-        )
-        for l in issued:
-            all_mv.append({
-                'datetime': l.issue.created_at, 'id': f'out_{l.id}',
-                'date': l.issue.created_at.isoformat(),
-                'code': l.product.code, 'name': l.product.name,
-                'type': 'out', 'qty': l.qty
-            })
- 
-        # ดึงสินค้าที่รับเข้าวันนี้ จาก Model Product
-        received = Product.objects.filter(
-            is_deleted=False, created_at__gte=start, created_at__lte=end
-        )
-        for p in received:
-            all_mv.append({
-                'datetime': p.created_at, 'id': f'in_{p.id}',
-                'date': p.created_at.isoformat(),
-                'code': p.code, 'name': p.name,
-                'type': 'in', 'qty': p.initial_stock or p.stock
-            })
- 
-        # เรียงจากล่าสุดก่อน เอาแค่ 20 รายการ
-        all_mv.sort(key=lambda x: x['datetime'], reverse=True)
-        movements = [
-            {'id': m['id'], 'date': m['date'], 'code': m['code'],
-             'name': m['name'], 'type': m['type'], 'qty': m['qty']}
-            for m in all_mv[:20]
-        ]
- 
+        def low_items():
+            items = []
+            for p in low_qs.order_by("stock")[:10]:
+                img = request.build_absolute_uri(p.image.url) if p.image else None
+                items.append({
+                    "id": p.id, "code": p.code, "name": p.name,
+                    "stock": p.stock, "unit": p.unit, "image_url": img
+                })
+            return items
+
+        # ประวัติเบิกออก + รับเข้าวันนี้ ล่าสุด 20 รายการ (UNION ALL ในฐานข้อมูล)
+        def movements():
+            return movement_feed(start, end, limit=20)
+
         # ดึงสถิติสินค้าแยกตามหมวดหมู่ จาก Model Product
-        cats = Product.objects.filter(is_deleted=False).values(
-            'category__name'
-        ).annotate(count=Count('id'), total_stock=Sum('stock')).order_by('-count')
- 
-        cat_list = [
-            {'category': c['category__name'] or 'ไม่ระบุ',
-             'count': c['count'], 'total_stock': c['total_stock'] or 0}
-            for c in cats
-        ]
+        def category_stats():
+            cats = Product.objects.filter(is_deleted=False).values(
+                'category__name'
+            ).annotate(count=Count('id'), total_stock=Sum('stock')).order_by('-count')
+            return [
+                {'category': c['category__name'] or 'ไม่ระบุ',
+                 'count': c['count'], 'total_stock': c['total_stock'] or 0}
+                for c in cats
+            ]
+
+        r = run_queries(request, {
+            'total_stock': total_stock,
+            'low_stock_count': low_stock_count,
+            'in_today': in_today,
+            'out_today': out_today,
+            'total_inventory_value': total_inventory_value,
+            'low_items': low_items,
+            'movements': movements,
+            'category_stats': category_stats,
+        })
+        movement_items, movements_next_cursor = r['movements']
  
         # ส่งข้อมูลทั้งหมดกลับไปให้ OverviewPage
-        return Response({
-            "total_products":        total_stock,
-            "low_stock_count":       low_qs.count(),
-            "in_today":              in_today,
-            "out_today":             out_today,
-            "total_inventory_value": round(total_inventory_value, 2),
-            "low_stock_items":       low_items,
-            "movements":             movements,
-            "category_stats":        cat_list
-        })
+        return {
+            "total_products":        r['total_stock'],
+            "low_stock_count":       r['low_stock_count'],
+            "in_today":              r['in_today'],
+            "out_today":             r['out_today'],
+            "total_inventory_value": round(r['total_inventory_value'], 2),
+            "low_stock_items":       r['low_items'],
+            "movements":             movement_items,
+            "movements_next_cursor": movements_next_cursor,
+            "category_stats":        r['category_stats']
+        }
 
     # ================================================================
     # financial() — ข้อมูลการเงิน
     # เรียกผ่าน GET /admin-dashboard/financial/
     # ================================================================
     @action(detail=False, methods=['get'])
+    @use_replica
     def financial(self, request):
         products = Product.objects.filter(is_deleted=False)
         # คำนวณมูลค่าสินค้าทั้งหมดที่ราคาขาย
@@ -675,28 +1025,44 @@ class AdminDashboardViewSet(viewsets.ModelViewSet):
     # เรียกผ่าน GET /admin-dashboard/category-breakdown/
     # ================================================================
     @action(detail=False, methods=['get'])
+    @use_replica
     def category_breakdown(self, request):
-        categories = Category.objects.annotate(
-            product_count=Count('product'),         # นับจำนวนสินค้าในหมวดหมู่
-            total_stock=Sum('product__stock')       # รวมสต็อกในหมวดหมู่
-        ).values('id', 'name', 'product_count', 'total_stock')
-        return Response({'categories': list(categories)})
+        def build():
+            categories = Category.objects.annotate(
+                product_count=Count('product'),         # นับจำนวนสินค้าในหมวดหมู่
+                total_stock=Sum('product__stock')       # รวมสต็อกในหมวดหมู่
+            ).values('id', 'name', 'product_count', 'total_stock')
+            return {'categories': list(categories)}
+
+        data = caching.get_or_set(
+            'category_breakdown', (),
+            (caching.TAG_PRODUCTS, caching.TAG_CATEGORIES), build
+        )
+        return Response(data)
 
     # ================================================================
     # top_products() — สินค้าที่มีมูลค่าสต็อกสูงสุด
     # เรียกผ่าน GET /admin-dashboard/top-products/
     # ================================================================
     @action(detail=False, methods=['get'])
+    @use_replica
     def top_products(self, request):
-        top_products_data = Product.objects.filter(
-            is_deleted=False, stock__gt=0   # เฉพาะสินค้าที่ยังมีสต็อก
-        ).annotate(
-            inventory_value=F('stock') * F('selling_price')  # คำนวณมูลค่า = stock x ราคา
-        ).values(
-            'id', 'code', 'name', 'stock',
-            'selling_price', 'category__name'
-        ).order_by('-inventory_value')[:20]  # เรียงมูลค่าสูงไปต่ำ เอา 20 อันดับแรก
-        return Response({'top_products': list(top_products_data)})
+        def build():
+            top_products_data = Product.objects.filter(
+                is_deleted=False, stock__gt=0   # เฉพาะสินค้าที่ยังมีสต็อก
+            ).annotate(
+                inventory_value=F('stock') * F('selling_price')  # คำนวณมูลค่า = stock x ราคา
+            ).values(
+                'id', 'code', 'name', 'stock',
+                'selling_price', 'category__name'
+            ).order_by('-inventory_value')[:20]  # เรียงมูลค่าสูงไปต่ำ เอา 20 อันดับแรก
+            return {'top_products': list(top_products_data)}
+
+        data = caching.get_or_set(
+            'admin_top_products', (),
+            (caching.TAG_PRODUCTS, caching.TAG_CATEGORIES), build
+        )
+        return Response(data)
 
 
 # ==================== CUSTOM EVENT VIEWSET ====================
@@ -711,9 +1077,10 @@ class CustomEventViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         # ดึงงานที่สร้างเอง หรืองานที่ is_shared=True (แชร์ให้ทุกคน)
+        # ไม่มี join → ไม่มีแถวซ้ำ ไม่ต้อง .distinct() (MySQL จะทำ temp table เปล่าๆ)
         return CustomEvent.objects.filter(
             Q(created_by=user) | Q(is_shared=True)
-        ).distinct()
+        )
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -791,16 +1158,13 @@ class FestivalViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
         today = timezone.now().date()
-        next_days = today + timedelta(days=60)
 
-        festivals = Festival.objects.filter(
-            start_date__gte=today,
-            start_date__lte=next_days
-        ).order_by('start_date')
+        # รวมเทศกาลประจำปีที่ขยายจาก rule (ดู inventory/recurrence.py)
+        festivals = recurrence.get_calendar().upcoming(today, days=60)
 
         serializer = self.get_serializer(festivals, many=True)
         return Response({
-            'count': festivals.count(),
+            'count': len(festivals),
             'today': today,
             'results': serializer.data
         })
@@ -817,34 +1181,107 @@ class FestivalViewSet(viewsets.ModelViewSet):
             )
 
         first_day = datetime(year, month, 1).date()
-        if month == 12:
-            last_day = (
-                datetime(year + 1, 1, 1).date() - 
-                timedelta(days=1)
-            )
-        else:
-            last_day = (
-                datetime(year, month + 1, 1).date() - 
-                timedelta(days=1)
-            )
 
-        festivals = Festival.objects.filter(
-            start_date__lte=last_day,
-            end_date__gte=first_day
-        ).order_by('start_date')
+        def build():
+            festivals = recurrence.get_calendar().month(year, month)
+
+            serializer = self.get_serializer(festivals, many=True)
+            data = list(serializer.data)
+            return {
+                'year': year,
+                'month': month,
+                'month_name': first_day.strftime('%B'),
+                'festivals': data,
+                'count': len(data)
+            }
 
-        serializer = self.get_serializer(festivals, many=True)
-        
+        # is_upcoming / days_until ขึ้นกับวันนี้ → ใส่วันที่ไว้ใน key ด้วย
+        data = caching.get_or_set(
+            'festival_calendar',
+            (year, month, timezone.localdate()),
+            (caching.TAG_FESTIVALS,), build
+        )
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def forecast(self, request, pk=None):
+        # GET /festivals/{id}/forecast/?limit=50
+        # ผลจาก manage.py forecast_demand เรียงตามยอดคาดการณ์มากสุด
+        festival = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), 500)
+        except ValueError:
+            limit = 50
+
+        rows = list(
+            DemandForecast.objects.filter(festival=festival)
+            .select_related('product')
+            .order_by('-forecast_qty')[:limit]
+        )
+        results = []
+        for f in rows:
+            results.append({
+                'product_id': f.product_id,
+                'product_code': f.product.code,
+                'product_name': f.product.name,
+                'stock': f.product.stock,
+                'forecast_qty': f.forecast_qty,
+                'shortfall': max(f.forecast_qty - f.product.stock, 0),
+                'baseline_daily': f.baseline_daily,
+                'uplift': f.uplift,
+                'confidence': f.confidence,
+                'basis': f.basis,
+            })
+
+        totals = DemandForecast.objects.filter(festival=festival).aggregate(
+            products=Count('id'), total_qty=Sum('forecast_qty'),
+        )
+        first = rows[0] if rows else None
         return Response({
-            'year': year,
-            'month': month,
-            'month_name': first_day.strftime('%B'),
-            'festivals': serializer.data,
-            'count': festivals.count()
+            'festival': festival.id,
+            'window_start': first and first.window_start,
+            'window_end': first and first.window_end,
+            'generated_at': first and first.generated_at,
+            'products': totals['products'],
+            'total_qty': totals['total_qty'] or 0,
+            'results': results,
         })
     
 # ==================== API FUNCTIONS ====================
 
+def _send_issue_notifications(user, issued):
+    try:
+        settings_obj = NotificationSettings.objects.get(user=user)
+    except NotificationSettings.DoesNotExist:
+        return
+    user_id = settings_obj.line_user_id
+    if not user_id:
+        return
+
+    issued_by = user.get_full_name() or user.username
+    for p, qty in issued:
+        try:
+            # แจ้งเตือนว่าเบิกสินค้าออก
+            line_service.send_stock_out_notification(
+                user_id, p.name, p.code, qty,
+                p.unit, issued_by
+            )
+
+            # ถ้าสต็อกหมด → แจ้งเตือนสินค้าหมด
+            if p.stock == 0:
+                line_service.send_out_of_stock_alert(
+                    user_id, p.name, p.code
+                )
+            # ถ้าสต็อกใกล้หมด → แจ้งเตือนสินค้าใกล้หมด
+            elif p.stock < 5:
+                line_service.send_low_stock_alert(
+                    user_id, p.name, p.code,
+                    p.stock, p.unit
+                )
+        except Exception as e:
+            print(f"Error sending LINE notification: {e}")
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def issue_products(request):
@@ -861,99 +1298,19 @@ def issue_products(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    #ถ้า error ตรงไหน → ยกเลิกทั้งหมด
-    with transaction.atomic():
-
-        # ── Issue.objects.create() → สร้างใบเบิก 1 ใบ ──
-        issue = Issue.objects.create(created_by=request.user)
-        updated_products = []
-
-        # วนลูปสินค้าแต่ละรายการที่เบิก
-        for it in items:
-            pid = int(it.get("product", 0) or 0) # id สินค้า
-            qty = int(it.get("qty", 0) or 0)     # จำนวนที่เบิก
-            if pid <= 0 or qty <= 0:
-                continue # ข้ามถ้าข้อมูลไม่ถูกต้อง
-
-            try:
-                # ดึงสินค้าจาก DB พร้อมล็อคไว้ ป้องกันคนอื่นแก้พร้อมกัน
-                p = Product.objects.select_for_update().get(
-                    id=pid, is_deleted=False
-                )
-            except ObjectDoesNotExist:
-                return Response(
-                    {"detail": f"product {pid} not found"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-            # เช็คสต็อกพอไหม ถ้าไม่พอ → ส่ง error กลับ
-            if p.stock < qty:
-                return Response(
-                    {"detail": f"stock not enough for product {p.code}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # หักสต็อก → product.stock -= qty (บันทึกลง DB)
-            p.stock = F("stock") - qty
-            p.on_sale = True
-            p.save(update_fields=["stock", "on_sale"])
-
-            # ── IssueLine.objects.create() → สร้างรายการเบิกสินค้า ──
-            IssueLine.objects.create(issue=issue, product=p, qty=qty)
-
-            # อัปเดต Listing — ถ้ายังไม่มี → สร้างใหม่, ถ้ามีแล้ว → เพิ่ม quantity
-            listing, created = Listing.objects.get_or_create(
-                product=p,
-                defaults={
-                    "is_active": True,
-                    "title": p.name,
-                    "sale_price": p.selling_price,
-                    "unit": p.unit,
-                    "quantity": qty
-                }
-            )
-            if not created:
-                # มี Listing อยู่แล้ว → เพิ่มจำนวน
-                listing.quantity = F("quantity") + qty
-                listing.is_active = True
-                listing.save(update_fields=["quantity", "is_active"])
-
-            # โหลดค่า stock ล่าสุดจาก DB หลังจากหักแล้ว
-            p.refresh_from_db(fields=["stock", "on_sale"])
-            updated_products.append(p)
-
-            # ── แจ้งเตือน LINE ──────────────────────────────────────
-            if LINE_AVAILABLE and line_service:
-                try:
-                    settings_obj = NotificationSettings.objects.get(
-                        user=request.user
-                    )
-                    user_id = settings_obj.line_user_id
+    # ล็อกสินค้าตามลำดับ id + ลองใหม่เมื่อเจอ deadlock (ดู inventory/issuing.py)
+    # ถ้า error ตรงไหน → rollback ทั้งใบ
+    try:
+        _, issued = issuing.issue_products(request.user, items)
+    except issuing.IssueError as e:
+        return Response({"detail": e.detail}, status=e.status_code)
 
-                    if user_id:
-                        issued_by = (
-                            request.user.get_full_name() or
-                            request.user.username
-                        )
-                        # แจ้งเตือนว่าเบิกสินค้าออก
-                        line_service.send_stock_out_notification(
-                            user_id, p.name, p.code, qty,
-                            p.unit, issued_by
-                        )
+    updated_products = [p for p, _ in issued]
 
-                        # ถ้าสต็อกหมด → แจ้งเตือนสินค้าหมด
-                        if p.stock == 0:
-                            line_service.send_out_of_stock_alert(
-                                user_id, p.name, p.code
-                            )
-                        # ถ้าสต็อกใกล้หมด → แจ้งเตือนสินค้าใกล้หมด
-                        elif p.stock < 5:
-                            line_service.send_low_stock_alert(
-                                user_id, p.name, p.code,
-                                p.stock, p.unit
-                            )
-                except Exception as e:
-                    print(f"Error sending LINE notification: {e}")
+    # ── แจ้งเตือน LINE หลัง commit (ไม่ส่งระหว่างถือล็อก / ไม่ส่งถ้า rollback) ──
+    if LINE_AVAILABLE and line_service:
+        user = request.user
+        transaction.on_commit(lambda: _send_issue_notifications(user, issued))
 
     # ส่งข้อมูลสินค้าที่อัปเดตแล้วกลับไปให้ Frontend พร้อม 201 Created
     return Response(
@@ -995,12 +1352,13 @@ def product_unlist(request, pk: int):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_replica
 def movement_history(request):
     """
     ประวัติการเคลื่อนไหวสินค้า
     """
     from django.db.models import Q
-    from .models import Issue, Product
+    from .models import Product
     
     search = request.query_params.get('search', '')
     start_date = request.query_params.get('start_date', '')
@@ -1038,37 +1396,33 @@ def movement_history(request):
         return user.username
     
     if movement_type in ['all', 'out']:
-        issues = Issue.objects.select_related(
-            'created_by'
-        ).prefetch_related(
-            'lines__product'
-        ).order_by('-created_at')
-        
+        # IssueLine มี created_at / created_by ของตัวเอง → ไม่ต้อง join ตาราง Issue
+        # อ่านต่อไปยังรายการที่ archive แล้วด้วย (inventory/archive.py)
+        line_filters = {}
         if start_date:
-            issues = issues.filter(created_at__date__gte=start_date)
+            line_filters['created_at__date__gte'] = start_date
         if end_date:
-            issues = issues.filter(created_at__date__lte=end_date)
+            line_filters['created_at__date__lte'] = end_date
         
-        for issue in issues:
-            for line in issue.lines.all():
-                if search:
-                    if (search.lower() not in line.product.name.lower() and 
-                        search.lower() not in line.product.code.lower()):
-                        continue
-                
-                user = issue.created_by
-                movements.append({
-                    'id': f'out-{issue.id}-{line.id}',
-                    'date': issue.created_at.isoformat(),
-                    'code': line.product.code,
-                    'name': line.product.name,
-                    'type': 'out',
-                    'qty': line.qty,
-                    'unit': line.product.unit,
-                    'created_by_name': get_user_display_name(user),
-                    'created_by_username': user.username if user else None,
-                    'profile_image': get_profile_image_url(user),
-                })
+        for line in archive.iter_issue_lines(**line_filters):
+            if search:
+                if (search.lower() not in line.product.name.lower() and 
+                    search.lower() not in line.product.code.lower()):
+                    continue
+            
+            user = line.created_by
+            movements.append({
+                'id': f'out-{line.issue_id}-{line.id}',
+                'date': line.created_at.isoformat(),
+                'code': line.product.code,
+                'name': line.product.name,
+                'type': 'out',
+                'qty': line.qty,
+                'unit': line.product.unit,
+                'created_by_name': get_user_display_name(user),
+                'created_by_username': user.username if user else None,
+                'profile_image': get_profile_image_url(user),
+            })
     
     if movement_type in ['all', 'in']:
         products = Product.objects.filter(
@@ -1111,6 +1465,146 @@ def movement_history(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def movement_feed_view(request):
+    """
+    feed การเคลื่อนไหวของวัน (เบิกออก + รับเข้า) แบบโหลดเพิ่มทีละหน้า
+    GET /movements/feed/?date=YYYY-MM-DD&limit=20&cursor=<next_cursor จากหน้าก่อน>
+    """
+    from zoneinfo import ZoneInfo
+    from datetime import time
+
+    bangkok_tz = ZoneInfo('Asia/Bangkok')
+    date_str = request.query_params.get('date')
+    try:
+        day = (
+            datetime.strptime(date_str, '%Y-%m-%d').date() if date_str
+            else timezone.now().astimezone(bangkok_tz).date()
+        )
+        limit = int(request.query_params.get('limit', 20))
+    except ValueError:
+        return Response({'error': 'date หรือ limit ไม่ถูกต้อง'}, status=status.HTTP_400_BAD_REQUEST)
+
+    start = datetime.combine(day, time.min, tzinfo=bangkok_tz)
+    end = datetime.combine(day, time.max, tzinfo=bangkok_tz)
+    try:
+        movements, next_cursor = movement_feed(
+            start, end, limit=limit, cursor=request.query_params.get('cursor') or None
+        )
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'date': day.isoformat(),
+        'movements': movements,
+        'next_cursor': next_cursor,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def calendar_feed_view(request):
+    """
+    ปฏิทินรวม (เทศกาล + บันทึกของฉัน + กำหนดส่งงาน) ในช่วงวันที่
+    GET /calendar/feed/?start=YYYY-MM-DD&end=YYYY-MM-DD
+    ส่ง If-None-Match เดิมกลับมา → 304 ถ้าไม่มีอะไรเปลี่ยน
+    """
+    try:
+        first, last = calendar_feed.parse_range(request.query_params)
+    except calendar_feed.FeedError as e:
+        return Response({'error': e.detail}, status=e.status_code)
+
+    etag = calendar_feed.etag(request.user, first, last)
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    response = Response(calendar_feed.get_feed(request.user, first, last))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def calendar_ics(request):
+    """
+    export ปฏิทินรวมเป็น iCalendar (stream ทีละรายการ ใช้กับช่วงยาวได้)
+    GET /calendar/feed.ics?start=YYYY-MM-DD&end=YYYY-MM-DD
+    """
+    try:
+        first, last = calendar_feed.parse_range(request.query_params, max_days=calendar_feed.MAX_ICS_DAYS)
+    except calendar_feed.FeedError as e:
+        return Response({'error': e.detail}, status=e.status_code)
+
+    response = StreamingHttpResponse(
+        calendar_feed.iter_ics(request.user, first, last, host=request.get_host()),
+        content_type='text/calendar; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="easystock-{first}-{last}.ics"'
+    return response
+
+
+def _audit_page_params(request):
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 200)
+        before = int(request.query_params.get('before') or 0) or None
+    except ValueError:
+        limit, before = 50, None
+    return limit, before
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def audit_log(request):
+    """
+    ประวัติการแก้ไขสินค้า / Listing / งาน (ใหม่สุดก่อน)
+    GET /audit-log/?model=product&object_id=<id>  หรือ  ?user=<id>
+    หน้าถัดไป: &before=<id ของรายการสุดท้าย>
+    """
+    params = request.query_params
+    limit, before = _audit_page_params(request)
+    try:
+        if params.get('model') and params.get('object_id'):
+            rows = audit.history(params['model'], int(params['object_id']), limit=limit, before=before)
+        elif params.get('user'):
+            rows = audit.by_user(int(params['user']), limit=limit, before=before)
+        else:
+            return Response({'error': 'ต้องระบุ model + object_id หรือ user'}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({'error': 'object_id / user ต้องเป็นตัวเลข'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'results': rows,
+        'next_before': rows[-1]['id'] if len(rows) == limit else None,
+    })
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdmin])
+def cache_stats(request):
+    """
+    สถิติ cache hit / miss ของ endpoint ที่ cache ไว้ (นับต่อ process)
+    DELETE → รีเซ็ตตัวนับ
+    """
+    if request.method == 'DELETE':
+        caching.reset_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(caching.get_stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def db_pool_stats(request):
+    """สถิติ connection pool (checkout / รอ / pool เต็ม) ของ process นี้"""
+    return Response({
+        'engine': connection.settings_dict['ENGINE'],
+        'pools': db_pool.all_stats(),
+    })
+
+
 # ==================== LINE MESSAGING API ====================
 
 # ==================== LINE WEBHOOK ====================
@@ -1414,10 +1908,23 @@ def get_line_profile(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_replica
 def top_products(request):
     """
     สินค้าขายดี - ดึงจากยอดเบิกจริงใน IssueLine
     """
+    # period=1days ย้อนหลัง 24 ชม. → ใส่ชั่วโมงไว้ใน key ด้วย
+    now = timezone.localtime()
+    data = caching.get_or_set(
+        'top_products',
+        (sorted(request.query_params.items()), now.date(), now.hour),
+        (caching.TAG_PRODUCTS, caching.TAG_ISSUES),
+        lambda: _build_top_products(request),
+    )
+    return Response(data)
+
+
+def _build_top_products(request):
     period = request.query_params.get('period', 'month')
     limit = int(request.query_params.get('limit', 10))
     start_date_str = request.query_params.get('start_date')
@@ -1446,34 +1953,26 @@ def top_products(request):
             end_datetime = timezone.make_aware(dt.combine(end_date, dt.max.time()))
             start_datetime = timezone.make_aware(dt.combine(start_date, dt.min.time()))
             
-            issue_data = IssueLine.objects.filter(
-                issue__created_at__gte=start_datetime,
-                issue__created_at__lte=end_datetime
-            )
+            issue_filters = {
+                'created_at__gte': start_datetime,
+                'created_at__lte': end_datetime,
+            }
         except Exception as e:
             print(f"Error parsing custom dates: {e}")
-            issue_data = IssueLine.objects.all()
+            issue_filters = {}
     else:
         start_datetime = period_map.get(period)
 
         if start_datetime:
             if period == '1days':
-                issue_data = IssueLine.objects.filter(
-                    issue__created_at__gte=start_datetime
-                )
+                issue_filters = {'created_at__gte': start_datetime}
             else:
-                issue_data = IssueLine.objects.filter(
-                    issue__created_at__date__gte=start_datetime
-                )
+                issue_filters = {'created_at__date__gte': start_datetime}
         else:
-            issue_data = IssueLine.objects.all()
+            issue_filters = {}
 
-    top_products_data = issue_data.values('product').annotate(
-        total_issued=Sum('qty'),
-        transactions=Count('id')
-    ).filter(
-        total_issued__gte=min_qty
-    ).order_by('-total_issued')[:limit]
+    # อ่านรวมทั้งรายการปัจจุบันและที่ archive แล้ว (inventory/archive.py)
+    top_products_data = archive.top_issued(limit, min_qty=min_qty, **issue_filters)
 
     results = []
     for idx, tp in enumerate(top_products_data, 1):
@@ -1498,10 +1997,10 @@ def top_products(request):
         except Product.DoesNotExist:
             continue
 
-    return Response({
+    return {
         'period': period,
         'limit': limit,
         'min_qty': min_qty,
         'count': len(results),
         'results': results
-    })
+    }
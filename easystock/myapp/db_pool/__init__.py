@@ -0,0 +1,258 @@
+# myapp/db_pool/__init__.py
+# Connection pool สำหรับ Django database backend
+#
+# Django 4.2 ไม่มี pool ในตัว: CONN_MAX_AGE=0 เปิด/ปิด connection ทุก request
+# backend ใน myapp.db_pool.mysql / myapp.db_pool.sqlite3 จะ
+# - ขอ connection จาก pool แทนการเปิดใหม่ (get_new_connection)
+# - คืน connection เข้า pool แทนการปิดจริง (_close) หลัง rollback ทุกครั้ง
+#   → ล็อกจาก select_for_update ที่ค้างอยู่จะถูกปล่อยก่อนคืนเข้า pool เสมอ
+# - ตรวจสุขภาพ connection ที่ว่างนานเกิน HEALTH_CHECK_AFTER วินาที
+# - ปิด connection ที่อายุเกิน MAX_LIFETIME วินาที (recycle)
+#
+# ตั้งค่าผ่าน DATABASES[alias]['POOL'] = {
+#     'MAX_SIZE': 10, 'MAX_LIFETIME': 1800, 'TIMEOUT': 5, 'HEALTH_CHECK_AFTER': 30
+# }
+
+import threading
+import time
+from collections import deque
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,
+    'TIMEOUT': 5,
+    'HEALTH_CHECK_AFTER': 30,
+}
+
+
+class PoolExhausted(Exception):
+    """รอ connection จาก pool นานเกิน TIMEOUT"""
+
+
+class _Entry:
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+
+    def __init__(self, alias, max_size=10, max_lifetime=1800, timeout=5,
+                 health_check_after=30):
+        self.alias = alias
+        self.max_size = max(1, int(max_size))
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._cond = threading.Condition()
+        self.metrics = {
+            'checkouts': 0,
+            'checkins': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'exhausted': 0,
+            'created': 0,
+            'recycled': 0,
+            'health_check_failures': 0,
+            'discarded': 0,
+        }
+
+    # ── internal ──────────────────────────────────────────────
+    def _expired(self, entry, now):
+        return self.max_lifetime is not None and now - entry.created_at > self.max_lifetime
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    # ── public ────────────────────────────────────────────────
+    def checkout(self, connect):
+        start = time.monotonic()
+        waited = False
+        while True:
+            entry = None
+            with self._cond:
+                if self._idle:
+                    # LIFO: ใช้ connection ที่เพิ่งคืนก่อน (อุ่นที่สุด) ตัวที่ไม่ได้ใช้จะหมดอายุเอง
+                    entry = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    if not waited:
+                        waited = True
+                        self.metrics['waits'] += 1
+                    remaining = self.timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        self.metrics['exhausted'] += 1
+                        self.metrics['wait_time_total'] += time.monotonic() - start
+                        raise PoolExhausted(
+                            f"connection pool '{self.alias}' exhausted "
+                            f"(max_size={self.max_size}, timeout={self.timeout}s)"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            now = time.monotonic()
+            if entry is None:
+                try:
+                    entry = _Entry(connect())
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._cond:
+                    self.metrics['created'] += 1
+            elif self._expired(entry, now):
+                self._close_quietly(entry.conn)
+                self._release_slot()
+                with self._cond:
+                    self.metrics['recycled'] += 1
+                continue
+            elif (self.health_check_after is not None
+                  and now - entry.last_used > self.health_check_after
+                  and not self._healthy(entry.conn)):
+                self._close_quietly(entry.conn)
+                self._release_slot()
+                with self._cond:
+                    self.metrics['health_check_failures'] += 1
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+                self.metrics['checkouts'] += 1
+                if waited:
+                    self.metrics['wait_time_total'] += time.monotonic() - start
+            return entry.conn
+
+    def checkin(self, conn, check_health=False):
+        """คืน connection: rollback transaction ที่ค้าง แล้วเก็บไว้ใช้ต่อ"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            # ไม่ใช่ connection จาก pool นี้ → ปิดทิ้ง
+            self._close_quietly(conn)
+            return
+
+        try:
+            conn.rollback()
+        except Exception:
+            check_health = True
+
+        now = time.monotonic()
+        if self._expired(entry, now) or (check_health and not self._healthy(conn)):
+            self.discard_entry(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self.metrics['checkins'] += 1
+            self._cond.notify()
+
+    def discard_entry(self, entry):
+        self._close_quietly(entry.conn)
+        with self._cond:
+            self._size -= 1
+            self.metrics['discarded'] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    def stats(self):
+        with self._cond:
+            checkouts = self.metrics['checkouts']
+            return {
+                'alias': self.alias,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self.metrics,
+                'avg_wait_ms': round(
+                    self.metrics['wait_time_total'] * 1000 / self.metrics['waits'], 3
+                ) if self.metrics['waits'] else 0,
+                'reuse_ratio': round(
+                    1 - self.metrics['created'] / checkouts, 4
+                ) if checkouts else 0,
+            }
+
+
+# ================ REGISTRY ================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(alias, settings_dict):
+    # alias เดียวกันอาจชี้ไปฐานข้อมูลอื่นได้ (เช่น test runner เปลี่ยน NAME เป็น test_*)
+    # → connection ใน pool เก่าห้ามถูกหยิบไปใช้กับฐานข้อมูลใหม่
+    return (alias, *(str(settings_dict.get(k) or '') for k in ('NAME', 'HOST', 'PORT', 'USER')))
+
+
+def get_pool(alias, settings_dict):
+    key = _pool_key(alias, settings_dict)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if key not in _pools:
+            options = {**DEFAULT_POOL_OPTIONS, **(settings_dict.get('POOL') or {})}
+            _pools[key] = ConnectionPool(
+                alias,
+                max_size=options['MAX_SIZE'],
+                max_lifetime=options['MAX_LIFETIME'],
+                timeout=options['TIMEOUT'],
+                health_check_after=options['HEALTH_CHECK_AFTER'],
+            )
+        return _pools[key]
+
+
+def all_stats():
+    return [pool.stats() for _, pool in sorted(_pools.items())]
+
+
+class PooledDatabaseWrapperMixin:
+    """ใส่หน้า DatabaseWrapper ของ backend จริงเพื่อให้เปิด/ปิดผ่าน pool"""
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        return self.pool.checkout(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params)
+        )
+
+    def _close(self):
+        if self.connection is not None:
+            # มี error ระหว่าง request → ตรวจ connection ก่อนคืนเข้า pool
+            self.pool.checkin(self.connection, check_health=self.errors_occurred)
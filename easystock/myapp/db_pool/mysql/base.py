@@ -0,0 +1,10 @@
+# myapp/db_pool/mysql/base.py
+# ENGINE = 'myapp.db_pool.mysql' → MySQL backend ของ Django + connection pool
+
+from django.db.backends.mysql import base
+
+from myapp.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,10 @@
+# myapp/db_pool/sqlite3/base.py
+# ENGINE = 'myapp.db_pool.sqlite3' → ใช้ทดสอบ pool บนเครื่อง dev ที่ไม่มี MySQL
+
+from django.db.backends.sqlite3 import base
+
+from myapp.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
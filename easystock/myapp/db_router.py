@@ -0,0 +1,170 @@
+# myapp/db_router.py
+# แยกการอ่านของหน้า report ไปที่ฐานข้อมูล replica (ถ้าตั้งค่าไว้)
+#
+# - ปกติทุก query ไปที่ 'default' (primary) เหมือนเดิม (router คืน None)
+# - view ที่ครอบด้วย @use_replica จะอ่านจาก replica
+# - ถ้า user เพิ่งเขียนข้อมูล (ภายใน REPLICA_STICKY_SECONDS) จะอ่านจาก primary แทน
+#   เพื่อให้เห็นข้อมูลที่ตัวเองเพิ่งบันทึกเสมอ (read-your-writes)
+#   เวลาที่เขียนล่าสุดเก็บในตาราง ChangeCounter บน primary (ไม่ใช่ cache ซึ่งค่าเริ่มต้นแยกต่อ process)
+#   → request ถัดไปจะไปตก worker ไหนก็เห็นเหมือนกัน
+
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+# dict ต่อ request (แก้ค่าข้างในแทนการ set ใหม่ ให้เห็นค่าเดียวกันทั้ง middleware และ view)
+_request_state = contextvars.ContextVar('db_request_state', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+
+
+def replica_available():
+    return replica_alias() in settings.DATABASES
+
+
+def _sticky_name(user_id):
+    return f'db:sticky:{user_id}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def mark_recent_write(user):
+    """บันทึกเวลาที่ user เขียนข้อมูลล่าสุด (มิลลิวินาที) เป็น version ของแถว ChangeCounter"""
+    from inventory.models import ChangeCounter
+
+    counters = ChangeCounter.objects.using(DEFAULT_DB_ALIAS)
+    name, now = _sticky_name(user.pk), _now_ms()
+    if not counters.filter(name=name).update(version=now):
+        try:
+            counters.create(name=name, version=now)
+        except IntegrityError:
+            # อีก worker สร้างพร้อมกัน → แถวมีแล้ว
+            counters.filter(name=name).update(version=now)
+
+
+def has_recent_write(user):
+    if not user or not user.is_authenticated:
+        return False
+    from inventory.models import ChangeCounter
+
+    # อ่านจาก primary เสมอ (ค่าบน replica อาจยังตามไม่ทัน)
+    last = ChangeCounter.objects.using(DEFAULT_DB_ALIAS).filter(
+        name=_sticky_name(user.pk)
+    ).values_list('version', flat=True).first()
+    sticky_ms = getattr(settings, 'REPLICA_STICKY_SECONDS', 10) * 1000
+    return last is not None and _now_ms() - last < sticky_ms
+
+
+def _wrote_in_request():
+    state = _request_state.get()
+    return bool(state and state['wrote'])
+
+
+@contextmanager
+def reading_from_replica(user=None):
+    """
+    อ่านจาก replica ภายใน block นี้
+    yield True ถ้าใช้ replica จริง, False ถ้าไม่มี replica หรือ user เพิ่งเขียนข้อมูล
+    """
+    if not replica_available() or has_recent_write(user):
+        yield False
+        return
+    token = _use_replica.set(True)
+    try:
+        yield True
+    finally:
+        _use_replica.reset(token)
+
+
+def use_replica(view_func):
+    """
+    decorator สำหรับ view ที่อ่านอย่างเดียว (report / dashboard)
+    ใช้ได้ทั้ง @api_view function และ method ของ ViewSet (วางใต้ @action)
+    """
+    @functools.wraps(view_func)
+    def wrapper(*args, **kwargs):
+        # method ของ ViewSet → args[0] คือ view (มี .request), FBV → args[0] คือ request
+        request = getattr(args[0], 'request', args[0])
+        with reading_from_replica(getattr(request, 'user', None)):
+            return view_func(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Database router: เขียนที่ primary เสมอ อ่านจาก replica เฉพาะใน reading_from_replica()"""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not _wrote_in_request():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        # นับเฉพาะการเขียนข้อมูลที่ report อ่าน (ไม่นับ heartbeat / session / cache)
+        state = _request_state.get()
+        if state is not None and model._meta.app_label in getattr(
+            settings, 'REPLICA_STICKY_APPS', ('inventory',)
+        ):
+            state['wrote'] = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica เป็นสำเนาของ primary → object จากทั้งสองฝั่งอ้างอิงกันได้
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replica รับข้อมูลจาก primary ผ่าน replication ไม่ต้อง migrate เอง
+        return db != replica_alias()
+
+
+def _remember_write(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        mark_recent_write(user)
+
+
+class ReplicaStickinessMiddleware:
+    """จำว่า user เพิ่งเขียนข้อมูล เพื่อให้ request ถัดไปอ่านจาก primary (รองรับทั้ง WSGI / ASGI)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state['wrote']:
+            _remember_write(request)
+        return response
+
+    async def __acall__(self, request):
+        state = {'wrote': False}
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state['wrote']:
+            # request.user อาจยัง lazy (query session) + ORM เป็น sync → ไป thread เฉพาะตอนมีการเขียน
+            await sync_to_async(_remember_write)(request)
+        return response
@@ -0,0 +1,213 @@
+# myapp/media.py
+# เสิร์ฟไฟล์ใน MEDIA_ROOT สำหรับ production (แทน django.conf.urls.static ที่ใช้ได้แค่ตอน DEBUG)
+#
+# - ETag + Last-Modified → ตอบ 304 ถ้า browser มีไฟล์อยู่แล้ว
+# - ไฟล์ที่ชื่อมี content hash (เช่นรูปย่อใน thumbs/) → Cache-Control: immutable 1 ปี
+# - Range: bytes=... → 206 (วิดีโอ / ไฟล์ใหญ่ โหลดต่อได้)
+# - มี .br / .gz วางคู่กันและ client รับได้ → ส่งไฟล์ที่บีบอัดไว้แล้ว
+# - MEDIA_ACCEL='x-accel' / 'x-sendfile' → ให้ nginx / apache ส่งไฟล์แทน (Django ส่งแค่ header)
+
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# thumbs/ab/<hash>-md.webp หรือชื่อไฟล์ที่มี hash hex ยาวๆ → เนื้อไฟล์ไม่มีวันเปลี่ยน
+HASHED_NAME = re.compile(r'(^|/)thumbs/|[.-][0-9a-f]{16,}[.-]')
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+# ลำดับที่เลือกเมื่อ client รับได้หลายแบบ
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def cache_control(path):
+    if HASHED_NAME.search(path):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={_setting("MEDIA_MAX_AGE", 3600)}'
+
+
+def make_etag(st, encoding=None):
+    # mtime (ns) + ขนาด → เปลี่ยนทุกครั้งที่ไฟล์ถูกเขียนใหม่
+    # ไม่ใช้ inode: หลายเครื่องหลัง load balancer (หรือ rsync/restore) inode ต่างกัน → ETag ไม่ตรงกันเปล่าๆ
+    tag = f'{st.st_mtime_ns:x}-{st.st_size:x}'
+    if encoding:
+        tag += f'-{encoding}'
+    return f'"{tag}"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # weak comparison (W/"..." ตรงกับ "...") ตาม RFC 9110 สำหรับ If-None-Match
+    return etag in {t.strip().removeprefix('W/') for t in header.split(',')}
+
+
+def parse_range(header, size):
+    """
+    'bytes=a-b' → (start, end) รวม end, None = ไม่ใช้ range (ส่งทั้งไฟล์)
+    ขอเกินขนาดไฟล์ → ValueError (416)
+    หลายช่วง (a-b,c-d) → None: ส่งทั้งไฟล์แทน multipart
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500 → 500 byte สุดท้าย
+        length = int(last)
+        if length == 0:
+            raise ValueError('empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('range not satisfiable')
+    return start, end
+
+
+class RangeFile:
+    """อ่านไฟล์เฉพาะช่วง [start, start + length) ให้ FileResponse stream"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _select_variant(request, full_path, content_type):
+    """ไฟล์ .br / .gz ที่บีบอัดไว้แล้ว (ถ้ามีและ client รับได้) คืน (path, encoding)"""
+    accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if not accept or content_type.startswith(('image/', 'video/', 'audio/')):
+        return full_path, None
+    accepted = {part.split(';')[0].strip() for part in accept.split(',')}
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+def _accel_response(path, full_path, content_type, encoding):
+    mode = _setting('MEDIA_ACCEL', '')
+    # ระบุ Content-Type ของไฟล์ต้นฉบับเอง ไม่งั้น server เดาจากนามสกุล .gz / .br
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel':
+        # nginx: location /protected-media/ { internal; alias <MEDIA_ROOT>/; }
+        response['X-Accel-Redirect'] = _setting('MEDIA_ACCEL_PREFIX', '/protected-media/') + path
+    else:
+        response['X-Sendfile'] = full_path
+    if encoding:
+        response['Content-Encoding'] = encoding
+    # Content-Length ให้ server ใส่เอง
+    return response
+
+
+@require_safe
+def serve_media(request, path, document_root=None):
+    document_root = document_root or settings.MEDIA_ROOT
+    try:
+        full_path = safe_join(document_root, path)
+    except Exception:
+        raise Http404('invalid path')
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        raise Http404('file not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('file not found')
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    served_path, encoding = _select_variant(request, full_path, content_type)
+    if encoding:
+        st = os.stat(served_path)
+    etag = make_etag(st, encoding)
+    last_modified = http_date(st.st_mtime)
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': last_modified,
+        'Cache-Control': cache_control(path),
+        'Vary': 'Accept-Encoding',
+    }
+
+    # ── conditional GET ──
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    else:
+        since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        not_modified = since is not None and int(st.st_mtime) <= since
+    if not_modified:
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    if _setting('MEDIA_ACCEL', ''):
+        response = _accel_response(
+            os.path.relpath(served_path, document_root), served_path, content_type, encoding
+        )
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    # ── range ──
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range.strip() in (etag, last_modified):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), st.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{st.st_size}'
+            return response
+
+    f = open(served_path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(RangeFile(f, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{st.st_size}'
+        response['Content-Length'] = str(length)
+    else:
+        # ไฟล์จริง → WSGI server ใช้ sendfile (wsgi.file_wrapper) ได้
+        response = FileResponse(f, content_type=content_type)
+        response['Content-Length'] = str(st.st_size)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    for key, value in headers.items():
+        response[key] = value
+    return response
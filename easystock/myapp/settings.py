@@ -1,6 +1,7 @@
 # ✅ backend/settings.py (Updated with .env support)
 
 from pathlib import Path
+import tempfile
 from datetime import timedelta
 from decouple import config  # ✅ เพิ่มบรรทัดนี้
 
@@ -42,17 +43,22 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # อยู่บนสุดเสมอ
-    'inventory.middleware.DisableCSRFForLineWebhook',
+    'inventory.middleware.RequestRoutingMiddleware',  # ข้าม CSRF ของ LINE webhook + log แบบสุ่ม
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myapp.db_router.ReplicaStickinessMiddleware',
+    'inventory.middleware.AuditContextMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# ✅ inventory.middleware.RequestRoutingMiddleware: log method / path / status / เวลา
+# เฉพาะสัดส่วนของ request นี้ (0 = ไม่ log, 0.01 = 1%) ผ่าน logger 'inventory.requests'
+REQUEST_LOG_SAMPLE_RATE = config('REQUEST_LOG_SAMPLE_RATE', default=0.0, cast=float)
+
 ROOT_URLCONF = "myapp.urls"
 
 TEMPLATES = [
@@ -76,15 +82,60 @@ ASGI_APPLICATION = "myapp.asgi.application"
 # Database
 DATABASES = {
    "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": config('DB_ENGINE', default='django.db.backends.mysql'),
         "NAME": config('DB_NAME', default='projectend'),
         "USER": config('DB_USER', default='root'),
         "PASSWORD": config('DB_PASSWORD', default='root'),       
         "HOST": config('DB_HOST', default='127.0.0.1'),
         "PORT": config('DB_PORT', default='3306'),
+        # ไม่ใช้ pool → เก็บ connection ไว้ใช้ซ้ำต่อ thread (วินาที)
+        "CONN_MAX_AGE": config('DB_CONN_MAX_AGE', default=60, cast=int),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# ✅ Connection pool (myapp/db_pool) — แชร์ connection ระหว่าง thread ของ process เดียวกัน
+DB_POOL_ENGINES = {
+    'django.db.backends.mysql': 'myapp.db_pool.mysql',
+    'django.db.backends.sqlite3': 'myapp.db_pool.sqlite3',
+}
+
+if config('DB_POOL', default=False, cast=bool):
+    DATABASES['default']['ENGINE'] = DB_POOL_ENGINES.get(
+        DATABASES['default']['ENGINE'], DATABASES['default']['ENGINE']
+    )
+    # pool จัดการอายุ connection เอง → ให้ Django "ปิด" (คืนเข้า pool) ทุกครั้งที่จบ request
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=1800, cast=int),
+        'TIMEOUT': config('DB_POOL_TIMEOUT', default=5, cast=float),
+        'HEALTH_CHECK_AFTER': config('DB_POOL_HEALTH_CHECK_AFTER', default=30, cast=int),
+    }
+
+# ✅ Read replica สำหรับหน้า report (ไม่ตั้ง DB_REPLICA_NAME = ใช้ default อย่างเดียว)
+REPLICA_DATABASE_ALIAS = 'replica'
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=10, cast=int)
+REPLICA_STICKY_APPS = ('inventory',)
+
+if config('DB_REPLICA_NAME', default=''):
+    DATABASES[REPLICA_DATABASE_ALIAS] = {
+        **DATABASES['default'],
+        "NAME": config('DB_REPLICA_NAME'),
+        "USER": config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        "PASSWORD": config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        "HOST": config('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        "PORT": config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        # ตอนรัน test ให้ replica ชี้ไปที่ฐานข้อมูลเดียวกับ default
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ['myapp.db_router.ReplicaRouter']
+
+# ✅ Dashboard: ใต้ ASGI รัน query ที่ไม่ขึ้นต่อกันพร้อมกัน (inventory/parallel.py)
+DASHBOARD_PARALLEL_QUERIES = config('DASHBOARD_PARALLEL_QUERIES', default=True, cast=bool)
+DASHBOARD_MAX_PARALLEL_QUERIES = config('DASHBOARD_MAX_PARALLEL_QUERIES', default=4, cast=int)
+
 # ✅ สำคัญมาก: ต้องระบุ User Model ที่เราสร้างเอง
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -127,6 +178,17 @@ STATIC_URL = 'static/'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# ✅ เสิร์ฟ media ผ่าน Django (myapp/media.py): ETag / Range / immutable cache
+MEDIA_SERVE = config('MEDIA_SERVE', default=True, cast=bool)
+MEDIA_MAX_AGE = config('MEDIA_MAX_AGE', default=3600, cast=int)
+# '' = Django ส่งไฟล์เอง, 'x-accel' = nginx (X-Accel-Redirect), 'x-sendfile' = apache/lighttpd
+MEDIA_ACCEL = config('MEDIA_ACCEL', default='')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
+# ✅ รูปย่อ (inventory/thumbnails.py): ปกติทำใน worker `manage.py process_images`
+# THUMBNAILS_INLINE=True → ทำทันทีหลัง commit ใน request (dev / test)
+THUMBNAILS_INLINE = config('THUMBNAILS_INLINE', default=False, cast=bool)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ==========================================
@@ -156,6 +218,38 @@ CSRF_TRUSTED_ORIGINS = [
     'https://*.ngrok.io',
 ]
 
+# ==========================================
+# 🔵 CACHE Configuration
+# ==========================================
+# locmem = ค่าเริ่มต้น (แยกต่อ process), file / db = ใช้ร่วมกันหลาย process
+# ถ้าใช้ db ต้องรัน: python manage.py createcachetable
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'easystock',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config(
+            'CACHE_LOCATION',
+            default=str(Path(tempfile.gettempdir()) / 'easystock_cache')
+        ),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': config('CACHE_LOCATION', default='easystock_cache'),
+    },
+}
+
+CACHES = {
+    'default': {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+    }
+}
+
 # Channel Layers
 CHANNEL_LAYERS = {
     "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
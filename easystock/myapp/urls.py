@@ -1,11 +1,13 @@
 # backend/myapp/urls.py (FIXED)
 
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.views.generic import RedirectView
 from .views import home
+from .media import serve_media
 
 urlpatterns = [
     path("", home),
@@ -18,6 +20,13 @@ urlpatterns = [
     path("api/auth/", include("accounts.urls")),
 ]
 
-# เสิร์ฟไฟล์สื่อระหว่าง DEV
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# เสิร์ฟไฟล์สื่อ (dev + production) ดู myapp/media.py
+# MEDIA_SERVE=False → ให้ web server เสิร์ฟ MEDIA_ROOT เองทั้งหมด
+if settings.MEDIA_SERVE:
+    urlpatterns += [
+        re_path(
+            rf'^{re.escape(settings.MEDIA_URL.lstrip("/"))}(?P<path>.+)$',
+            serve_media,
+            name='media'
+        ),
+    ]
\ No newline at end of file
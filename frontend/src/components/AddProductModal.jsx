@@ -125,18 +125,22 @@ export default function AddProductModal({ open, onClose, onSaved }) {
     }
   }
 
+  // รับสินค้าเข้า → ส่งแค่จำนวนที่เพิ่ม (server บวกเองใน transaction + บันทึก StockMovement)
+  // ไม่ส่ง stock เดิม + qty เพราะ stock ที่แสดงอยู่อาจเก่าแล้ว
+  const receiveStock = async (product, amount) => {
+    const res = await api.post(`/products/${product.id}/adjust-stock/`, {
+      delta: Number(amount),
+      reason: "receive",
+    });
+    return res.data.stock_after;
+  };
+
   //รหัสซ้ำ → เติมสต็อกสินค้าเดิม
-  // คำนวณ newStock = stock เดิม + qty ที่กรอก
   const handleAddToDuplicate = async () => {
     if (!duplicateProduct || !qty || Number(qty) <= 0) return;
     setSaving(true);
     try {
-      const newStock = Number(duplicateProduct.stock) + Number(qty);
-      const fd = new FormData();
-      fd.append("stock", String(newStock));
-      await api.patch(`/products/${duplicateProduct.id}/`, fd, {
-        headers: { "Content-Type": "multipart/form-data" }
-      });
+      const newStock = await receiveStock(duplicateProduct, qty);
       alert(`เติมสต็อกสำเร็จ! ${duplicateProduct.name} จาก ${duplicateProduct.stock} เป็น ${newStock} ${duplicateProduct.unit}`);
       onSaved?.();
       onClose?.();
@@ -183,8 +187,7 @@ export default function AddProductModal({ open, onClose, onSaved }) {
     }
   };
 
-  //เลือกสินค้าเดิมจาก dropdown
-  // คำนวณ newStock = stock เดิม + addQty ที่กรอก
+  //เลือกสินค้าเดิมจาก dropdown → รับเข้าเพิ่ม addQty
   const submitExisting = async (e) => {
     e.preventDefault();
     if (!canSubmitExisting || saving) return;
@@ -192,12 +195,7 @@ export default function AddProductModal({ open, onClose, onSaved }) {
     try {
       const product = existingProducts.find(p => String(p.id) === String(selectedProductId));
       if (!product) throw new Error("ไม่พบสินค้า");
-      const newStock = Number(product.stock) + Number(addQty);
-      const fd = new FormData();
-      fd.append("stock", String(newStock));
-      await api.patch(`/products/${product.id}/`, fd, {
-        headers: { "Content-Type": "multipart/form-data" }
-      });
+      const newStock = await receiveStock(product, addQty);
       alert(`เพิ่มสต็อกสำเร็จ! ${product.name} จาก ${product.stock} เป็น ${newStock} ${product.unit}`);
       onSaved?.();
       onClose?.();